@@ -0,0 +1,81 @@
+"""Frames/sec and CPU cost of the terminal fan-out path, before and after coalescing.
+
+Runs a bulk-output command in a real PTY session and counts the frames one
+subscriber receives. Prints one JSON object per configuration.
+
+    python -m benchmarks.terminal_coalesce [--lines 300000]
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from services.terminal_manager import TerminalSessionManager
+
+CONFIGS = [
+    # (label, reader mode, coalesce bytes)
+    ("baseline: executor reader, no coalescing", "executor", 0),
+    ("event reader, no coalescing", "event", 0),
+    ("event reader, 16KB/4ms coalescing", "event", 16 * 1024),
+]
+
+_MARKER = b"__BENCH_DONE__"
+
+
+async def run(label: str, reader_mode: str, coalesce_bytes: int, lines: int) -> dict:
+    manager = TerminalSessionManager()
+    manager.reader_mode = reader_mode
+    manager.coalesce_bytes = coalesce_bytes
+    manager.screen_model = False
+    session_id = str(uuid.uuid4())
+    manager.create_session(session_id, "bench")
+    sub = await manager.subscribe(session_id)
+
+    # Let the shell start and settle before measuring
+    try:
+        while True:
+            await asyncio.wait_for(manager.next_chunk(sub), 1.0)
+    except asyncio.TimeoutError:
+        pass
+
+    # The quotes keep the echoed command line from matching the marker
+    manager.write_to_session(session_id, f"seq 1 {lines}; echo __BENCH_''DONE__\n".encode())
+    frames = 0
+    nbytes = 0
+    tail = b""
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    while True:
+        data = await asyncio.wait_for(manager.next_chunk(sub), 60)
+        if data is None:
+            break
+        frames += 1
+        nbytes += len(data)
+        tail = (tail + data)[-64:]
+        if _MARKER in tail:
+            break
+    elapsed = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+    manager.cleanup_all()
+    return {
+        "config": label,
+        "frames": frames,
+        "bytes": nbytes,
+        "seconds": round(elapsed, 3),
+        "frames_per_sec": round(frames / elapsed),
+        "mb_per_sec": round(nbytes / elapsed / 1e6, 2),
+        "avg_frame_bytes": nbytes // max(frames, 1),
+        "cpu_seconds": round(cpu, 3),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=300_000, help="lines printed by seq")
+    args = parser.parse_args()
+    for label, mode, coalesce in CONFIGS:
+        print(json.dumps(await run(label, mode, coalesce, args.lines)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""Terminal creation cost and time-to-first-prompt: fork vs posix_spawn vs pool.
+
+For each configuration, creates sessions one after another and records how
+long create_session() blocks the server and how long until the shell's
+first output arrives. With a pool, each create waits for the idle shells to
+have printed their prompt, as they would have between real tab opens.
+Prints one JSON object per configuration.
+
+    python -m benchmarks.terminal_spawn [--sessions 10]
+"""
+import argparse
+import asyncio
+import json
+import select
+import statistics
+import time
+import uuid
+
+from services.terminal_manager import TerminalSessionManager
+
+CONFIGS = [
+    # (label, spawn mode, pool size)
+    ("baseline: fork", "fork", 0),
+    ("posix_spawn", "posix_spawn", 0),
+    ("posix_spawn + pool of 2", "posix_spawn", 2),
+]
+
+_PROJECT = "bench-spawn"
+
+
+def _ms(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+async def _wait_pool_ready(manager: TerminalSessionManager, timeout: float = 30) -> None:
+    fds = [fd for _, fd in manager._pool.get(_PROJECT, ())]
+    deadline = time.monotonic() + timeout
+    while fds and time.monotonic() < deadline:
+        ready, _, _ = select.select(fds, [], [], 0)
+        if len(ready) == len(fds):
+            return
+        await asyncio.sleep(0.02)
+
+
+async def run(label: str, spawn_mode: str, pool_size: int, sessions: int) -> dict:
+    manager = TerminalSessionManager()
+    manager.spawn_mode = spawn_mode
+    manager.pool_size = pool_size
+    manager.screen_model = False
+    manager.warm_pool(_PROJECT)
+
+    create, ttfp = [], []
+    for _ in range(sessions):
+        await asyncio.sleep(0.05)
+        await _wait_pool_ready(manager)
+        session_id = str(uuid.uuid4())
+        t0 = time.perf_counter()
+        manager.create_session(session_id, _PROJECT)
+        create.append(time.perf_counter() - t0)
+        sub = await manager.subscribe(session_id)
+        while await asyncio.wait_for(manager.next_chunk(sub), 10) is not None:
+            if manager.get_session(session_id).first_output_at is not None:
+                break
+        ttfp.append(time.perf_counter() - t0)
+        manager.remove_session(session_id)
+
+    stats = manager.spawn_stats()
+    manager.cleanup_all()
+    return {
+        "config": label,
+        "sessions": sessions,
+        "pool_hits": stats["pool_hits"],
+        "create": _ms(create),
+        "time_to_first_prompt": _ms(ttfp),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10, help="sessions created per configuration")
+    args = parser.parse_args()
+    for label, mode, pool in CONFIGS:
+        print(json.dumps(await run(label, mode, pool, args.sessions)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
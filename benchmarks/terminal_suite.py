@@ -0,0 +1,313 @@
+"""End-to-end terminal benchmarks against a locally started server.
+
+Starts the app with uvicorn on a free port, logs in, and measures through
+the real HTTP and WebSocket endpoints (binary protocol, ?proto=1):
+
+- throughput: output bytes/sec of one bulk command, seen by 1 and N clients
+- echo: keystroke -> echoed byte round trip, percentiles
+- create: POST /terminal/create latency, percentiles
+- reconnect: time to a new client's first frame (screen snapshot) and to a
+  full raw replay of the scrollback (?since=)
+- idle memory: server RSS growth and shell RSS per idle session
+
+Prints one JSON object so results can be compared across releases.
+
+    python -m benchmarks.terminal_suite [--subscribers 4] [--lines 200000]
+"""
+import argparse
+import asyncio
+import http.cookiejar
+import json
+import os
+import platform
+import re
+import secrets
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+from websockets.asyncio.client import connect
+
+from config import BASE_DIR, TERMINAL_BUFFER_SIZE
+from services import proc_stats, workspace
+from services.pty_spawn import PROMPT_MARKER
+from services.terminal_protocol import OFFSET, OP_INPUT, OP_OFFSET, OP_OUTPUT
+
+_PROJECT = "bench-suite"
+_MARKER = b"__BENCH_DONE__"
+_SESSION_ID = re.compile(r'data-session-id="([^"]+)"')
+
+
+def _ms(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "samples": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 3),
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def _rss(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+class Server:
+    """The app in a uvicorn subprocess, plus a logged-in HTTP client."""
+
+    def __init__(self):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.base = f"http://127.0.0.1:{self.port}"
+        self.password = secrets.token_urlsafe(12)
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        self.proc = None
+        self.sessions: list[str] = []
+
+    def start(self) -> None:
+        env = dict(
+            os.environ,
+            THINKDEV_PASSWORD=self.password,
+            THINKDEV_WORKERS="1",
+            THINKDEV_TERMINAL_SUPERVISOR="",
+            # Keep background work from skewing the numbers
+            THINKDEV_TERMINAL_IDLE="0",
+            THINKDEV_TERMINAL_POOL="0",
+        )
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--log-level", "warning"],
+            cwd=BASE_DIR, env=env,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                self.post("/login", {"password": self.password})
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError("server did not start")
+
+    def stop(self) -> None:
+        if self.proc:
+            self.proc.terminate()
+            self.proc.wait(10)
+
+    def post(self, path: str, form: dict) -> str:
+        data = urllib.parse.urlencode(form).encode()
+        with self.opener.open(self.base + path, data=data, timeout=30) as r:
+            return r.read().decode()
+
+    def delete(self, path: str) -> None:
+        req = urllib.request.Request(self.base + path, method="DELETE")
+        self.opener.open(req, timeout=30).close()
+
+    def cookie_header(self) -> str:
+        return "; ".join(f"{c.name}={c.value}" for c in self.cookies)
+
+    async def create_session(self) -> tuple[str, float]:
+        """New session id and how long POST /terminal/create took."""
+        t0 = time.perf_counter()
+        html = await asyncio.to_thread(self.post, "/terminal/create", {"project_id": _PROJECT, "name": "bench"})
+        elapsed = time.perf_counter() - t0
+        # The panel lists every session of the project; the new one is the one we don't know
+        new = [sid for sid in _SESSION_ID.findall(html) if sid not in self.sessions]
+        self.sessions.extend(new)
+        return new[-1], elapsed
+
+    def connect(self, session_id: str, query: str = ""):
+        url = f"ws://127.0.0.1:{self.port}/ws/terminal/{session_id}?proto=1{query}"
+        return connect(url, additional_headers={"Cookie": self.cookie_header()}, max_size=None)
+
+
+async def _read_until(ws, needle: bytes, timeout: float) -> tuple[int, int]:
+    """Read OUTPUT frames until ``needle`` appears. Returns (bytes, start offset)."""
+    nbytes, start, tail = 0, None, b""
+    deadline = time.monotonic() + timeout
+    while True:
+        frame = await asyncio.wait_for(ws.recv(), max(deadline - time.monotonic(), 0.001))
+        if frame[0] == OP_OFFSET and start is None:
+            start = OFFSET.unpack_from(frame, 1)[0]
+        elif frame[0] == OP_OUTPUT:
+            nbytes += len(frame) - 1
+            tail = (tail + frame[1:])[-256:]
+            if needle in tail:
+                return nbytes, start or 0
+
+
+async def _wait_prompt(server: Server, session_id: str) -> None:
+    """Wait for the shell's first prompt (the rc files' marker). Read as a raw
+    replay: a screen snapshot would not contain the marker."""
+    async with server.connect(session_id, "&since=0") as ws:
+        await _read_until(ws, PROMPT_MARKER, 60)
+
+
+async def _settle(ws, quiet: float = 0.5) -> int:
+    """Drain until the session is quiet; returns the bytes read."""
+    nbytes = 0
+    try:
+        while True:
+            frame = await asyncio.wait_for(ws.recv(), quiet)
+            if frame[0] == OP_OUTPUT:
+                nbytes += len(frame) - 1
+    except asyncio.TimeoutError:
+        return nbytes
+
+
+async def bench_throughput(server: Server, subscribers: int, lines: int) -> dict:
+    session_id, _ = await server.create_session()
+    await _wait_prompt(server, session_id)
+    clients = [await server.connect(session_id) for _ in range(subscribers)]
+    await asyncio.gather(*(_settle(ws) for ws in clients))
+    t0 = time.perf_counter()
+    # The quotes keep the echoed command line from matching the marker
+    await clients[0].send(bytes([OP_INPUT]) + f"seq 1 {lines}; echo __BENCH_''DONE__\n".encode())
+    results = await asyncio.gather(*(_read_until(ws, _MARKER, 120) for ws in clients))
+    elapsed = time.perf_counter() - t0
+    for ws in clients:
+        await ws.close()
+    nbytes = min(n for n, _ in results)
+    return {
+        "subscribers": subscribers,
+        "bytes": nbytes,
+        "seconds": round(elapsed, 3),
+        "bytes_per_sec_per_client": round(nbytes / elapsed),
+        "bytes_per_sec_total": round(nbytes * subscribers / elapsed),
+        "session_id": session_id,
+    }
+
+
+async def bench_echo(server: Server, samples: int) -> dict:
+    session_id, _ = await server.create_session()
+    await _wait_prompt(server, session_id)
+    async with server.connect(session_id) as ws:
+        await _settle(ws)
+        # Kernel-echoed keystrokes into a reader that prints nothing itself
+        await ws.send(bytes([OP_INPUT]) + b"cat > /dev/null\n")
+        await _settle(ws)
+        rtt = []
+        for i in range(samples):
+            key = bytes([ord("a") + i % 26])
+            t0 = time.perf_counter()
+            await ws.send(bytes([OP_INPUT]) + key)
+            while True:
+                frame = await asyncio.wait_for(ws.recv(), 5)
+                if frame[0] == OP_OUTPUT and key in frame[1:]:
+                    break
+            rtt.append(time.perf_counter() - t0)
+        await ws.send(bytes([OP_INPUT]) + b"\x03")
+    return _ms(rtt)
+
+
+async def bench_create(server: Server, count: int) -> dict:
+    times = []
+    for _ in range(count):
+        _, elapsed = await server.create_session()
+        times.append(elapsed)
+    return _ms(times)
+
+
+async def bench_reconnect(server: Server, session_id: str, rounds: int) -> dict:
+    """Against the session the throughput run filled with output."""
+    snapshot, replay = [], []
+    replay_bytes = 0
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        async with server.connect(session_id) as ws:
+            while (await ws.recv())[0] != OP_OUTPUT:
+                pass
+            snapshot.append(time.perf_counter() - t0)
+            # After the snapshot the server sends the current end offset
+            while (frame := await ws.recv())[0] != OP_OFFSET:
+                pass
+            end = OFFSET.unpack_from(frame, 1)[0]
+        since = max(end - TERMINAL_BUFFER_SIZE, 0)
+        t0 = time.perf_counter()
+        async with server.connect(session_id, f"&since={since}") as ws:
+            replay_bytes = 0
+            while replay_bytes < end - since:
+                frame = await asyncio.wait_for(ws.recv(), 10)
+                if frame[0] == OP_OUTPUT:
+                    replay_bytes += len(frame) - 1
+            replay.append(time.perf_counter() - t0)
+    return {"snapshot_first_frame": _ms(snapshot), "raw_replay": _ms(replay), "replay_bytes": replay_bytes}
+
+
+async def bench_idle_memory(server: Server, count: int) -> dict:
+    rss0 = _rss(server.proc.pid)
+    for _ in range(count):
+        await server.create_session()
+    await asyncio.sleep(5)  # let the shells finish starting
+    shells = [int(p) for p in os.listdir("/proc") if p.isdigit() and _ppid(int(p)) == server.proc.pid]
+    shell_rss = sum(t["rss_pages"] for t in proc_stats.scan_sessions(shells).values()) * proc_stats.PAGE_SIZE
+    return {
+        "sessions": count,
+        "server_rss_per_session_kb": round((_rss(server.proc.pid) - rss0) / count / 1024, 1),
+        "shell_rss_per_session_kb": round(shell_rss / max(len(shells), 1) / 1024, 1),
+    }
+
+
+def _ppid(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+        return int(stat[stat.rfind(b")") + 2:].split()[1])
+    except (OSError, ValueError, IndexError):
+        return -1
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=4, help="clients for the N-subscriber throughput run")
+    parser.add_argument("--lines", type=int, default=200000, help="lines of `seq` output per throughput run")
+    parser.add_argument("--echo-samples", type=int, default=200)
+    parser.add_argument("--creates", type=int, default=20)
+    parser.add_argument("--reconnects", type=int, default=20)
+    parser.add_argument("--idle-sessions", type=int, default=20)
+    args = parser.parse_args()
+
+    created_workspace = not workspace.resolve(_PROJECT).exists()
+    server = Server()
+    server.start()
+    try:
+        one = await bench_throughput(server, 1, args.lines)
+        many = await bench_throughput(server, args.subscribers, args.lines)
+        result = {
+            "timestamp": int(time.time()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "throughput": [
+                {k: v for k, v in run.items() if k != "session_id"} for run in (one, many)
+            ],
+            "echo_rtt": await bench_echo(server, args.echo_samples),
+            "create": await bench_create(server, args.creates),
+            "reconnect": await bench_reconnect(server, one["session_id"], args.reconnects),
+            "idle_memory": await bench_idle_memory(server, args.idle_sessions),
+        }
+        print(json.dumps(result, indent=2))
+    finally:
+        for session_id in server.sessions:
+            try:
+                server.delete(f"/terminal/{session_id}")
+            except OSError:
+                pass
+        server.stop()
+        if created_workspace:
+            shutil.rmtree(workspace.resolve(_PROJECT), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
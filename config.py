@@ -14,9 +14,110 @@ STATIC_DIR = BASE_DIR / "static"
 
 SERVER_HOST = os.getenv("THINKDEV_HOST", "0.0.0.0")
 SERVER_PORT = int(os.getenv("THINKDEV_PORT", "19080"))
+SERVER_WORKERS = int(os.getenv("THINKDEV_WORKERS", "1"))
 
 TERMINAL_BUFFER_SIZE = 100 * 1024  # 100KB per session
 TERMINAL_SHELL = os.getenv("SHELL", "/bin/bash")
+# "event": register the PTY fd with the event loop (add_reader), zero idle cost.
+# "executor": legacy polling read in the default thread pool.
+TERMINAL_READER_MODE = os.getenv("THINKDEV_TERMINAL_READER", "event")
+TERMINAL_READ_CHUNK = 64 * 1024  # max bytes drained per readiness callback
+# Shell spawning: "posix_spawn" (no copy of the server's address space) or "fork".
+TERMINAL_SPAWN_MODE = os.getenv("THINKDEV_TERMINAL_SPAWN", "posix_spawn")
+# Idle pre-started shells kept per project so new terminals open instantly (0 = off).
+TERMINAL_POOL_SIZE = int(os.getenv("THINKDEV_TERMINAL_POOL", "0"))
+TERMINAL_POOL_PROJECTS = 8  # projects with a warm pool; least recently used is drained
+TERMINAL_STATUS_BATCH_DELAY = 0.25  # seconds; session status changes are written to the DB in batches
+TERMINAL_STOP_GRACE = 3.0  # seconds between the SIGHUP of Stop and a SIGKILL
+# A session created with an initial command gets it as soon as the shell prints
+# its first prompt (OSC 133;A marker from our rc files), or after this timeout
+TERMINAL_READY_TIMEOUT = 10.0
+# Output coalescing: merge PTY chunks up to this many bytes or this many seconds
+# before fanning out to subscribers (0 bytes disables). Output after an idle
+# period is sent immediately so keystroke echo is not delayed.
+TERMINAL_COALESCE_BYTES = int(os.getenv("THINKDEV_TERMINAL_COALESCE_BYTES", str(16 * 1024)))
+TERMINAL_COALESCE_WINDOW = float(os.getenv("THINKDEV_TERMINAL_COALESCE_MS", "4")) / 1000
+# Optional per-session append-only log of all output (deep history, read via mmap)
+TERMINAL_LOG_ENABLED = os.getenv("THINKDEV_TERMINAL_LOG", "0") == "1"
+TERMINAL_LOG_DIR = WORKSPACE_DIR / ".terminal_logs"
+# Session recording (asciicast v2 + seek index); POST /terminal/create can also ask per session
+TERMINAL_RECORD = os.getenv("THINKDEV_TERMINAL_RECORD", "0") == "1"
+TERMINAL_RECORD_DIR = WORKSPACE_DIR / ".terminal_recordings"
+TERMINAL_RECORD_FLUSH = 0.5  # seconds between batched writes
+TERMINAL_RECORD_KEYFRAME = 30.0  # seconds between screen-snapshot seek points
+TERMINAL_SUBSCRIBER_QUEUE = 512  # chunks queued per client before it is marked stale and resynced
+# Input not yet accepted by the PTY: WebSocket readers wait above the soft
+# limit; writes that would pass the hard cap are refused.
+TERMINAL_INPUT_BACKLOG = 256 * 1024
+TERMINAL_INPUT_BACKLOG_MAX = 4 * TERMINAL_INPUT_BACKLOG
+# Multiplexed WebSocket: hidden channels and session lists are polled at this interval
+TERMINAL_MUX_POLL_INTERVAL = 1.0
+# Idle hibernation: sessions with no clients and no I/O for this long have their
+# buffers spilled to disk (0 disables); THINKDEV_TERMINAL_IDLE_STOP=1 also SIGSTOPs them
+TERMINAL_IDLE_TIMEOUT = float(os.getenv("THINKDEV_TERMINAL_IDLE", "600"))
+TERMINAL_IDLE_STOP = os.getenv("THINKDEV_TERMINAL_IDLE_STOP", "0") == "1"
+TERMINAL_IDLE_CHECK_INTERVAL = 30.0
+TERMINAL_HIBERNATE_DIR = WORKSPACE_DIR / ".terminal_hibernate"
+# Per-session CPU/memory sampling from /proc, and limits (0 disables a limit).
+# A session over a limit for TERMINAL_LIMIT_GRACE samples in a row is reniced
+# by TERMINAL_RENICE, or has its foreground job stopped with action "pause".
+TERMINAL_RESOURCE_INTERVAL = 5.0
+TERMINAL_CPU_LIMIT = float(os.getenv("THINKDEV_TERMINAL_CPU_LIMIT", "0"))  # percent of one core
+TERMINAL_RSS_LIMIT_MB = int(os.getenv("THINKDEV_TERMINAL_RSS_LIMIT_MB", "0"))
+TERMINAL_LIMIT_ACTION = os.getenv("THINKDEV_TERMINAL_LIMIT_ACTION", "renice")  # "renice" | "pause"
+TERMINAL_LIMIT_GRACE = 3
+TERMINAL_RENICE = 10
+# Read-side flow control: stop reading the PTY while every client is more than
+# FLOW_HIGH bytes behind, resume once one is within FLOW_LOW. Kept well under the
+# buffer size so a paused client never loses its place. With PAUSE_DETACHED a
+# session with no clients attached is not read at all (the child blocks).
+TERMINAL_FLOW_HIGH = TERMINAL_BUFFER_SIZE // 2
+TERMINAL_FLOW_LOW = TERMINAL_BUFFER_SIZE // 8
+TERMINAL_PAUSE_DETACHED = os.getenv("THINKDEV_TERMINAL_PAUSE_DETACHED", "0") == "1"
+# Out-of-process PTY supervisor (services/pty_supervisor.py). When a socket path
+# is set, terminals live in that daemon and survive web worker restarts; it is
+# required (and defaulted) when running more than one worker.
+TERMINAL_SUPERVISOR_DEFAULT_SOCKET = str(BASE_DIR / "thinkdev-pty.sock")
+TERMINAL_SUPERVISOR_SOCKET = os.getenv("THINKDEV_TERMINAL_SUPERVISOR", "")
+if SERVER_WORKERS > 1 and not TERMINAL_SUPERVISOR_SOCKET:
+    TERMINAL_SUPERVISOR_SOCKET = TERMINAL_SUPERVISOR_DEFAULT_SOCKET
+# Server-side screen model (needs pyte): new clients get a snapshot instead of raw
+# history. Off by default: parsing costs about a second of CPU per MB of output.
+TERMINAL_SCREEN_MODEL = os.getenv("THINKDEV_TERMINAL_SCREEN", "0") == "1"
+TERMINAL_SCREEN_HISTORY = 1000  # scrollback lines kept by the screen model
+TERMINAL_SCREEN_FEED_DELAY = 0.05  # seconds; output is fed to the model in batches
+TERMINAL_SCREEN_FEED_MAX = 32 * 1024  # bytes per batch, parsed in a worker thread
+# Searchable output history (services/terminal_search.py)
+TERMINAL_SEARCH_ENABLED = os.getenv("THINKDEV_TERMINAL_SEARCH", "0") == "1"
+TERMINAL_SEARCH_MAX_CHARS = 2 * 1024 * 1024  # indexed text kept per session
+TERMINAL_SEARCH_MAX_LINE = 1024  # longer lines are truncated
+TERMINAL_SEARCH_INDEX_DELAY = 0.25  # seconds; output is indexed in batches
+TERMINAL_SEARCH_INDEX_MAX = 64 * 1024  # bytes per batch, indexed in a worker thread
+
+
+# Non-interactive exec API (services/exec_service.py): jobs beyond the concurrency
+# limit queue up to EXEC_QUEUE_MAX, then are refused
+EXEC_MAX_CONCURRENT = int(os.getenv("THINKDEV_EXEC_CONCURRENCY", str(os.cpu_count() or 4)))
+EXEC_QUEUE_MAX = 64
+EXEC_TIMEOUT = 600.0  # seconds, default per job
+EXEC_MAX_TIMEOUT = 3600.0
+EXEC_OUTPUT_CAP = 8 * 1024 * 1024  # characters streamed per job; the rest is discarded
+EXEC_KILL_GRACE = 2.0  # seconds between SIGTERM and SIGKILL
+
+# Live file tree: inotify (polling where unavailable) on folders the browser has open
+FS_WATCH_ENABLED = os.getenv("THINKDEV_FS_WATCH", "1") == "1"
+FS_WATCH_COALESCE = 0.2  # seconds of filesystem events batched into one tree update
+FS_WATCH_POLL_INTERVAL = 2.0  # seconds between folder mtime checks in polling mode
+FS_IGNORE_DEFAULTS = os.getenv(
+    "THINKDEV_FS_IGNORE", "node_modules/,__pycache__/,venv/,.venv/,dist/,target/,*.pyc"
+).split(",")  # shown dimmed in the tree, under .gitignore / .thinkdevignore
+FS_CACHE_MAX_DIRS = int(os.getenv("THINKDEV_FS_CACHE_DIRS", "4096"))  # cached folder listings, all projects (0 disables)
+FS_CACHE_MAX_FILES = int(os.getenv("THINKDEV_FS_CACHE_FILES", "4096"))  # cached file metadata, all projects (0 disables)
+
+# Editor: bigger text files open read-only, a page of lines at a time
+EDITOR_INLINE_MAX = int(os.getenv("THINKDEV_EDITOR_INLINE_MAX", str(2 * 1024 * 1024)))  # bytes
+EDITOR_PAGE_LINES = 500
+FILE_RAW_CHUNK = 256 * 1024  # bytes per read when streaming /files/{id}/raw
 
 # ── Auth ──────────────────────────────────────────────────────────────────────
 _ENV_PATH = BASE_DIR / ".env"
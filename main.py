@@ -1,3 +1,5 @@
+import asyncio
+
 import uvicorn
 from contextlib import asynccontextmanager
 
@@ -8,15 +10,17 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.requests import Request
 
-from config import STATIC_DIR, SERVER_HOST, SERVER_PORT, SESSION_SECRET
+from config import STATIC_DIR, SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SESSION_SECRET, TERMINAL_SUPERVISOR_SOCKET
 from database import init_db
 from routes.auth import router as auth_router
 from routes.pages import router as pages_router
 from routes.projects import router as projects_router
-from routes.files import router as files_router
+from routes.files import router as files_router, ws_router as files_ws_router
 from routes.git import router as git_router
-from routes.terminal import router as terminal_router, ws_router as terminal_ws_router
-from services.terminal_manager import TerminalSessionManager
+from routes.exec import router as exec_router, ws_router as exec_ws_router
+from routes.terminal import router as terminal_router, ws_router as terminal_ws_router, get_manager as get_terminal_manager
+from services.session_status import sync_session_status
+from services.supervisor_client import ensure_supervisor
 
 _PUBLIC_PATHS = {"/login", "/logout"}
 
@@ -41,8 +45,17 @@ class AuthMiddleware(BaseHTTPMiddleware):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    status_task = None
+    if TERMINAL_SUPERVISOR_SOCKET:
+        # Terminals live in the supervisor daemon and survive this worker
+        await asyncio.to_thread(ensure_supervisor)
+    else:
+        # Write session status changes from the child reaper to the DB
+        status_task = asyncio.create_task(sync_session_status(get_terminal_manager()))
     yield
-    TerminalSessionManager.get_instance().cleanup_all()
+    if status_task:
+        status_task.cancel()
+    get_terminal_manager().cleanup_all()
 
 
 app = FastAPI(title="ThinkDev AI", lifespan=lifespan)
@@ -57,10 +70,16 @@ app.include_router(auth_router)
 app.include_router(pages_router)
 app.include_router(projects_router)
 app.include_router(files_router)
+app.include_router(files_ws_router)
 app.include_router(git_router)
 app.include_router(terminal_router)
 app.include_router(terminal_ws_router)
+app.include_router(exec_router)
+app.include_router(exec_ws_router)
 
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host=SERVER_HOST, port=SERVER_PORT, reload=False)
+    if TERMINAL_SUPERVISOR_SOCKET:
+        # Start it once here so N workers don't race to spawn it
+        ensure_supervisor()
+    uvicorn.run("main:app", host=SERVER_HOST, port=SERVER_PORT, reload=False, workers=SERVER_WORKERS)
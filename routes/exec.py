@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+from schemas import ExecRequest
+from services.exec_service import ExecRejected, ExecService
+
+router = APIRouter(prefix="/exec", tags=["exec"])
+
+
+@router.get("/stats")
+async def exec_stats():
+    return JSONResponse(ExecService.get_instance().stats())
+
+
+@router.post("/{project_id}")
+async def exec_command(project_id: str, req: ExecRequest):
+    """Run argv in the project workspace (no PTY, no shell) and stream its
+    events as NDJSON: queued/started, stdout/stderr chunks, then exit."""
+    try:
+        job = ExecService.get_instance().submit(project_id, req.argv, req.cwd, req.env, req.timeout)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except ExecRejected as e:
+        return JSONResponse({"error": str(e)}, status_code=429)
+
+    async def stream():
+        async for event in job.events():
+            yield json.dumps(event) + "\n"
+
+    # Frees the queue place if the client left before the stream started
+    return StreamingResponse(stream(), media_type="application/x-ndjson", background=BackgroundTask(job.release))
+
+
+# WebSocket endpoint — separate router to avoid prefix issues
+ws_router = APIRouter(tags=["exec-ws"])
+
+
+@ws_router.websocket("/ws/exec/{project_id}")
+async def exec_websocket(websocket: WebSocket, project_id: str):
+    """Same as POST /exec/{project_id}: the first text frame is the request
+    JSON, every event is a JSON text frame. Closing the socket or sending
+    {"type": "cancel"} kills the job."""
+    await websocket.accept()
+    try:
+        req = ExecRequest(**json.loads(await websocket.receive_text()))
+        job = ExecService.get_instance().submit(project_id, req.argv, req.cwd, req.env, req.timeout)
+    except WebSocketDisconnect:
+        return
+    except (ValueError, TypeError, ExecRejected) as e:
+        await websocket.send_text(json.dumps({"type": "error", "error": str(e)}))
+        await websocket.close()
+        return
+
+    events = job.events()
+
+    async def forward():
+        async for event in events:
+            await websocket.send_text(json.dumps(event))
+        await websocket.close()
+
+    async def watch():
+        """Return when the client goes away or sends {"type": "cancel"}."""
+        while True:
+            msg = await websocket.receive()
+            if msg.get("type") == "websocket.disconnect":
+                return
+            try:
+                if json.loads(msg.get("text") or "{}").get("type") == "cancel":
+                    return
+            except ValueError:
+                pass
+
+    forward_task = asyncio.create_task(forward())
+    watch_task = asyncio.create_task(watch())
+    try:
+        await asyncio.wait([forward_task, watch_task], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        forward_task.cancel()
+        watch_task.cancel()
+        await asyncio.gather(forward_task, watch_task, return_exceptions=True)
+        # Kills the job if it is still running; frees its queue place if it never started
+        await events.aclose()
+        job.release()
@@ -1,32 +1,108 @@
-from fastapi import APIRouter, Request, Form
-from fastapi.responses import HTMLResponse
+import asyncio
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+from email.utils import formatdate
+from typing import Optional
+from urllib.parse import quote
+
+from fastapi import APIRouter, Request, Form, WebSocket
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.templating import Jinja2Templates
 
-from config import TEMPLATES_DIR
+from config import EDITOR_INLINE_MAX, EDITOR_PAGE_LINES, FILE_RAW_CHUNK, FS_WATCH_ENABLED, TEMPLATES_DIR
 from services import file_service
 from services.file_service import PathTraversalError
+from services.fs_watcher import FileWatchService
+from services.metadata_cache import cache
 
 router = APIRouter(prefix="/files", tags=["files"])
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
 
-@router.get("/{project_id}/tree", response_class=HTMLResponse)
-async def file_tree(project_id: str, request: Request):
-    try:
-        tree = file_service.list_tree(project_id)
-        return templates.TemplateResponse("partials/file_tree.html", {
+def _tree_id(path: str, kind: str = "n") -> str:
+    """Stable DOM id of a tree node ("n") or of a folder's children ("c"),
+    the targets of the live tree's out-of-band swaps."""
+    return f"ft{kind}-" + hashlib.blake2b(path.encode(), digest_size=8).hexdigest()
+
+
+def _filesize(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+templates.env.filters["tree_id"] = _tree_id
+templates.env.filters["filesize"] = _filesize
+
+
+def _depth(path: str) -> int:
+    return len(path.split("/")) if path else 0
+
+
+async def _render_dir(request: Request, project_id: str, path: str = "", toast: str = ""):
+    """One level of the tree: the whole panel (toolbar included) for the
+    project root, just the child nodes for a folder. The listing is made in
+    a worker thread: a big folder is a scandir plus an ignore match per
+    entry."""
+    path = path.strip("/")
+    nodes = await asyncio.to_thread(file_service.list_dir, project_id, path)
+    return templates.TemplateResponse(
+        "partials/file_tree_nodes.html" if path else "partials/file_tree.html",
+        {
             "request": request,
-            "tree": tree,
+            "nodes": nodes,
             "project_id": project_id,
-        })
+            "depth": _depth(path),
+            "toast": toast,
+        },
+    )
+
+
+@router.get("/watch-stats")
+async def watch_stats():
+    if not FS_WATCH_ENABLED:
+        return JSONResponse({"backend": "disabled"})
+    return JSONResponse(FileWatchService.get_instance().stats())
+
+
+@router.get("/cache-stats")
+async def cache_stats():
+    return JSONResponse(cache.stats())
+
+
+@router.get("/{project_id}/tree", response_class=HTMLResponse)
+async def file_tree(project_id: str, request: Request, path: str = ""):
+    try:
+        return await _render_dir(request, project_id, path)
+    except PathTraversalError:
+        return HTMLResponse('<div class="error">Access denied</div>', status_code=403)
+    except FileNotFoundError:
+        return HTMLResponse('<div class="error">Folder not found</div>', status_code=404)
     except Exception as e:
         return HTMLResponse(f'<div class="error">{e}</div>', status_code=500)
 
 
 @router.get("/{project_id}/read", response_class=HTMLResponse)
 async def read_file(project_id: str, path: str, request: Request):
+    """Open a file: inline in the editor, as read-only pages of lines when
+    it is over EDITOR_INLINE_MAX, or just its size and a raw link when it
+    is binary."""
     try:
-        content = file_service.read_file(project_id, path)
+        info = await asyncio.to_thread(file_service.file_info, project_id, path)
+        context = {"request": request, "project_id": project_id, "file_path": path, "size": info["size"]}
+        if info["binary"]:
+            return templates.TemplateResponse("partials/editor_binary.html", context)
+        if info["size"] > EDITOR_INLINE_MAX:
+            page = await asyncio.to_thread(file_service.read_page, project_id, path, 0, EDITOR_PAGE_LINES)
+            return templates.TemplateResponse("partials/editor_paged.html", {
+                **context, **page, "page_lines": EDITOR_PAGE_LINES,
+            })
+        content = await asyncio.to_thread(file_service.read_file, project_id, path)
         return templates.TemplateResponse("partials/editor.html", {
             "request": request,
             "project_id": project_id,
@@ -42,6 +118,126 @@ async def read_file(project_id: str, path: str, request: Request):
         return HTMLResponse(f'<div class="error">{e}</div>', status_code=500)
 
 
+@router.get("/{project_id}/page", response_class=HTMLResponse)
+async def read_page(project_id: str, path: str, request: Request, start: int = 0, line: int = 0):
+    """One page of a large file; ``line`` (1-based, the "go to" box) wins
+    over ``start`` (0-based)."""
+    if line > 0:
+        start = line - 1
+    try:
+        page = await asyncio.to_thread(file_service.read_page, project_id, path, start, EDITOR_PAGE_LINES)
+        return templates.TemplateResponse("partials/editor_page.html", {
+            "request": request, "project_id": project_id, "file_path": path,
+            **page, "page_lines": EDITOR_PAGE_LINES,
+        })
+    except PathTraversalError:
+        return HTMLResponse('<div class="error">Access denied</div>', status_code=403)
+    except FileNotFoundError:
+        return HTMLResponse('<div class="error">File not found</div>', status_code=404)
+
+
+class _FileRangeResponse(Response):
+    """``count`` bytes of a file from ``offset``. Uses the server's ASGI
+    zero-copy extension (sendfile) when it offers one, otherwise reads
+    FILE_RAW_CHUNK at a time off the event loop."""
+
+    def __init__(self, path, offset: int, count: int, status_code: int, headers: dict, media_type: str):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.offset = offset
+        self.count = count
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or not self.count:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        with open(self.path, "rb") as f:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend", "file": f,
+                    "offset": self.offset, "count": self.count, "more_body": False,
+                })
+                return
+            pos, remaining = self.offset, self.count
+            while remaining > 0:
+                chunk = await asyncio.to_thread(os.pread, f.fileno(), min(FILE_RAW_CHUNK, remaining), pos)
+                if not chunk:
+                    break  # truncated while sending
+                pos += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _byte_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """(first, last) byte of a single "bytes=" range, or None to send the
+    whole file (malformed or multi-range). ValueError: not satisfiable."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep or not (first or last) or not (first + last).isdigit():
+        return None
+    if not first:  # "-N": the last N bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError("unsatisfiable range")
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("unsatisfiable range")
+    return start, end
+
+
+@router.api_route("/{project_id}/raw", methods=["GET", "HEAD"])
+async def raw_file(project_id: str, path: str, request: Request, download: bool = False):
+    """The file's bytes as-is, with ETag / If-None-Match and single-range
+    requests (Range, If-Range) for seeking in large files. Served sandboxed
+    so a workspace HTML file cannot script the app."""
+    try:
+        info = await asyncio.to_thread(file_service.file_info, project_id, path)
+    except PathTraversalError:
+        return JSONResponse({"error": "Access denied"}, status_code=403)
+    except FileNotFoundError:
+        return JSONResponse({"error": "File not found"}, status_code=404)
+
+    etag, size = info["etag"], info["size"]
+    name = quote(posixpath.basename(path))
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(info["mtime"], usegmt=True),
+        "accept-ranges": "bytes",
+        "cache-control": "no-cache",
+        "content-security-policy": "sandbox",
+        "x-content-type-options": "nosniff",
+        "content-disposition": f"{'attachment' if download else 'inline'}; filename*=UTF-8''{name}",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    ]):
+        return Response(status_code=304, headers=headers)
+
+    offset, count, status = 0, size, 200
+    range_header = request.headers.get("range")
+    # If-Range: only honour the range if the client's copy is still current
+    if range_header and request.headers.get("if-range", etag) == etag:
+        try:
+            byte_range = _byte_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+        if byte_range:
+            offset, count, status = byte_range[0], byte_range[1] - byte_range[0] + 1, 206
+            headers["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{size}"
+    headers["content-length"] = str(count)
+    media_type = mimetypes.guess_type(path)[0] or (
+        "application/octet-stream" if info["binary"] else "text/plain; charset=utf-8"
+    )
+    return _FileRangeResponse(info["path"], offset, count, status, headers, media_type)
+
+
 @router.post("/{project_id}/save", response_class=HTMLResponse)
 async def save_file(
     project_id: str,
@@ -79,13 +275,8 @@ async def create_item(
 ):
     try:
         file_service.create_file(project_id, path, is_directory=is_directory)
-        tree = file_service.list_tree(project_id)
-        return templates.TemplateResponse("partials/file_tree.html", {
-            "request": request,
-            "tree": tree,
-            "project_id": project_id,
-            "toast": f"Created {'folder' if is_directory else 'file'}: {path}",
-        })
+        return await _render_dir(request, project_id, posixpath.dirname(path.strip("/")),
+                           f"Created {'folder' if is_directory else 'file'}: {path}")
     except (PathTraversalError, FileExistsError) as e:
         return HTMLResponse(f'<div class="error">{e}</div>', status_code=400)
 
@@ -99,13 +290,9 @@ async def rename_item(
 ):
     try:
         file_service.rename_item(project_id, old_path, new_path)
-        tree = file_service.list_tree(project_id)
-        return templates.TemplateResponse("partials/file_tree.html", {
-            "request": request,
-            "tree": tree,
-            "project_id": project_id,
-            "toast": f"Renamed: {old_path} → {new_path}",
-        })
+        # The client refreshes the old parent folder itself if it differs
+        return await _render_dir(request, project_id, posixpath.dirname(new_path.strip("/")),
+                           f"Renamed: {old_path} → {new_path}")
     except (PathTraversalError, FileNotFoundError, FileExistsError) as e:
         return HTMLResponse(f'<div class="error">{e}</div>', status_code=400)
 
@@ -118,12 +305,50 @@ async def delete_item(
 ):
     try:
         file_service.delete_item(project_id, path)
-        tree = file_service.list_tree(project_id)
-        return templates.TemplateResponse("partials/file_tree.html", {
-            "request": request,
-            "tree": tree,
-            "project_id": project_id,
-            "toast": f"Deleted: {path}",
-        })
+        return await _render_dir(request, project_id, posixpath.dirname(path.strip("/")), f"Deleted: {path}")
     except (PathTraversalError, FileNotFoundError) as e:
         return HTMLResponse(f'<div class="error">{e}</div>', status_code=400)
+
+
+# WebSocket endpoint — separate router to avoid prefix issues
+ws_router = APIRouter(tags=["files-ws"])
+
+
+@ws_router.websocket("/ws/files/{project_id}")
+async def file_tree_websocket(websocket: WebSocket, project_id: str):
+    """Live file tree. The client sends {"watch": "<folder>"} for every
+    folder listing it shows ("" is the project root); the server answers
+    each change with an HTML fragment of hx-swap-oob elements."""
+    await websocket.accept()
+    if not FS_WATCH_ENABLED:
+        await websocket.close(code=1008, reason="File watching is disabled")
+        return
+    sub = FileWatchService.get_instance().subscribe(project_id)
+    delta = templates.env.get_template("partials/file_tree_delta.html")
+
+    async def receive():
+        while True:
+            try:
+                folder = str(json.loads(await websocket.receive_text()).get("watch", "")).strip("/")
+            except (ValueError, AttributeError):
+                continue
+            try:
+                await sub.watch(folder)
+            except (ValueError, OSError):
+                pass  # gone or outside the project: nothing to keep live
+
+    async def send():
+        while True:
+            update = await sub.updates.get()
+            await websocket.send_text(delta.render(
+                update=update, project_id=project_id, depth=_depth(update["dir"]),
+            ))
+
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(send())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        sub.close()
@@ -1,20 +1,49 @@
+import asyncio
+import json
+import logging
 import uuid
 
 from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect, Depends, Form
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from config import TEMPLATES_DIR
+from config import TEMPLATES_DIR, TERMINAL_SUPERVISOR_SOCKET
 from database import get_db
 from models import TerminalSession as TerminalSessionModel
+from services import recording
+from services.supervisor_client import SupervisorClient, maybe_await
 from services.terminal_manager import TerminalSessionManager
+from services.terminal_mux import TerminalMux
+from services.terminal_search import compile_query
+from services.terminal_protocol import (
+    OFFSET,
+    OP_ACK,
+    OP_ENDED,
+    OP_INPUT,
+    OP_OFFSET,
+    OP_OUTPUT,
+    OP_PING,
+    OP_PONG,
+    OP_RESIZE,
+    OP_SNAPSHOT,
+    PROTOCOL_VERSION,
+    RESIZE,
+    InputBatcher,
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/terminal", tags=["terminal"])
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
 
 def get_manager() -> TerminalSessionManager:
+    """In-process manager, or the PTY supervisor client when one is configured.
+    Calls that return a result go through maybe_await() (the client's are
+    coroutines)."""
+    if TERMINAL_SUPERVISOR_SOCKET:
+        return SupervisorClient.get_instance()
     return TerminalSessionManager.get_instance()
 
 
@@ -23,22 +52,30 @@ async def create_session(
     request: Request,
     project_id: str = Form(...),
     name: str = Form("bash"),
+    record: str = Form(""),
+    command: str = Form(""),
     db: AsyncSession = Depends(get_db),
 ):
     try:
         manager = get_manager()
         session_id = str(uuid.uuid4())
 
-        # Create pty session
-        manager.create_session(session_id, project_id, name)
+        # Create pty session; record=1 records it even when TERMINAL_RECORD is off.
+        # ``command`` is typed in by the manager once the shell shows its prompt.
+        await maybe_await(manager.create_session(session_id, project_id, name, True if record == "1" else None,
+                                                 command or None))
 
         # Persist to DB
         db_session = TerminalSessionModel(id=session_id, project_id=project_id, name=name, status="running")
         db.add(db_session)
         await db.commit()
 
+        if command:
+            # Render once the command is running, so the client attaches to it
+            await manager.wait_ready(session_id)
+
         # Return updated terminal panel
-        sessions = manager.list_sessions(project_id)
+        sessions = await maybe_await(manager.list_sessions(project_id))
         return templates.TemplateResponse("partials/terminal_panel.html", {
             "request": request,
             "sessions": sessions,
@@ -52,10 +89,9 @@ async def create_session(
 @router.get("/sessions/{project_id}", response_class=HTMLResponse)
 async def list_sessions(project_id: str, request: Request):
     manager = get_manager()
-    sessions = manager.list_sessions(project_id)
-    # Check alive status
-    for s in sessions:
-        manager._check_alive(s)
+    # The project was just opened: have idle shells ready for its first tab
+    await maybe_await(manager.warm_pool(project_id))
+    sessions = await maybe_await(manager.list_sessions(project_id))
     return templates.TemplateResponse("partials/terminal_panel.html", {
         "request": request,
         "sessions": sessions,
@@ -64,26 +100,100 @@ async def list_sessions(project_id: str, request: Request):
     })
 
 
+@router.get("/spawn-stats")
+async def spawn_stats():
+    """Spawn mode, shell pool usage and time-to-first-prompt percentiles."""
+    return JSONResponse(await maybe_await(get_manager().spawn_stats()))
+
+
+@router.get("/idle-stats")
+async def idle_stats():
+    """Idle hibernation settings and how many sessions are hibernated."""
+    return JSONResponse(await maybe_await(get_manager().idle_stats()))
+
+
+@router.get("/resources")
+async def resource_stats(project_id: str = None):
+    """CPU, memory and PTY I/O per session, sampled from /proc on one timer."""
+    return JSONResponse(await maybe_await(get_manager().resource_stats(project_id)))
+
+
+@router.post("/{session_id}/resume")
+async def resume_session(session_id: str):
+    """Continue a session whose foreground job was paused for exceeding limits."""
+    if not await maybe_await(get_manager().resume_session(session_id)):
+        return JSONResponse({"error": "Session not found or not throttled"}, status_code=404)
+    return JSONResponse({"ok": True})
+
+
+@router.get("/search")
+async def search_project(project_id: str, q: str, limit: int = 100, regex: bool = False, case: bool = False):
+    """Matching output lines across all of a project's sessions, newest first."""
+    try:
+        compile_query(q, regex, case)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    limit = min(max(limit, 1), 1000)
+    results = await maybe_await(get_manager().search_project(project_id, q, limit, regex, case))
+    return JSONResponse({"results": results})
+
+
+@router.get("/{session_id}/search")
+async def search_session(session_id: str, q: str, limit: int = 100, regex: bool = False, case: bool = False):
+    """Matching output lines of one session, newest first. Each result's
+    ``offset`` is where its line starts in the stream (usable as ?since=)."""
+    try:
+        compile_query(q, regex, case)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    limit = min(max(limit, 1), 1000)
+    results = await maybe_await(get_manager().search(session_id, q, limit, regex, case))
+    if results is None:
+        return JSONResponse({"error": "Session not found"}, status_code=404)
+    return JSONResponse({"session_id": session_id, "results": results})
+
+
+@router.get("/recordings")
+async def list_recordings(project_id: str = None):
+    return JSONResponse(recording.list_recordings(project_id))
+
+
+@router.delete("/recordings/{session_id}")
+async def delete_recording(session_id: str):
+    try:
+        recording.delete_recording(session_id)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return JSONResponse({"ok": True})
+
+
+@router.get("/{session_id}/recording")
+async def download_recording(session_id: str, start: float = 0.0):
+    """The recording as an asciicast v2 file, optionally from ``start`` seconds in."""
+    try:
+        header = recording.read_header(session_id)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if header is None:
+        return JSONResponse({"error": "Recording not found"}, status_code=404)
+    return StreamingResponse(
+        recording.iter_cast(session_id, max(start, 0.0)),
+        media_type="application/x-asciicast",
+        headers={"Content-Disposition": f'attachment; filename="{session_id}.cast"'},
+    )
+
+
 @router.post("/{session_id}/stop", response_class=HTMLResponse)
-async def stop_session(
-    session_id: str,
-    request: Request,
-    db: AsyncSession = Depends(get_db),
-):
+async def stop_session(session_id: str, request: Request):
     manager = get_manager()
-    session = manager.get_session(session_id)
+    session = await maybe_await(manager.get_session(session_id))
     if not session:
         return HTMLResponse('<div class="error">Session not found</div>', status_code=404)
 
-    manager.stop_session(session_id)
-
-    # Update DB
-    db_session = await db.get(TerminalSessionModel, session_id)
-    if db_session:
-        db_session.status = "stopped"
-        await db.commit()
+    # The status (in memory and in the DB) changes once the shell has exited
+    await maybe_await(manager.stop_session(session_id))
 
-    sessions = manager.list_sessions(session.project_id)
+    sessions = await maybe_await(manager.list_sessions(session.project_id))
     return templates.TemplateResponse("partials/terminal_panel.html", {
         "request": request,
         "sessions": sessions,
@@ -99,19 +209,19 @@ async def kill_session(
     db: AsyncSession = Depends(get_db),
 ):
     manager = get_manager()
-    session = manager.get_session(session_id)
+    session = await maybe_await(manager.get_session(session_id))
     if not session:
         return HTMLResponse('<div class="error">Session not found</div>', status_code=404)
 
     project_id = session.project_id
-    manager.kill_session(session_id)
+    await maybe_await(manager.kill_session(session_id))
 
     db_session = await db.get(TerminalSessionModel, session_id)
     if db_session:
         db_session.status = "stopped"
         await db.commit()
 
-    sessions = manager.list_sessions(project_id)
+    sessions = await maybe_await(manager.list_sessions(project_id))
     return templates.TemplateResponse("partials/terminal_panel.html", {
         "request": request,
         "sessions": sessions,
@@ -120,10 +230,24 @@ async def kill_session(
     })
 
 
+@router.get("/{session_id}/subscribers")
+async def session_subscribers(session_id: str):
+    manager = get_manager()
+    session = await maybe_await(manager.get_session(session_id))
+    if not session:
+        return JSONResponse({"error": "Session not found"}, status_code=404)
+    return JSONResponse({
+        "session_id": session_id,
+        "paused": session.paused,
+        "flow_pauses": session.flow_pauses,
+        "subscribers": await maybe_await(manager.subscriber_stats(session_id)),
+    })
+
+
 @router.post("/{session_id}/clear", response_class=HTMLResponse)
 async def clear_buffer(session_id: str, request: Request):
     manager = get_manager()
-    manager.clear_buffer(session_id)
+    await maybe_await(manager.clear_buffer(session_id))
     return HTMLResponse("")
 
 
@@ -134,10 +258,10 @@ async def remove_session(
     db: AsyncSession = Depends(get_db),
 ):
     manager = get_manager()
-    session = manager.get_session(session_id)
+    session = await maybe_await(manager.get_session(session_id))
     project_id = session.project_id if session else None
 
-    manager.remove_session(session_id)
+    await maybe_await(manager.remove_session(session_id))
 
     db_session = await db.get(TerminalSessionModel, session_id)
     if db_session:
@@ -145,7 +269,7 @@ async def remove_session(
         await db.commit()
 
     if project_id:
-        sessions = manager.list_sessions(project_id)
+        sessions = await maybe_await(manager.list_sessions(project_id))
         new_active = sessions[0].session_id if sessions else None
         return templates.TemplateResponse("partials/terminal_panel.html", {
             "request": request,
@@ -160,50 +284,162 @@ async def remove_session(
 ws_router = APIRouter(tags=["terminal-ws"])
 
 
+@ws_router.websocket("/ws/terminals")
+async def terminal_mux_websocket(websocket: WebSocket):
+    """Many sessions over one connection; see services/terminal_mux.py for the framing."""
+    await websocket.accept()
+    proto = websocket.query_params.get("proto", str(PROTOCOL_VERSION))
+    if proto != str(PROTOCOL_VERSION):
+        await websocket.close(code=1003, reason=f"Unsupported protocol version {proto}")
+        return
+    await TerminalMux(websocket, get_manager()).run()
+
+
+@ws_router.websocket("/ws/terminal-replay/{session_id}")
+async def terminal_replay_websocket(websocket: WebSocket, session_id: str):
+    """Play a recording back as raw output frames at its original pace.
+
+    ?start= seeks (via the nearest keyframe), ?speed= scales time. A resize
+    event goes out as a JSON text frame {"type": "resize", "rows", "cols"}."""
+    await websocket.accept()
+    try:
+        start = max(float(websocket.query_params.get("start", 0)), 0.0)
+        speed = max(float(websocket.query_params.get("speed", 1)), 0.01)
+        if recording.read_header(session_id) is None:
+            raise ValueError("Recording not found")
+    except ValueError as e:
+        await websocket.send_text(f"\r\n[{e}]\r\n")
+        await websocket.close()
+        return
+
+    loop = asyncio.get_running_loop()
+    began = loop.time()
+    try:
+        for t, kind, data in recording.iter_events(session_id, start):
+            delay = began + t / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if kind == "o":
+                await websocket.send_bytes(data.encode("utf-8"))
+            elif kind == "r":
+                cols, _, rows = data.partition("x")
+                await websocket.send_text(json.dumps({"type": "resize", "rows": int(rows), "cols": int(cols)}))
+        await websocket.close()
+    except (WebSocketDisconnect, OSError):
+        pass  # the client went away
+    except Exception:
+        logger.exception("Replay of recording %s failed", session_id)
+
+
 @ws_router.websocket("/ws/terminal/{session_id}")
 async def terminal_websocket(websocket: WebSocket, session_id: str):
     await websocket.accept()
     manager = get_manager()
-    session = manager.get_session(session_id)
+    session = await maybe_await(manager.get_session(session_id))
 
     if not session:
         await websocket.send_text("\r\n[Session not found]\r\n")
         await websocket.close()
         return
 
-    # Subscribe FIRST so we don't miss data that arrives during buffer replay.
-    # subscribe() has no internal await so no data can slip between subscribe and get_buffer.
-    import asyncio
-    q = await manager.subscribe(session_id)
+    # ?proto=1: binary frames both ways (services/terminal_protocol.py).
+    # Without it, output is raw binary and text input is sniffed for JSON resizes.
+    proto = websocket.query_params.get("proto")
+    if proto is not None and proto != str(PROTOCOL_VERSION):
+        await websocket.close(code=1003, reason=f"Unsupported protocol version {proto}")
+        return
+    binary = proto is not None
 
-    # Replay historical buffer to catch up the new client
-    buffer = manager.get_buffer(session_id)
-    if buffer:
-        try:
-            await websocket.send_bytes(buffer)
-        except Exception:
-            manager.unsubscribe(session_id, q)
-            return
+    # The subscription starts with a catch-up replay: a screen snapshot, or the
+    # raw buffer when ?since=<offset> asks for output after an absolute byte offset.
+    # Live output is only queued once the replay has caught up, so nothing is
+    # missed or sent twice.
+    try:
+        since = int(websocket.query_params["since"])
+    except (KeyError, ValueError):
+        since = None
+    sub = await manager.subscribe(session_id, since)
 
-    # One lock per session serialises writes from all concurrent clients
-    write_lock = manager.get_write_lock(session_id)
+    # Replies (PONG) go out from the input side while output streams
+    send_lock = asyncio.Lock()
+
+    # ?meta=1: output goes out as binary frames and text frames carry JSON control
+    # messages — here the absolute stream offset, sent on connect and after any
+    # snapshot/reset, so the client can count bytes and resume with ?since=.
+    meta = websocket.query_params.get("meta") == "1"
+
+    async def send_frame(op: int, payload: bytes = b""):
+        frame = bytes([op]) + payload
+        async with send_lock:
+            await websocket.send_bytes(frame)
 
     async def read_pty():
-        """Drain this client's queue and forward PTY output to the WebSocket."""
+        """Forward this client's replay and live PTY output to the WebSocket."""
         try:
+            if binary:
+                await send_frame(OP_OFFSET, OFFSET.pack(sub.offset))
+            elif meta:
+                await websocket.send_text(json.dumps({"type": "offset", "offset": sub.offset}))
             while True:
-                data = await q.get()
+                data = await manager.next_chunk(sub)
                 if data is None:  # Session ended sentinel
+                    if binary:
+                        await send_frame(OP_ENDED)
                     break
+                if binary:
+                    mark, sub.mark = sub.mark, False
+                    await send_frame(OP_OUTPUT, data)
+                    if mark:
+                        await send_frame(OP_OFFSET, OFFSET.pack(sub.offset))
+                    continue
                 await websocket.send_bytes(data)
+                if meta and sub.mark:
+                    sub.mark = False
+                    await websocket.send_text(json.dumps({"type": "offset", "offset": sub.offset}))
+        except (WebSocketDisconnect, Exception):
+            pass
+        finally:
+            manager.unsubscribe(session_id, sub)
+
+    async def write_pty_binary():
+        """Dispatch binary protocol frames; INPUT frames are batched into one write."""
+        batcher = InputBatcher(manager, session_id)
+        try:
+            while True:
+                msg = await websocket.receive()
+                if msg.get("type") == "websocket.disconnect":
+                    break
+                frame = msg.get("bytes")
+                if frame is None:
+                    # Text is always input in this protocol, never a command
+                    if msg.get("text"):
+                        batcher.feed(msg["text"].encode("utf-8"))
+                        await manager.drain_input(session_id)
+                    continue
+                if not frame:
+                    continue
+                op, payload = frame[0], memoryview(frame)[1:]
+                if op == OP_INPUT:
+                    batcher.feed(payload)
+                    await manager.drain_input(session_id)
+                elif op == OP_RESIZE:
+                    rows, cols = RESIZE.unpack_from(payload)
+                    await maybe_await(manager.resize_session(session_id, rows, cols))
+                elif op == OP_ACK:
+                    manager.ack(sub, OFFSET.unpack_from(payload)[0])
+                elif op == OP_PING:
+                    await send_frame(OP_PONG, bytes(payload))
+                elif op == OP_SNAPSHOT:
+                    manager.request_snapshot(sub)
         except (WebSocketDisconnect, Exception):
             pass
         finally:
-            manager.unsubscribe(session_id, q)
+            batcher.flush()
 
     async def write_pty():
-        """Forward WebSocket input to the PTY, serialised via write_lock."""
-        import json
+        """Forward WebSocket input to the PTY (legacy framing). The manager keeps
+        input from all clients in order; drain_input() stops reading while the
+        PTY is not keeping up."""
         try:
             while True:
                 msg = await websocket.receive()
@@ -216,25 +452,25 @@ async def terminal_websocket(websocket: WebSocket, session_id: str):
                         try:
                             data = json.loads(text)
                             if data.get("type") == "resize":
-                                manager.resize_session(session_id, data.get("rows", 24), data.get("cols", 80))
+                                await maybe_await(manager.resize_session(session_id, data.get("rows", 24),
+                                                                         data.get("cols", 80)))
                                 continue
                         except (json.JSONDecodeError, ValueError):
                             pass
-                    async with write_lock:
-                        manager.write_to_session(session_id, text.encode("utf-8"))
+                    manager.write_to_session(session_id, text.encode("utf-8"))
                 elif "bytes" in msg:
-                    async with write_lock:
-                        manager.write_to_session(session_id, msg["bytes"])
+                    manager.write_to_session(session_id, msg["bytes"])
+                await manager.drain_input(session_id)
         except (WebSocketDisconnect, Exception):
             pass
 
     read_task = asyncio.create_task(read_pty())
-    write_task = asyncio.create_task(write_pty())
+    write_task = asyncio.create_task(write_pty_binary() if binary else write_pty())
 
     try:
         await asyncio.gather(read_task, write_task, return_exceptions=True)
     finally:
         read_task.cancel()
         write_task.cancel()
-        manager.unsubscribe(session_id, q)  # Idempotent — safe to call again
+        manager.unsubscribe(session_id, sub)  # Idempotent — safe to call again
         # Session keeps running — don't kill it
@@ -65,3 +65,10 @@ class GitCommit(BaseModel):
 
 class GitBranch(BaseModel):
     name: str = Field(..., min_length=1)
+
+
+class ExecRequest(BaseModel):
+    argv: list[str] = Field(..., min_length=1)
+    cwd: str = ""
+    env: dict[str, str] = {}
+    timeout: Optional[float] = None
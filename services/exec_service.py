@@ -0,0 +1,231 @@
+"""Non-interactive command execution in a project workspace.
+
+For batch jobs (test runs, builds) that only need their output streamed:
+argv is run directly, without a PTY, a shell or rc files, with stdout and
+stderr on pipes. Jobs run under one global concurrency limit; up to
+EXEC_QUEUE_MAX more wait for a slot and anything beyond that is refused.
+
+A job is consumed as an async iterator of event dicts:
+
+    {"type": "queued", "position": n}        only when it has to wait
+    {"type": "started", "pid": n}
+    {"type": "stdout" | "stderr", "data": "..."}
+    {"type": "exit", "code": n, "timed_out": b, "truncated": b, "duration": s}
+
+Closing the iterator early (client went away) kills the job's process group.
+"""
+import asyncio
+import codecs
+import os
+import signal
+import time
+import weakref
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from config import (
+    EXEC_KILL_GRACE,
+    EXEC_MAX_CONCURRENT,
+    EXEC_MAX_TIMEOUT,
+    EXEC_OUTPUT_CAP,
+    EXEC_QUEUE_MAX,
+    EXEC_TIMEOUT,
+)
+from services import workspace
+
+_READ_CHUNK = 64 * 1024
+
+
+class ExecRejected(Exception):
+    """The queue is full."""
+
+
+class ExecJob:
+    def __init__(self, service: "ExecService", argv: list[str], cwd: Path,
+                 env: dict[str, str], timeout: float):
+        self.service = service
+        self.argv = argv
+        self.cwd = cwd
+        self.env = env
+        self.timeout = timeout
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        # The queue place submit() reserved. Given back once: when the job
+        # gets a slot, when its events() end, by release(), or when the job
+        # is dropped without its events() ever being iterated (the finally
+        # of a generator that never started does not run).
+        self._queued = weakref.finalize(self, service._unqueue)
+
+    def release(self) -> None:
+        """Give back the queue place of a job that will not be run."""
+        self._queued()
+
+    async def events(self) -> AsyncIterator[dict]:
+        service = self.service
+        acquired = False
+        try:
+            if not self._queued.alive:
+                return  # released before it started
+            if service._slots.locked():
+                yield {"type": "queued", "position": service._waiting}
+            await service._slots.acquire()
+            acquired = True
+            self._queued()
+            service._running += 1
+            async for event in self._run():
+                yield event
+        finally:
+            if acquired:
+                service._running -= 1
+                service._slots.release()
+            else:
+                self._queued()
+            await self._kill()
+
+    async def _run(self) -> AsyncIterator[dict]:
+        started = time.monotonic()
+        try:
+            self.proc = await asyncio.create_subprocess_exec(
+                *self.argv,
+                cwd=str(self.cwd),
+                env=self.env,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                # Own process group, so a timeout or cancel takes the whole tree
+                start_new_session=True,
+            )
+        except OSError as e:
+            yield {"type": "error", "error": str(e)}
+            yield {"type": "exit", "code": 127, "timed_out": False, "truncated": False, "duration": 0.0}
+            return
+        yield {"type": "started", "pid": self.proc.pid}
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=16)
+        pumps = [
+            asyncio.create_task(self._pump(self.proc.stdout, "stdout", queue)),
+            asyncio.create_task(self._pump(self.proc.stderr, "stderr", queue)),
+        ]
+        deadline = started + self.timeout
+        sent = 0
+        truncated = timed_out = False
+        open_streams = len(pumps)
+        try:
+            while open_streams:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = await asyncio.wait_for(queue.get(), max(remaining, 0))
+                except asyncio.TimeoutError:
+                    timed_out = True
+                    break
+                kind, data = item
+                if data is None:
+                    open_streams -= 1
+                    continue
+                if truncated:
+                    continue  # keep draining so the process is not blocked on a full pipe
+                if sent + len(data) > EXEC_OUTPUT_CAP:
+                    data = data[:EXEC_OUTPUT_CAP - sent]
+                    truncated = True
+                sent += len(data)
+                if data:
+                    yield {"type": kind, "data": data}
+            if timed_out:
+                await self._kill()
+            code = await self.proc.wait()
+        finally:
+            for task in pumps:
+                task.cancel()
+        self.service._completed += 1
+        yield {
+            "type": "exit",
+            "code": code,
+            "timed_out": timed_out,
+            "truncated": truncated,
+            "duration": round(time.monotonic() - started, 3),
+        }
+
+    @staticmethod
+    async def _pump(stream: asyncio.StreamReader, kind: str, queue: asyncio.Queue) -> None:
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        while True:
+            chunk = await stream.read(_READ_CHUNK)
+            text = decoder.decode(chunk, final=not chunk)
+            if text:
+                await queue.put((kind, text))
+            if not chunk:
+                await queue.put((kind, None))
+                return
+
+    async def _kill(self) -> None:
+        """SIGTERM the job's process group, SIGKILL after EXEC_KILL_GRACE."""
+        proc = self.proc
+        if proc is None or proc.returncode is not None:
+            return
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(proc.pid, sig)
+            except OSError:
+                return
+            try:
+                await asyncio.wait_for(proc.wait(), EXEC_KILL_GRACE)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+
+class ExecService:
+    _instance: Optional["ExecService"] = None
+
+    def __init__(self, max_concurrent: int = EXEC_MAX_CONCURRENT, queue_max: int = EXEC_QUEUE_MAX):
+        self.max_concurrent = max_concurrent
+        self.queue_max = queue_max
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._running = 0
+        self._waiting = 0
+        self._completed = 0
+        self._rejected = 0
+
+    @classmethod
+    def get_instance(cls) -> "ExecService":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def submit(self, project_id: str, argv: list[str], cwd: str = "",
+               env: Optional[dict[str, str]] = None, timeout: Optional[float] = None) -> ExecJob:
+        """Validate a request and reserve its place in the queue. Raises
+        ValueError for a bad request and ExecRejected when the queue is full.
+        The job starts when its events() are iterated."""
+        if not argv or not all(isinstance(a, str) for a in argv) or not argv[0]:
+            raise ValueError("argv must be a non-empty list of strings")
+        root = workspace.resolve(project_id)
+        if not root.is_dir():
+            raise ValueError("Project workspace not found")
+        path = (root / cwd).resolve()
+        if path != root and root not in path.parents:
+            raise ValueError("cwd is outside the project workspace")
+        if not path.is_dir():
+            raise ValueError("cwd is not a directory")
+        timeout = EXEC_TIMEOUT if timeout is None else timeout
+        if not 0 < timeout <= EXEC_MAX_TIMEOUT:
+            raise ValueError(f"timeout must be between 0 and {EXEC_MAX_TIMEOUT} seconds")
+        if self._waiting >= self.queue_max:
+            self._rejected += 1
+            raise ExecRejected(f"Too many queued jobs ({self.queue_max})")
+        self._waiting += 1
+        full_env = os.environ.copy()
+        full_env.update(env or {})
+        return ExecJob(self, list(argv), path, full_env, timeout)
+
+    def _unqueue(self) -> None:
+        self._waiting -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "queue_max": self.queue_max,
+            "running": self._running,
+            "queued": self._waiting,
+            "completed": self._completed,
+            "rejected": self._rejected,
+        }
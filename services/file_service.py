@@ -1,8 +1,11 @@
 import os
+import stat
 from pathlib import Path
 from typing import Any
 
-from services import workspace
+from services import file_pages, workspace
+from services.gitignore import ignore_rules
+from services.metadata_cache import cache
 
 
 class PathTraversalError(Exception):
@@ -12,7 +15,7 @@ class PathTraversalError(Exception):
 def _safe_path(project_id: str, relative_path: str) -> Path:
     base = workspace.resolve(project_id)
     target = (base / relative_path).resolve()
-    if not str(target).startswith(str(base)):
+    if target != base and base not in target.parents:
         raise PathTraversalError(f"Path traversal denied: {relative_path}")
     return target
 
@@ -24,39 +27,91 @@ def _project_root(project_id: str) -> Path:
     return root
 
 
-def list_tree(project_id: str, max_depth: int = 10) -> list[dict[str, Any]]:
+def list_dir(project_id: str, relative_path: str = "") -> list[dict[str, Any]]:
+    """One level of the file tree: the entries of ``relative_path``,
+    folders first, then by case-insensitive name, each flagged ``ignored``
+    per .gitignore and friends (see services/gitignore.py).
+
+    A single scandir pass; the type comes from the DirEntry (d_type), so
+    only symlinks cost a stat. Folders are expanded lazily by the UI, so
+    opening a project only reads what is visible. Listings are served from
+    the metadata cache while the folder's mtime is unchanged.
+    """
     root = _project_root(project_id)
+    directory = _safe_path(project_id, relative_path) if relative_path else root
+    prefix = str(directory.relative_to(root)) + "/" if directory != root else ""
 
-    def _walk(directory: Path, depth: int) -> list[dict[str, Any]]:
-        if depth > max_depth:
-            return []
+    def scan() -> list[dict[str, Any]]:
         items = []
         try:
-            entries = sorted(directory.iterdir(), key=lambda e: (not e.is_dir(), e.name.lower()))
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    items.append({"name": entry.name, "path": prefix + entry.name, "is_dir": is_dir})
+        except NotADirectoryError:
+            raise FileNotFoundError(f"Not a directory: {relative_path}")
         except PermissionError:
             return []
-        for entry in entries:
-            if entry.name.startswith("."):
-                continue
-            rel = str(entry.relative_to(root))
-            node: dict[str, Any] = {
-                "name": entry.name,
-                "path": rel,
-                "is_dir": entry.is_dir(),
-            }
-            if entry.is_dir():
-                node["children"] = _walk(entry, depth + 1)
-            items.append(node)
+        items.sort(key=lambda e: (not e["is_dir"], e["name"].lower()))
         return items
 
-    return _walk(root, 0)
+    entries = cache.listing(project_id, prefix.rstrip("/"), directory, scan)
+    matcher = ignore_rules.matcher(root, prefix.rstrip("/"))
+    return [dict(e, ignored=matcher.ignored(e["path"], e["is_dir"])) for e in entries]
 
 
 def read_file(project_id: str, relative_path: str) -> str:
     path = _safe_path(project_id, relative_path)
-    if not path.exists() or not path.is_file():
+    # Just open it: a separate exists()/is_file() would stat it twice more
+    try:
+        return path.read_text(encoding="utf-8", errors="replace")
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        raise FileNotFoundError(f"File not found: {relative_path}")
+
+
+_BINARY_SNIFF = 8000
+
+
+def file_info(project_id: str, relative_path: str) -> dict[str, Any]:
+    """Size, mtime and ETag of a regular file, and whether it is binary: a
+    NUL in its first 8000 bytes, git's test. Nothing is decoded; the sniff
+    is cached until the file changes (see services/metadata_cache.py)."""
+    root = workspace.resolve(project_id)
+    path = _safe_path(project_id, relative_path)
+
+    def probe(st: os.stat_result) -> dict[str, Any]:
+        if not stat.S_ISREG(st.st_mode):
+            return {"regular": False}  # folders, FIFOs, devices
+        with open(path, "rb") as f:
+            return {"regular": True, "binary": b"\0" in f.read(_BINARY_SNIFF)}
+
+    try:
+        st, sniffed = cache.file(project_id, str(path.relative_to(root)), path, probe)
+    except (FileNotFoundError, NotADirectoryError):
+        raise FileNotFoundError(f"File not found: {relative_path}")
+    if not sniffed["regular"]:
+        raise FileNotFoundError(f"File not found: {relative_path}")
+    return {
+        "path": path,
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "etag": f'"{st.st_mtime_ns:x}-{st.st_size:x}"',
+        "binary": sniffed["binary"],
+    }
+
+
+def read_page(project_id: str, relative_path: str, start: int, count: int) -> dict[str, Any]:
+    """A page of lines of a large text file (see services/file_pages.py)."""
+    path = _safe_path(project_id, relative_path)
+    try:
+        return file_pages.read_page(path, start, count)
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
         raise FileNotFoundError(f"File not found: {relative_path}")
-    return path.read_text(encoding="utf-8", errors="replace")
 
 
 def write_file(project_id: str, relative_path: str, content: str) -> None:
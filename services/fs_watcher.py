@@ -0,0 +1,401 @@
+"""Live file tree: watch the folders a browser has open and report what
+changed in them.
+
+Only folders whose listing is on screen are watched (the tree is lazy, see
+file_service.list_dir), so the cost follows what is visible, not the size
+of the repo. On Linux all projects share one inotify descriptor (ctypes,
+read on the event loop); elsewhere, or once the kernel's watch limit is
+reached, a folder is polled by mtime instead.
+
+Events are not forwarded one by one. A burst (git checkout, npm install)
+marks folders dirty, and FS_WATCH_COALESCE later each dirty folder is
+listed again and diffed against what subscribers last saw. A file created
+and deleted inside one window costs nothing; a rename is a removal and an
+addition (in one update within a folder, one per folder across folders).
+Updates are dicts:
+
+    {"dir": "src", "removed": ["src/old.py"],
+     "added": [{"node": {name, path, is_dir}, "before": "src/z.py" | None}]}
+
+``added`` is in reverse tree order and ``before`` is the path of the entry
+that follows the new one (None: last), so inserting them in the order given
+always lands next to a node that is already there.
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import struct
+from pathlib import Path
+from typing import Optional
+
+from config import FS_WATCH_COALESCE, FS_WATCH_POLL_INTERVAL
+from services import file_service, workspace
+from services.gitignore import RULE_FILES
+from services.metadata_cache import cache
+
+logger = logging.getLogger(__name__)
+
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# IN_CLOSE_WRITE only matters for rule files (.gitignore edited in place)
+_MASK = (IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF
+         | IN_CLOSE_WRITE | IN_ONLYDIR)
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; then len bytes of NUL-padded name
+
+
+class _Inotify:
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.fd = fd
+
+    def add(self, path: Path) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), _MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+        return wd
+
+    def remove(self, wd: int) -> None:
+        self._rm_watch(self.fd, wd)
+
+    def read(self) -> list[tuple[int, int, str]]:
+        """Drain pending events as (wd, mask, name)."""
+        events = []
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            pos = 0
+            while pos < len(buf):
+                wd, mask, _cookie, length = _EVENT.unpack_from(buf, pos)
+                pos += _EVENT.size
+                events.append((wd, mask, os.fsdecode(buf[pos:pos + length].rstrip(b"\0"))))
+                pos += length
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class _WatchedDir:
+    __slots__ = ("refs", "wd", "mtime", "entries")
+
+    def __init__(self):
+        self.refs = 1
+        self.wd: Optional[int] = None  # None: polled
+        self.mtime = 0
+        # name -> (is_dir, ignored); None until listed
+        self.entries: Optional[dict[str, tuple[bool, bool]]] = None
+
+
+class Subscription:
+    """One browser tree: the folders it shows and its queue of updates."""
+
+    def __init__(self, watcher: "_ProjectWatcher"):
+        self.watcher = watcher
+        self.dirs: set[str] = set()
+        self.updates: asyncio.Queue = asyncio.Queue()
+
+    async def watch(self, rel_dir: str) -> None:
+        """Raises ValueError for a path outside the project and
+        FileNotFoundError for a folder that does not exist."""
+        rel_dir = self.watcher.normalize(rel_dir)
+        if rel_dir in self.dirs:
+            return
+        self.dirs.add(rel_dir)
+        try:
+            await self.watcher.add_dir(rel_dir)
+        except Exception:
+            self.dirs.discard(rel_dir)
+            raise
+
+    def close(self) -> None:
+        self.watcher.service._unsubscribe(self)
+
+
+class _ProjectWatcher:
+    def __init__(self, service: "FileWatchService", project_id: str):
+        self.service = service
+        self.project_id = project_id
+        self.root = workspace.resolve(project_id).resolve()
+        self.subscriptions: set[Subscription] = set()
+        self.dirs: dict[str, _WatchedDir] = {}
+        self.dirty: set[str] = set()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flushing = False
+
+    def _path(self, rel_dir: str) -> Path:
+        path = (self.root / rel_dir).resolve()
+        if path != self.root and self.root not in path.parents:
+            raise ValueError(f"Path outside the project: {rel_dir}")
+        return path
+
+    def normalize(self, rel_dir: str) -> str:
+        """The key a folder is watched under: its resolved path relative to
+        the root ("" for the root), so "a/../b", "./b" and "b/" share one
+        watch. Raises ValueError outside the project."""
+        rel = self._path(rel_dir).relative_to(self.root).as_posix()
+        return "" if rel == "." else rel
+
+    async def add_dir(self, rel_dir: str) -> None:
+        watched = self.dirs.get(rel_dir)
+        if watched:
+            watched.refs += 1
+            return
+        path = self._path(rel_dir)
+        watched = self.dirs[rel_dir] = _WatchedDir()
+        try:
+            # Watch first, then list: nothing can slip in between
+            watched.wd = self.service._add_watch(path, self, rel_dir)
+            watched.mtime = path.stat().st_mtime_ns
+            listing = await asyncio.get_running_loop().run_in_executor(
+                None, file_service.list_dir, self.project_id, rel_dir,
+            )
+        except Exception:
+            self.forget(rel_dir)
+            raise
+        if self.dirs.get(rel_dir) is watched:
+            watched.entries = {n["name"]: (n["is_dir"], n["ignored"]) for n in listing}
+
+    def remove_dir(self, rel_dir: str) -> None:
+        watched = self.dirs.get(rel_dir)
+        if watched:
+            watched.refs -= 1
+            if watched.refs <= 0:
+                self.dirs.pop(rel_dir)
+                self.service._remove_watch(watched.wd)
+
+    def forget(self, rel_dir: str) -> None:
+        """Stop watching a folder that was deleted or moved away, and
+        everything watched under it."""
+        prefix = rel_dir + "/"
+        for rel in [r for r in self.dirs if r == rel_dir or r.startswith(prefix)]:
+            self.service._remove_watch(self.dirs.pop(rel).wd)
+            for sub in self.subscriptions:
+                sub.dirs.discard(rel)
+
+    def mark_dirty_tree(self, rel_dir: str) -> None:
+        """A rule file changed: what is ignored may differ anywhere below."""
+        prefix = rel_dir + "/" if rel_dir else ""
+        for rel in list(self.dirs):
+            if rel == rel_dir or rel.startswith(prefix):
+                self.mark_dirty(rel)
+
+    def mark_dirty(self, rel_dir: str) -> None:
+        self.dirty.add(rel_dir)
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(FS_WATCH_COALESCE, self._start_flush)
+
+    def _start_flush(self) -> None:
+        self._flush_handle = None
+        if self._flushing:
+            # One diff at a time per project; pick the rest up next round
+            self._flush_handle = asyncio.get_running_loop().call_later(FS_WATCH_COALESCE, self._start_flush)
+            return
+        dirs, self.dirty = self.dirty, set()
+        asyncio.ensure_future(self._flush(dirs))
+
+    def _list_many(self, dirs: set[str]) -> dict[str, Optional[list[dict]]]:
+        listings: dict[str, Optional[list[dict]]] = {}
+        if not self.root.is_dir():
+            return listings  # project deleted; list_dir would recreate it
+        for rel in dirs:
+            try:
+                listings[rel] = file_service.list_dir(self.project_id, rel)
+            except (OSError, file_service.PathTraversalError):
+                listings[rel] = None
+        return listings
+
+    async def _flush(self, dirs: set[str]) -> None:
+        self._flushing = True
+        try:
+            listings = await asyncio.get_running_loop().run_in_executor(None, self._list_many, dirs)
+        finally:
+            self._flushing = False
+        for rel, listing in listings.items():
+            watched = self.dirs.get(rel)
+            if watched is None or watched.entries is None or listing is None:
+                continue  # a folder that is gone is reported by its parent
+            current = {n["name"]: (n["is_dir"], n["ignored"]) for n in listing}
+            # A name that changed type or ignore status counts as removed and added
+            removed = [name for name, state in watched.entries.items() if current.get(name) != state]
+            new = {name for name, state in current.items() if watched.entries.get(name) != state}
+            watched.entries = current
+            if not removed and not new:
+                continue
+            prefix = rel + "/" if rel else ""
+            added = [
+                {"node": node, "before": listing[i + 1]["path"] if i + 1 < len(listing) else None}
+                for i, node in reversed(list(enumerate(listing)))
+                if node["name"] in new
+            ]
+            update = {"dir": rel, "added": added, "removed": [prefix + name for name in removed]}
+            self.service._updates += 1
+            for sub in self.subscriptions:
+                if rel in sub.dirs:
+                    sub.updates.put_nowait(update)
+            for name in removed:
+                self.forget(prefix + name)
+
+    def poll(self) -> None:
+        for rel, watched in list(self.dirs.items()):
+            if watched.wd is not None or watched.entries is None:
+                continue
+            try:
+                mtime = (self.root / rel).stat().st_mtime_ns
+            except OSError:
+                self.forget(rel)
+                continue
+            if mtime != watched.mtime:
+                watched.mtime = mtime
+                self.mark_dirty(rel)
+
+    def close(self) -> None:
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for watched in self.dirs.values():
+            self.service._remove_watch(watched.wd)
+        self.dirs.clear()
+
+
+class FileWatchService:
+    _instance: Optional["FileWatchService"] = None
+
+    def __init__(self):
+        self._watchers: dict[str, _ProjectWatcher] = {}
+        self._wds: dict[int, tuple[_ProjectWatcher, str]] = {}
+        self._inotify: Optional[_Inotify] = None
+        try:
+            self._inotify = _Inotify()
+            asyncio.get_running_loop().add_reader(self._inotify.fd, self._on_inotify)
+        except (OSError, AttributeError) as e:
+            logger.info("inotify unavailable (%s), polling the file tree", e)
+            if self._inotify:
+                self._inotify.close()
+                self._inotify = None
+        self._poll_handle: Optional[asyncio.TimerHandle] = None
+        self._events = 0
+        self._updates = 0
+        self._overflows = 0
+
+    @classmethod
+    def get_instance(cls) -> "FileWatchService":
+        """Must first be called from the event loop."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def subscribe(self, project_id: str) -> Subscription:
+        watcher = self._watchers.get(project_id)
+        if watcher is None:
+            watcher = self._watchers[project_id] = _ProjectWatcher(self, project_id)
+        sub = Subscription(watcher)
+        watcher.subscriptions.add(sub)
+        return sub
+
+    def _unsubscribe(self, sub: Subscription) -> None:
+        watcher = sub.watcher
+        watcher.subscriptions.discard(sub)
+        for rel in sub.dirs:
+            watcher.remove_dir(rel)
+        sub.dirs.clear()
+        if not watcher.subscriptions:
+            watcher.close()
+            if self._watchers.get(watcher.project_id) is watcher:
+                del self._watchers[watcher.project_id]
+
+    def _add_watch(self, path: Path, watcher: _ProjectWatcher, rel_dir: str) -> Optional[int]:
+        """inotify watch descriptor, or None when the folder is polled."""
+        if self._inotify:
+            try:
+                wd = self._inotify.add(path)
+                self._wds[wd] = (watcher, rel_dir)
+                return wd
+            except OSError as e:
+                if e.errno in (errno.ENOENT, errno.ENOTDIR):
+                    raise FileNotFoundError(f"Folder not found: {rel_dir}") from None
+                if e.errno != errno.ENOSPC:
+                    raise
+                logger.warning("inotify watch limit reached, polling %s", path)
+        if not path.is_dir():
+            raise FileNotFoundError(f"Folder not found: {rel_dir}")
+        if self._poll_handle is None:
+            self._poll_handle = asyncio.get_running_loop().call_later(FS_WATCH_POLL_INTERVAL, self._poll)
+        return None
+
+    def _remove_watch(self, wd: Optional[int]) -> None:
+        if wd is not None and self._wds.pop(wd, None) and self._inotify:
+            self._inotify.remove(wd)
+
+    def _on_inotify(self) -> None:
+        for wd, mask, name in self._inotify.read():
+            self._events += 1
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost: re-diff everything that is watched
+                self._overflows += 1
+                for watcher in self._watchers.values():
+                    cache.invalidate(watcher.project_id)
+                    for rel in watcher.dirs:
+                        watcher.mark_dirty(rel)
+                continue
+            target = self._wds.get(wd)
+            if target is None:
+                continue
+            watcher, rel = target
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                if mask & IN_IGNORED:
+                    self._wds.pop(wd, None)  # the kernel already dropped it
+                cache.invalidate(watcher.project_id, rel, recursive=True)
+                watcher.forget(rel)
+            elif name in RULE_FILES:
+                watcher.mark_dirty_tree(rel)
+            elif mask & IN_CLOSE_WRITE:
+                continue
+            elif not name.startswith("."):
+                cache.invalidate(watcher.project_id, rel)
+                watcher.mark_dirty(rel)
+
+    def _poll(self) -> None:
+        self._poll_handle = None
+        polled = False
+        for watcher in list(self._watchers.values()):
+            watcher.poll()
+            polled = polled or any(w.wd is None for w in watcher.dirs.values())
+        if polled:
+            self._poll_handle = asyncio.get_running_loop().call_later(FS_WATCH_POLL_INTERVAL, self._poll)
+
+    def stats(self) -> dict:
+        dirs = [w for watcher in self._watchers.values() for w in watcher.dirs.values()]
+        return {
+            "backend": "inotify" if self._inotify else "polling",
+            "projects": len(self._watchers),
+            "subscriptions": sum(len(w.subscriptions) for w in self._watchers.values()),
+            "watched_dirs": len(dirs),
+            "polled_dirs": sum(1 for w in dirs if w.wd is None),
+            "events": self._events,
+            "updates": self._updates,
+            "overflows": self._overflows,
+        }
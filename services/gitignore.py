@@ -0,0 +1,178 @@
+"""Ignore rules for workspace walks, with .gitignore semantics.
+
+Sources, lowest precedence first:
+
+- FS_IGNORE_DEFAULTS (node_modules/, __pycache__/, ...)
+- .git/info/exclude
+- .gitignore in the project root and every folder down to the one listed
+  (deeper files win)
+- .thinkdevignore in the project root: a per-project override, where
+  "!pattern" un-ignores what the others match
+
+As in git: the last matching line wins; "!" negates; a trailing "/" only
+matches folders; a pattern with a "/" before its end is anchored to its
+file's folder, otherwise it matches a name at any depth; "**" spans
+folders. Nothing under an ignored folder can be re-included.
+
+Each rule file is compiled to regexes once and kept until its mtime or
+size changes, so building the matcher for a folder costs one stat per
+ancestor.
+"""
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from config import FS_CACHE_MAX_DIRS, FS_IGNORE_DEFAULTS
+
+IGNORE_FILE = ".gitignore"
+OVERRIDE_FILE = ".thinkdevignore"
+RULE_FILES = (IGNORE_FILE, OVERRIDE_FILE)
+
+Rule = tuple[re.Pattern, bool, bool]  # regex, negated, folders only
+
+
+def _translate(glob: str) -> str:
+    """Regex for a gitignore glob, matched against a "/"-separated path."""
+    out = []
+    i, n = 0, len(glob)
+    while i < n:
+        c = glob[i]
+        if c == "*":
+            if glob.startswith("**", i) and (i == 0 or glob[i - 1] == "/"):
+                if i + 2 == n:
+                    out.append(".*")  # "dir/**": everything inside
+                    i += 2
+                    continue
+                if glob[i + 2] == "/":
+                    out.append("(?:.*/)?")  # "**/": any number of folders
+                    i += 3
+                    continue
+            out.append("[^/]*")
+            while i < n and glob[i] == "*":
+                i += 1
+            continue
+        if c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = i + 1
+            if j < n and glob[j] in "!^":
+                j += 1
+            if j < n and glob[j] == "]":
+                j += 1
+            j = glob.find("]", j)
+            if j < 0:
+                out.append(re.escape(c))
+            else:
+                body = glob[i + 1:j]
+                if body[:1] in ("!", "^"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = j + 1
+                continue
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(glob[i + 1]))
+            i += 2
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def parse_rules(text: str) -> list[Rule]:
+    rules = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        # Trailing spaces are dropped unless escaped
+        stripped = line.rstrip(" ")
+        if stripped.endswith("\\") and len(stripped) < len(line):
+            stripped += " "
+        line = stripped
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        anchored = "/" in line
+        body = _translate(line.lstrip("/"))
+        regex = "^" + ("" if anchored else "(?:.*/)?") + body + "$"
+        try:
+            rules.append((re.compile(regex, re.DOTALL), negated, dir_only))
+        except re.error:
+            continue  # git ignores malformed patterns too
+    return rules
+
+
+class IgnoreMatcher:
+    """The rules in effect inside one folder."""
+
+    def __init__(self, layers: list[tuple[str, list[Rule]]], inherited: bool = False):
+        # (path prefix of the rule file's folder, rules), lowest precedence first
+        self.layers = layers
+        # The folder itself is ignored, so everything in it is
+        self.inherited = inherited
+
+    def ignored(self, path: str, is_dir: bool) -> bool:
+        """``path`` is relative to the project root."""
+        if self.inherited:
+            return True
+        for prefix, rules in reversed(self.layers):
+            rel = path[len(prefix):]
+            for regex, negated, dir_only in reversed(rules):
+                if dir_only and not is_dir:
+                    continue
+                if regex.match(rel):
+                    return not negated
+        return False
+
+
+class IgnoreRules:
+    def __init__(self, max_files: int = FS_CACHE_MAX_DIRS):
+        self.max_files = max_files
+        self._defaults = parse_rules("\n".join(FS_IGNORE_DEFAULTS))
+        self._files: OrderedDict[Path, tuple[tuple[int, int], list[Rule]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _rules(self, path: Path) -> list[Rule]:
+        try:
+            st = path.stat()
+        except OSError:
+            return []
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._files.get(path)
+            if cached and cached[0] == stamp:
+                self._files.move_to_end(path)
+                return cached[1]
+        try:
+            rules = parse_rules(path.read_text(encoding="utf-8", errors="replace"))
+        except OSError:
+            return []
+        with self._lock:
+            self._files[path] = (stamp, rules)
+            while len(self._files) > max(self.max_files, 1):
+                self._files.popitem(last=False)
+        return rules
+
+    def matcher(self, root: Path, rel_dir: str = "") -> IgnoreMatcher:
+        """Matcher for the entries of ``rel_dir`` ("" is the project root)."""
+        layers = [("", self._defaults), ("", self._rules(root / ".git" / "info" / "exclude"))]
+        override = ("", self._rules(root / OVERRIDE_FILE))
+        parts = rel_dir.split("/") if rel_dir else []
+        prefix = ""
+        for depth in range(len(parts) + 1):
+            layers.append((prefix, self._rules(root / prefix / IGNORE_FILE)))
+            if depth == len(parts):
+                break
+            folder = prefix + parts[depth]
+            if IgnoreMatcher([*layers, override]).ignored(folder, True):
+                return IgnoreMatcher([], inherited=True)
+            prefix = folder + "/"
+        return IgnoreMatcher([layer for layer in [*layers, override] if layer[1]])
+
+
+ignore_rules = IgnoreRules()
@@ -0,0 +1,158 @@
+"""In-memory cache of workspace directory listings and file metadata.
+
+Tree requests for a project that is being browsed keep listing the same
+folders. A listing is cached per (project, folder), in one LRU across all
+projects, and is served again as long as the folder's mtime is unchanged:
+one stat instead of a scandir. Adding, removing or renaming an entry
+changes its folder's mtime, whether it was done by this app, a terminal or
+an agent. The file watcher also drops a folder as soon as it sees it change.
+
+Opening a file works the same way: what file_info() learns by opening it
+(whether it is binary) is cached per file and re-used while its mtime, size
+and inode are unchanged, so a re-open costs one stat instead of a stat, an
+open and a read.
+
+Filesystem timestamps are coarse, so a folder modified within the last
+_RACY_NS is not cached: another change in the same tick would not move its
+mtime (git's "racily clean" problem).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+
+from config import FS_CACHE_MAX_DIRS, FS_CACHE_MAX_FILES
+
+_RACY_NS = 2 * 10**9
+
+
+class MetadataCache:
+    def __init__(self, max_dirs: int = FS_CACHE_MAX_DIRS, max_files: int = FS_CACHE_MAX_FILES):
+        self.max_dirs = max_dirs
+        self.max_files = max_files
+        self._dirs: OrderedDict[tuple[str, str], tuple[int, list[dict]]] = OrderedDict()
+        self._files: OrderedDict[tuple[str, str], tuple[tuple[int, int, int], dict]] = OrderedDict()
+        # Listings are also made from executor threads (file watcher)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.file_hits = 0
+        self.file_misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def listing(self, project_id: str, rel_dir: str, directory: Path,
+                scan: Callable[[], list[dict]]) -> list[dict]:
+        """The entries of ``directory``, from the cache when its mtime is
+        unchanged, otherwise from ``scan()``."""
+        key = (project_id, rel_dir)
+        try:
+            mtime = directory.stat().st_mtime_ns
+        except OSError:
+            self.invalidate(project_id, rel_dir, recursive=True)
+            raise
+        with self._lock:
+            cached = self._dirs.get(key)
+            if cached and cached[0] == mtime:
+                self._dirs.move_to_end(key)
+                self.hits += 1
+                return list(cached[1])
+            self.misses += 1
+        entries = scan()
+        with self._lock:
+            if not self.max_dirs or mtime >= time.time_ns() - _RACY_NS:
+                self._dirs.pop(key, None)
+                return list(entries)
+            self._dirs[key] = (mtime, entries)
+            self._dirs.move_to_end(key)
+            while len(self._dirs) > self.max_dirs:
+                self._dirs.popitem(last=False)
+                self.evictions += 1
+        return list(entries)
+
+    def file(self, project_id: str, rel_path: str, path: Path,
+             probe: Callable[[os.stat_result], dict]) -> tuple[os.stat_result, dict]:
+        """The stat of ``path`` and ``probe(st)``, from the cache when the
+        file's mtime, size and inode are unchanged."""
+        key = (project_id, rel_path)
+        try:
+            st = path.stat()
+        except OSError:
+            with self._lock:
+                self._files.pop(key, None)
+            raise
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        with self._lock:
+            cached = self._files.get(key)
+            if cached and cached[0] == stamp:
+                self._files.move_to_end(key)
+                self.file_hits += 1
+                return st, dict(cached[1])
+            self.file_misses += 1
+        info = probe(st)
+        with self._lock:
+            if not self.max_files or st.st_mtime_ns >= time.time_ns() - _RACY_NS:
+                self._files.pop(key, None)
+                return st, dict(info)
+            self._files[key] = (stamp, info)
+            self._files.move_to_end(key)
+            while len(self._files) > self.max_files:
+                self._files.popitem(last=False)
+                self.evictions += 1
+        return st, dict(info)
+
+    def invalidate(self, project_id: str, rel_dir: Optional[str] = None, recursive: bool = False) -> None:
+        """Drop one folder and its files (and with ``recursive`` everything
+        under it), or the whole project when ``rel_dir`` is None."""
+        prefix = rel_dir + "/" if rel_dir else ""
+        with self._lock:
+            if rel_dir is not None and not recursive:
+                dropped = [(project_id, rel_dir)] if (project_id, rel_dir) in self._dirs else []
+                files = [
+                    key for key in self._files
+                    if key[0] == project_id and key[1].startswith(prefix) and "/" not in key[1][len(prefix):]
+                ]
+            else:
+                dropped = [
+                    key for key in self._dirs
+                    if key[0] == project_id and (rel_dir is None or key[1] == rel_dir or key[1].startswith(prefix))
+                ]
+                files = [
+                    key for key in self._files
+                    if key[0] == project_id and (rel_dir is None or key[1].startswith(prefix))
+                ]
+            for key in dropped:
+                del self._dirs[key]
+            for key in files:
+                del self._files[key]
+            self.invalidations += len(dropped) + len(files)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        with self._lock:
+            projects = len({project_id for project_id, _ in self._dirs})
+            entries = sum(len(listing) for _, listing in self._dirs.values())
+            cached_dirs = len(self._dirs)
+            cached_files = len(self._files)
+        file_lookups = self.file_hits + self.file_misses
+        return {
+            "max_dirs": self.max_dirs,
+            "cached_dirs": cached_dirs,
+            "cached_entries": entries,
+            "projects": projects,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "max_files": self.max_files,
+            "cached_files": cached_files,
+            "file_hits": self.file_hits,
+            "file_misses": self.file_misses,
+            "file_hit_rate": round(self.file_hits / file_lookups, 4) if file_lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+cache = MetadataCache()
@@ -0,0 +1,48 @@
+"""Per-terminal resource sampling from /proc (Linux).
+
+Every shell is started with setsid(), so its pid is also the session id of
+everything it runs (jobs, agents, test loops). One pass over /proc/<pid>/stat
+groups all processes by session id, which lets the manager sample every
+terminal at once on a single timer. Processes that leave the session with
+their own setsid() (daemons, tmux servers) are not counted.
+"""
+import os
+from typing import Iterable
+
+AVAILABLE = os.path.isdir("/proc/self")
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if AVAILABLE else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if AVAILABLE else 4096
+
+
+def scan_sessions(session_ids: Iterable[int]) -> dict[int, dict]:
+    """CPU ticks, resident pages and pids of every process in each of
+    ``session_ids``. Safe to call from a worker thread."""
+    wanted = set(session_ids)
+    totals = {sid: {"ticks": 0, "rss_pages": 0, "pids": []} for sid in wanted}
+    try:
+        entries = os.scandir("/proc")
+    except OSError:
+        return totals
+    with entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry.name}/stat", "rb") as f:
+                    stat = f.read()
+            except OSError:
+                continue  # exited while scanning
+            # Fields after "(comm)": state ppid pgrp session ... utime(11) stime(12) ... rss(21)
+            fields = stat[stat.rfind(b")") + 2:].split()
+            try:
+                sid = int(fields[3])
+            except (IndexError, ValueError):
+                continue
+            if sid not in wanted:
+                continue
+            total = totals[sid]
+            total["ticks"] += int(fields[11]) + int(fields[12])
+            total["rss_pages"] += int(fields[21])
+            total["pids"].append(int(entry.name))
+    return totals
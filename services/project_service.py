@@ -9,6 +9,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from config import WORKSPACE_DIR
 from models import Project
 from services import workspace
+from services.metadata_cache import cache
 
 
 def _safe_dirname(name: str) -> str:
@@ -110,6 +111,7 @@ async def delete_project(db: AsyncSession, project_id: str) -> bool:
         shutil.rmtree(workspace_path, ignore_errors=True)
 
     workspace.unregister(project_id)
+    cache.invalidate(project_id)
     await db.delete(project)
     await db.commit()
     return True
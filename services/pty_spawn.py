@@ -0,0 +1,126 @@
+"""Shell spawning for terminal sessions.
+
+The default path uses ``os.posix_spawn`` (vfork-style, so no copy of the big
+server's page tables) and rc files written once per process rather than on
+every spawn. ``fork`` is kept as a fallback for platforms where a session
+leader does not acquire its controlling terminal by opening the tty.
+"""
+import fcntl
+import getpass
+import os
+import pty
+import socket
+import struct
+import sys
+import tempfile
+import termios
+from pathlib import Path
+from typing import Optional
+
+from config import TERMINAL_SHELL, TERMINAL_SPAWN_MODE
+
+_rc_dir: Optional[Path] = None
+
+# OSC 133;A ("prompt start", FinalTerm/shell-integration convention). Terminals
+# that don't know it ignore it.
+PROMPT_MARKER = b"\x1b]133;A\x07"
+
+
+def _rc_files() -> Path:
+    """Write the wrapper rc files once. Each starts by cd-ing into
+    $THINKDEV_CWD (posix_spawn cannot chdir), then sources the user's config
+    and sets a coloured prompt that starts with PROMPT_MARKER, so the
+    manager can tell when the shell is ready for input."""
+    global _rc_dir
+    if _rc_dir is not None and _rc_dir.exists():
+        return _rc_dir
+    rc_dir = Path(tempfile.mkdtemp(prefix="thinkdev-rc-"))
+    home = os.path.expanduser("~")
+    cd = '[ -n "$THINKDEV_CWD" ] && cd "$THINKDEV_CWD"\n'
+    user = getpass.getuser()
+    host = socket.gethostname().split(".")[0]
+
+    (rc_dir / ".zshenv").write_text(
+        cd + f'[ -f "{home}/.zshenv" ] && source "{home}/.zshenv"\n'
+    )
+    (rc_dir / ".zshrc").write_text(
+        f'[ -f "{home}/.zshrc" ] && source "{home}/.zshrc"\n'
+        'export PROMPT=$\'%{\\e]133;A\\a%}\'"%F{green}%n@%m%f %F{blue}%1~%f %# "\n'
+        'export CLICOLOR=1\n'
+    )
+    (rc_dir / ".bashrc").write_text(
+        cd + f'[ -f "{home}/.bashrc" ] && source "{home}/.bashrc"\n'
+        f'export PS1="\\[\\033]133;A\\007\\]\\[\\033[01;32m\\]{user}@{host}\\[\\033[00m\\] \\[\\033[01;34m\\]\\W\\[\\033[00m\\] \\$ "\n'
+    )
+    _rc_dir = rc_dir
+    return rc_dir
+
+
+def _shell_command() -> tuple[list[str], dict[str, str]]:
+    rc_dir = _rc_files()
+    env = os.environ.copy()
+    env["TERM"] = "xterm-256color"
+    env["COLORTERM"] = "truecolor"
+    env["HOME"] = os.path.expanduser("~")
+    env["CLICOLOR"] = "1"
+    env["CLICOLOR_FORCE"] = "1"
+    env["LSCOLORS"] = "GxFxCxDxBxegedabagaced"
+    env["FORCE_COLOR"] = "1"
+    if os.path.basename(TERMINAL_SHELL) == "zsh":
+        env["ZDOTDIR"] = str(rc_dir)
+        return [TERMINAL_SHELL], env
+    return [TERMINAL_SHELL, "--rcfile", str(rc_dir / ".bashrc")], env
+
+
+def spawn_shell(cwd: Path, rows: int = 24, cols: int = 80, mode: str = TERMINAL_SPAWN_MODE) -> tuple[int, int]:
+    """Start the user's shell on a new PTY in ``cwd``.
+    Returns (child pid, non-blocking master fd)."""
+    argv, env = _shell_command()
+    env["THINKDEV_CWD"] = str(cwd)
+    master, slave = pty.openpty()
+    try:
+        fcntl.ioctl(master, termios.TIOCSWINSZ, struct.pack("HHHH", rows, cols, 0, 0))
+        if mode == "posix_spawn" and hasattr(os, "posix_spawn") and sys.platform.startswith("linux"):
+            pid = _posix_spawn(argv, env, slave)
+        else:
+            pid = _fork_exec(argv, env, master, slave, cwd)
+    except BaseException:
+        os.close(master)
+        raise
+    finally:
+        os.close(slave)
+    os.set_blocking(master, False)
+    return pid, master
+
+
+def _posix_spawn(argv: list[str], env: dict[str, str], slave: int) -> int:
+    # The child becomes a session leader and opens the slave by path, which on
+    # Linux makes it the controlling terminal. The parent's pty fds are
+    # non-inheritable, so they are closed across exec.
+    slave_path = os.ttyname(slave)
+    file_actions = [
+        (os.POSIX_SPAWN_OPEN, 0, slave_path, os.O_RDWR, 0),
+        (os.POSIX_SPAWN_DUP2, 0, 1),
+        (os.POSIX_SPAWN_DUP2, 0, 2),
+    ]
+    return os.posix_spawnp(argv[0], argv, env, file_actions=file_actions, setsid=True)
+
+
+def _fork_exec(argv: list[str], env: dict[str, str], master: int, slave: int, cwd: Path) -> int:
+    child_pid = os.fork()
+    if child_pid == 0:
+        try:
+            os.close(master)
+            os.setsid()
+            # Set the slave as controlling terminal
+            fcntl.ioctl(slave, termios.TIOCSCTTY, 0)
+            os.dup2(slave, 0)
+            os.dup2(slave, 1)
+            os.dup2(slave, 2)
+            if slave > 2:
+                os.close(slave)
+            os.chdir(str(cwd))
+            os.execvpe(argv[0], argv, env)
+        finally:
+            os._exit(127)
+    return child_pid
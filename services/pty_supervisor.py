@@ -0,0 +1,249 @@
+"""Out-of-process PTY supervisor.
+
+Owns every terminal session (PTY fds, child shells, scrollback) in a small
+daemon so web workers can restart — or run as several uvicorn workers —
+without killing running sessions. Workers talk to it over a Unix socket via
+services.supervisor_client.
+
+    python -m services.pty_supervisor [--socket PATH]
+
+Wire format: every frame is a 4-byte big-endian length followed by a 1-byte
+kind and the payload.
+
+Control connection (request/response, in order):
+    J  JSON request {"op": ..., ...}   ->  J  {"ok": bool, "result"|"error": ...}
+
+Input connection (one per session, one-way):
+    W  <1-byte id length><session id><input bytes>
+The connection is not read again until the PTY's input backlog is below
+TERMINAL_INPUT_BACKLOG, so the worker's writes back up like in-process
+ones. Input the session refuses (it is gone) is answered with F, once.
+
+Stream connection (one per attached client), after a J {"op": "attach"}:
+    O  <8-byte offset>            offset of the first byte that follows
+    D  <bytes>                    stream data
+    S  <8-byte offset><bytes>     snapshot/reset; stream continues at offset
+    E                             session ended
+and from the worker, until it closes the connection:
+    A  <8-byte offset>            client ack (see TerminalSessionManager.ack)
+    N                             client asked for a new snapshot
+"""
+import argparse
+import asyncio
+import fcntl
+import json
+import os
+import signal
+import struct
+from pathlib import Path
+
+from config import TERMINAL_SUPERVISOR_DEFAULT_SOCKET, TERMINAL_SUPERVISOR_SOCKET
+from services.session_status import sync_session_status
+from services.terminal_manager import SessionInfo, TerminalSessionManager
+
+_HEADER = struct.Struct(">IB")
+_OFFSET = struct.Struct(">Q")
+
+
+def encode_frame(kind: bytes, payload: bytes = b"") -> bytes:
+    return _HEADER.pack(len(payload) + 1, kind[0]) + payload
+
+
+def session_to_dict(session: SessionInfo) -> dict:
+    """The attributes routes and templates read from a session."""
+    return {
+        "session_id": session.session_id,
+        "project_id": session.project_id,
+        "name": session.name,
+        "pid": session.pid,
+        "status": session.status,
+        "paused": session.paused,
+        "flow_pauses": session.flow_pauses,
+        "exit_code": session.exit_code,
+        "hibernated": session.hibernated,
+        "resources": session.resources,
+        "throttled": session.throttled,
+    }
+
+
+class PtySupervisor:
+    def __init__(self, socket_path: Path):
+        self.socket_path = socket_path
+        self.manager = TerminalSessionManager.get_instance()
+
+    # ------------------------------------------------------------------ #
+
+    def handle_request(self, req: dict):
+        m = self.manager
+        op = req.get("op")
+        sid = req.get("session_id")
+        if op == "create":
+            return session_to_dict(m.create_session(
+                sid, req["project_id"], req.get("name", "bash"), req.get("record"), req.get("command")
+            ))
+        if op == "get":
+            session = m.get_session(sid)
+            return session_to_dict(session) if session else None
+        if op == "list":
+            return [session_to_dict(s) for s in m.list_sessions(req.get("project_id"))]
+        if op == "stop":
+            return m.stop_session(sid)
+        if op == "kill":
+            return m.kill_session(sid)
+        if op == "remove":
+            return m.remove_session(sid)
+        if op == "clear":
+            return m.clear_buffer(sid)
+        if op == "resize":
+            return m.resize_session(sid, int(req["rows"]), int(req["cols"]))
+        if op == "subscribers":
+            return m.subscriber_stats(sid)
+        if op == "offsets":
+            return m.output_offsets(req["session_ids"])
+        if op == "search":
+            return m.search(sid, req["q"], req["limit"], req["regex"], req["case"])
+        if op == "search_project":
+            return m.search_project(req["project_id"], req["q"], req["limit"], req["regex"], req["case"])
+        if op == "warm_pool":
+            return m.warm_pool(req["project_id"])
+        if op == "spawn_stats":
+            return m.spawn_stats()
+        if op == "idle_stats":
+            return m.idle_stats()
+        if op == "resources":
+            return m.resource_stats(req.get("project_id"))
+        if op == "resume":
+            return m.resume_session(sid)
+        if op == "ping":
+            return os.getpid()
+        raise ValueError(f"Unknown op: {op}")
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                length, kind = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                payload = await reader.readexactly(length - 1)
+                if kind == ord("W"):
+                    n = payload[0]
+                    sid = payload[1:1 + n].decode()
+                    if self.manager.write_to_session(sid, payload[1 + n:]):
+                        await self.manager.drain_input(sid)
+                    else:
+                        writer.write(encode_frame(b"F"))
+                        await writer.drain()
+                        return
+                    continue
+                req = json.loads(payload)
+                if req.get("op") == "attach":
+                    await self.stream(req, reader, writer)
+                    return
+                if req.get("op") == "wait_ready":
+                    # On a connection of its own (see SupervisorClient.wait_ready)
+                    ready = await self.manager.wait_ready(req["session_id"], float(req["timeout"]))
+                    writer.write(encode_frame(b"J", json.dumps({"ok": True, "result": ready}).encode()))
+                    await writer.drain()
+                    continue
+                try:
+                    result = self.handle_request(req)
+                    if asyncio.iscoroutine(result):
+                        result = await result  # work done in a thread (search_project)
+                    resp = {"ok": True, "result": result}
+                except Exception as e:
+                    resp = {"ok": False, "error": str(e)}
+                writer.write(encode_frame(b"J", json.dumps(resp).encode()))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def stream(self, req: dict, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Forward one subscriber's replay and live output. drain() applies
+        backpressure, so a slow web client lags/resyncs exactly as in-process.
+        The subscription ends as soon as the worker closes the connection."""
+        sid = req["session_id"]
+        if not self.manager.get_session(sid):
+            writer.write(encode_frame(b"E"))
+            return
+        sub = await self.manager.subscribe(sid, req.get("since"))
+
+        async def pump():
+            writer.write(encode_frame(b"O", _OFFSET.pack(sub.offset)))
+            while True:
+                chunk = await self.manager.next_chunk(sub)
+                if chunk is None:
+                    writer.write(encode_frame(b"E"))
+                    break
+                if sub.mark:
+                    sub.mark = False
+                    writer.write(_HEADER.pack(len(chunk) + 9, ord("S")) + _OFFSET.pack(sub.offset))
+                else:
+                    writer.write(_HEADER.pack(len(chunk) + 1, ord("D")))
+                writer.write(chunk)
+                await writer.drain()
+
+        async def control():
+            # Returns (ending the stream) once the worker closes the connection
+            try:
+                while True:
+                    length, kind = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                    payload = await reader.readexactly(length - 1)
+                    if kind == ord("A"):
+                        self.manager.ack(sub, _OFFSET.unpack(payload)[0])
+                    elif kind == ord("N"):
+                        self.manager.request_snapshot(sub)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+
+        pump_task = asyncio.ensure_future(pump())
+        control_task = asyncio.ensure_future(control())
+        try:
+            await asyncio.wait({pump_task, control_task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (pump_task, control_task):
+                task.cancel()
+            await asyncio.gather(pump_task, control_task, return_exceptions=True)
+            self.manager.unsubscribe(sid, sub)
+
+    # ------------------------------------------------------------------ #
+
+    async def serve(self):
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        server = await asyncio.start_unix_server(self.handle_client, path=str(self.socket_path))
+        os.chmod(self.socket_path, 0o600)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        # The supervisor owns the sessions, so it also persists their status
+        status_task = asyncio.create_task(sync_session_status(self.manager))
+        async with server:
+            await stop.wait()
+        status_task.cancel()
+        self.manager.cleanup_all()
+        try:
+            self.socket_path.unlink()
+        except OSError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ThinkDev PTY supervisor")
+    parser.add_argument("--socket", default=TERMINAL_SUPERVISOR_SOCKET or TERMINAL_SUPERVISOR_DEFAULT_SOCKET,
+                        help="Unix socket path")
+    args = parser.parse_args()
+    socket_path = Path(args.socket)
+
+    # Only one supervisor per socket: if another holds the lock, it is serving
+    lock = open(f"{socket_path}.lock", "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return
+
+    asyncio.run(PtySupervisor(socket_path).serve())
+
+
+if __name__ == "__main__":
+    main()
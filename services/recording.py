@@ -0,0 +1,255 @@
+"""Terminal session recording (asciicast v2) with a sparse seek index.
+
+Per recorded session, under TERMINAL_RECORD_DIR:
+
+    <id>.cast   asciicast v2: a JSON header line, then [time, "o"|"r", data] events
+    <id>.idx    JSON lines {"t", "pos", "offset", "key", "key_len"}, one every
+                TERMINAL_RECORD_KEYFRAME seconds of output: a point in time,
+                the .cast byte position of the next event, the stream offset
+                there and, when pyte is installed, the snapshot in .keys
+                that reproduces the screen at that moment
+    <id>.keys   concatenated screen snapshots
+
+The broadcast path only appends (time, bytes) to a list. Batches are
+encoded and written on a single background thread, so writes stay in order
+and never block the event loop. Seeking reads the small index, jumps to the
+nearest keyframe and reads forward from there.
+
+Keyframes come from the live screen model when it is on. Otherwise the
+recorder keeps its own model on the writer thread, fed only when a keyframe
+is due and only with the last _KEYFRAME_TAIL bytes of output: a flood
+costs a bounded parse per keyframe, and older bytes have scrolled off.
+"""
+import codecs
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional
+
+from config import TERMINAL_RECORD_DIR, TERMINAL_RECORD_KEYFRAME, TERMINAL_SCREEN_HISTORY
+from services import screen_model
+
+# One writer thread for all recorders: FIFO, so each file's batches land in order
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="terminal-record")
+
+_SESSION_ID = re.compile(r"[A-Za-z0-9-]{1,64}")
+
+_KEYFRAME_TAIL = 64 * 1024
+
+
+def _base(session_id: str) -> Path:
+    if not _SESSION_ID.fullmatch(session_id):
+        raise ValueError("Invalid session id")
+    return TERMINAL_RECORD_DIR / session_id
+
+
+class SessionRecorder:
+    def __init__(self, session_id: str, project_id: str, name: str, rows: int = 24, cols: int = 80,
+                 keyframes: bool = True):
+        """``keyframes``: build keyframe snapshots here; False when the
+        caller passes the live screen model's to flush()."""
+        base = _base(session_id)
+        base.parent.mkdir(parents=True, exist_ok=True)
+        self.started = time.monotonic()
+        self._events: list[tuple[float, str, object]] = []
+        self._last_keyframe = self.started
+        header = {
+            "version": 2,
+            "width": cols,
+            "height": rows,
+            "timestamp": int(time.time()),
+            "title": name,
+            "env": {"TERM": "xterm-256color"},
+            "thinkdev": {"session_id": session_id, "project_id": project_id},
+        }
+        head = (json.dumps(header) + "\n").encode()
+        # Everything below is only touched on the writer thread
+        self._cast = open(base.with_suffix(".cast"), "wb")
+        self._idx = open(base.with_suffix(".idx"), "w")
+        self._keys = open(base.with_suffix(".keys"), "wb")
+        self._cast.write(head)
+        self._pos = len(head)
+        self._key_pos = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._screen = (
+            screen_model.ScreenModel(rows, cols, TERMINAL_SCREEN_HISTORY)
+            if keyframes and screen_model.AVAILABLE else None
+        )
+        self._tail = bytearray()  # output not yet fed to _screen
+        self._index(0.0, 0, None)
+
+    # Event loop side ---------------------------------------------------- #
+
+    def output(self, data: bytes) -> None:
+        self._events.append((time.monotonic(), "o", data))
+
+    def resize(self, rows: int, cols: int) -> None:
+        self._events.append((time.monotonic(), "r", f"{cols}x{rows}"))
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._events)
+
+    def keyframe_due(self) -> bool:
+        return time.monotonic() - self._last_keyframe >= TERMINAL_RECORD_KEYFRAME
+
+    def flush(self, offset: int, snapshot: Optional[bytes] = None) -> None:
+        """Hand the buffered events to the writer thread. ``offset`` is the
+        stream offset after them. An index entry is added when ``snapshot``
+        (the screen at that point) is given or a keyframe is due."""
+        events, self._events = self._events, []
+        keyframe = bool(events) and (snapshot is not None or self.keyframe_due())
+        if keyframe:
+            self._last_keyframe = time.monotonic()
+        if events:
+            _writer.submit(self._write, events, offset, snapshot, keyframe, time.monotonic())
+
+    def close(self) -> None:
+        _writer.submit(self._close)
+
+    # Writer thread ------------------------------------------------------ #
+
+    def _write(self, events: list, offset: int, snapshot: Optional[bytes], keyframe: bool, now: float) -> None:
+        lines = []
+        for t, kind, data in events:
+            if kind == "o":
+                if self._screen:
+                    self._tail += data
+                    del self._tail[:-_KEYFRAME_TAIL]
+                data = self._decoder.decode(data)
+            elif self._screen:
+                self._feed_screen()
+                cols, rows = data.split("x")
+                self._screen.resize(int(rows), int(cols))
+            lines.append(json.dumps([round(t - self.started, 6), kind, data]))
+        if lines:
+            chunk = ("\n".join(lines) + "\n").encode()
+            self._cast.write(chunk)
+            self._pos += len(chunk)
+            self._cast.flush()
+        if keyframe:
+            if snapshot is None and self._screen:
+                self._feed_screen()
+                snapshot = self._screen.snapshot()
+            self._index(now - self.started, offset, snapshot)
+
+    def _feed_screen(self) -> None:
+        self._screen.feed([bytes(self._tail)], self._screen.offset + len(self._tail))
+        self._tail.clear()
+
+    def _index(self, t: float, offset: int, snapshot: Optional[bytes]) -> None:
+        entry = {"t": round(t, 6), "pos": self._pos, "offset": offset, "key": None, "key_len": 0}
+        if snapshot is not None:
+            self._keys.write(snapshot)
+            self._keys.flush()
+            entry["key"], entry["key_len"] = self._key_pos, len(snapshot)
+            self._key_pos += len(snapshot)
+        self._idx.write(json.dumps(entry) + "\n")
+        self._idx.flush()
+
+    def _close(self) -> None:
+        for f in (self._cast, self._idx, self._keys):
+            f.close()
+
+
+# ---------------------------------------------------------------------- #
+# Reading
+# ---------------------------------------------------------------------- #
+
+def read_header(session_id: str) -> Optional[dict]:
+    try:
+        with open(_base(session_id).with_suffix(".cast"), "rb") as f:
+            return json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+
+
+def list_recordings(project_id: Optional[str] = None) -> list[dict]:
+    """Recordings on disk (newest first), optionally for one project."""
+    if not TERMINAL_RECORD_DIR.exists():
+        return []
+    result = []
+    for path in TERMINAL_RECORD_DIR.glob("*.cast"):
+        header = read_header(path.stem)
+        if not header:
+            continue
+        meta = header.get("thinkdev", {})
+        if project_id and meta.get("project_id") != project_id:
+            continue
+        result.append({
+            "session_id": path.stem,
+            "project_id": meta.get("project_id"),
+            "name": header.get("title"),
+            "timestamp": header.get("timestamp"),
+            "bytes": path.stat().st_size,
+        })
+    result.sort(key=lambda r: r["timestamp"] or 0, reverse=True)
+    return result
+
+
+def _seek_point(base: Path, start: float) -> dict:
+    """Latest index entry at or before ``start`` that can be started from:
+    a keyframe, or the beginning of the recording."""
+    best = None
+    with open(base.with_suffix(".idx")) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # partially written last line
+            if entry["t"] > start:
+                break
+            if best is None or entry["key"] is not None:
+                best = entry
+    return best
+
+
+def iter_events(session_id: str, start: float = 0.0) -> Iterator[tuple[float, str, str]]:
+    """Yield (time relative to ``start``, kind, data) from ``start`` on. The
+    first event is the keyframe snapshot at time 0, if there is one; events
+    between the keyframe and ``start`` are yielded at time 0 too, so the
+    screen is fast-forwarded to exactly ``start``."""
+    base = _base(session_id)
+    point = _seek_point(base, start)
+    if point is None:
+        return
+    if point["key"] is not None:
+        with open(base.with_suffix(".keys"), "rb") as f:
+            f.seek(point["key"])
+            yield 0.0, "o", f.read(point["key_len"]).decode("utf-8", "replace")
+    with open(base.with_suffix(".cast"), "rb") as f:
+        f.seek(point["pos"])
+        for line in f:
+            try:
+                t, kind, data = json.loads(line)
+            except ValueError:
+                break
+            yield max(t - start, 0.0), kind, data
+
+
+def iter_cast(session_id: str, start: float = 0.0) -> Iterator[bytes]:
+    """The recording as an asciicast v2 file starting at ``start`` seconds."""
+    header = read_header(session_id)
+    if header is None:
+        return
+    yield (json.dumps(header) + "\n").encode()
+    batch = []
+    for t, kind, data in iter_events(session_id, start):
+        batch.append(json.dumps([round(t, 6), kind, data]))
+        if len(batch) >= 256:
+            yield ("\n".join(batch) + "\n").encode()
+            batch = []
+    if batch:
+        yield ("\n".join(batch) + "\n").encode()
+
+
+def delete_recording(session_id: str) -> None:
+    base = _base(session_id)
+    for suffix in (".cast", ".idx", ".keys"):
+        try:
+            os.unlink(base.with_suffix(suffix))
+        except OSError:
+            pass
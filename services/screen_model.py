@@ -0,0 +1,172 @@
+"""Headless VT screen model — lets a reconnecting client receive a compact
+snapshot of the current screen instead of re-parsing the raw PTY history.
+
+Backed by ``pyte``; when it is not installed ``AVAILABLE`` is False and the
+terminal manager falls back to raw scrollback replay.
+"""
+import threading
+from typing import Callable, Iterable
+
+try:
+    import pyte
+except ImportError:  # optional dependency
+    pyte = None
+
+AVAILABLE = pyte is not None
+
+_FG = {"black": 30, "red": 31, "green": 32, "brown": 33, "blue": 34,
+       "magenta": 35, "cyan": 36, "white": 37}
+# pyte ships "bfightmagenta" for SGR 105; accept both spellings
+_BRIGHT = {"bright" + k: v + 60 for k, v in _FG.items()}
+_BRIGHT["bfightmagenta"] = _BRIGHT["brightmagenta"]
+
+# Private modes worth restoring on the client (pyte stores private modes << 5)
+_PRIVATE_MODES = (1, 1000, 1002, 1003, 1006, 2004)
+_ALT_SCREEN_MODES = (47, 1047, 1049)
+
+
+def _color(value: str, base: int) -> list[str]:
+    """SGR parameters for a pyte colour name; ``base`` is 0 for fg, 10 for bg."""
+    if value == "default":
+        return []
+    if value in _FG:
+        return [str(_FG[value] + base)]
+    if value in _BRIGHT:
+        return [str(_BRIGHT[value] + base)]
+    try:
+        r, g, b = int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16)
+    except (ValueError, IndexError):
+        return []
+    return [str(38 + base), "2", str(r), str(g), str(b)]
+
+
+def _sgr(char) -> str:
+    params = ["0"]
+    if char.bold:
+        params.append("1")
+    if char.italics:
+        params.append("3")
+    if char.underscore:
+        params.append("4")
+    if char.blink:
+        params.append("5")
+    if char.reverse:
+        params.append("7")
+    if char.strikethrough:
+        params.append("9")
+    params += _color(char.fg, 0)
+    params += _color(char.bg, 10)
+    return "\x1b[" + ";".join(params) + "m"
+
+
+def _style(char) -> tuple:
+    return (char.fg, char.bg, char.bold, char.italics, char.underscore,
+            char.strikethrough, char.reverse, char.blink)
+
+
+class ScreenModel:
+    """Screen grid, cursor, attributes and a bounded scrollback for one session.
+
+    ``offset`` is the absolute scrollback offset of the last byte fed, so the
+    manager can feed lazily from the ring buffer and catch up on demand.
+    Background feeding runs in a worker thread; ``lock`` serializes it with
+    everything that reads or changes the screen."""
+
+    def __init__(self, rows: int, cols: int, history: int):
+        self.screen = pyte.HistoryScreen(cols, rows, history=history, ratio=0.5)
+        self.stream = pyte.ByteStream(self.screen)
+        self.offset = 0
+        self.lock = threading.Lock()
+
+    def feed(self, chunks: Iterable[bytes], end: int) -> None:
+        with self.lock:
+            for chunk in chunks:
+                self.stream.feed(bytes(chunk))
+            self.offset = end
+
+    def feed_from(self, start: int, data: bytes) -> None:
+        """Feed bytes copied from offset ``start``, minus any part a catch-up
+        has fed in the meantime (worker thread)."""
+        with self.lock:
+            skip = max(self.offset - start, 0)
+            if skip < len(data):
+                self.stream.feed(data[skip:])
+                self.offset = start + len(data)
+
+    def catch_up(self, oldest: int, read: Callable[[int], Iterable[bytes]], end: int) -> None:
+        """Feed ``read(offset)`` up to ``end``, skipping what is older than
+        ``oldest``. The offset is taken under the lock, so a batch still
+        running in a worker thread is not fed twice."""
+        with self.lock:
+            for chunk in read(max(self.offset, oldest)):
+                self.stream.feed(bytes(chunk))
+            self.offset = end
+
+    def resize(self, rows: int, cols: int) -> None:
+        with self.lock:
+            self.screen.resize(rows, cols)
+
+    def clear_history(self) -> None:
+        with self.lock:
+            self.screen.history.top.clear()
+
+    def _render_line(self, line, cols: int) -> str:
+        out = []
+        style = None
+        # Trim trailing default blanks so short lines stay short
+        last = -1
+        for x in range(cols):
+            ch = line[x]
+            if ch.data not in ("", " ") or ch.bg != "default" or ch.reverse:
+                last = x
+        for x in range(last + 1):
+            ch = line[x]
+            if ch.data == "":  # right half of a wide character
+                continue
+            st = _style(ch)
+            if st != style:
+                out.append(_sgr(ch))
+                style = st
+            out.append(ch.data)
+        if style is not None:
+            out.append("\x1b[0m")
+        return "".join(out)
+
+    def snapshot(self) -> bytes:
+        """Serialize scrollback + visible screen + cursor and modes as a byte
+        stream that reproduces the current state on a fresh terminal."""
+        with self.lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> bytes:
+        screen = self.screen
+        cols, rows = screen.columns, screen.lines
+        parts = ["\x1bc"]  # full reset of the client terminal
+
+        history = [self._render_line(line, cols) for line in screen.history.top]
+        alt = any((m << 5) in screen.mode for m in _ALT_SCREEN_MODES)
+        if history:
+            parts.append("\r\n".join(history))
+            parts.append("\r\n")
+        if alt:
+            parts.append("\x1b[?1049h")
+        elif history:
+            # Push the history into the client's scrollback before drawing
+            parts.append("\r\n" * (rows - 1))
+        parts.append("\x1b[H")
+        for y in range(rows):
+            line = self._render_line(screen.buffer[y], cols)
+            if line:
+                parts.append(f"\x1b[{y + 1};1H{line}")
+
+        if screen.margins is not None:
+            parts.append(f"\x1b[{screen.margins.top + 1};{screen.margins.bottom + 1}r")
+        for m in _PRIVATE_MODES:
+            if (m << 5) in screen.mode:
+                parts.append(f"\x1b[?{m}h")
+        cursor = screen.cursor
+        parts.append(f"\x1b[{cursor.y + 1};{cursor.x + 1}H")
+        parts.append(_sgr(cursor.attrs))
+        if cursor.hidden:
+            parts.append("\x1b[?25l")
+        return "".join(parts).encode("utf-8")
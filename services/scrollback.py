@@ -0,0 +1,170 @@
+"""Byte-bounded ring buffer for terminal scrollback, addressed by absolute offsets,
+with an optional append-only log file behind it for deep history."""
+import mmap
+import os
+from pathlib import Path
+from typing import Iterator, Optional
+
+# Largest slice handed out per read from the on-disk log
+_LOG_READ_CHUNK = 256 * 1024
+
+
+class ScrollbackLog:
+    """Append-only file holding every byte a session produced. File offset ==
+    absolute stream offset, so reads are a plain mmap slice."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._wfd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o600)
+        self._rfd = os.open(path, os.O_RDONLY)
+        self._map: Optional[mmap.mmap] = None
+        self.size = 0
+        # Oldest offset still served: what came before was cleared
+        self.start = 0
+
+    def append(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            n = os.write(self._wfd, view)
+            view = view[n:]
+        self.size += len(data)
+
+    def view(self, offset: int, end: int) -> memoryview:
+        """Read-only view of [offset, end), capped at _LOG_READ_CHUNK bytes."""
+        end = min(end, self.size, offset + _LOG_READ_CHUNK)
+        if self._map is None or len(self._map) < end:
+            # Remap to the current size. The old map is dropped rather than
+            # closed: a consumer may still hold a view into it.
+            self._map = mmap.mmap(self._rfd, self.size, prot=mmap.PROT_READ)
+        return memoryview(self._map)[offset:end]
+
+    def close(self, remove: bool = False) -> None:
+        self._map = None
+        for fd in (self._wfd, self._rfd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        if remove:
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+
+
+class ScrollbackBuffer:
+    """Fixed-size ring over a single bytearray.
+
+    ``end`` is the total number of bytes ever written; ``start`` is the oldest
+    offset still held. Reads hand out memoryview slices into the ring, so a
+    replay costs at most two sends and no copies. A view is only valid until
+    the next write — consume it (e.g. ``websocket.send_bytes``) right away.
+
+    With a ``log`` attached every write is also appended to disk and offsets
+    older than ``start`` are served from it, so ``oldest`` stays at 0 until
+    the next clear().
+    """
+
+    def __init__(self, capacity: int, log: Optional[ScrollbackLog] = None):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self.start = 0
+        self.end = 0
+        self.log = log
+
+    @property
+    def oldest(self) -> int:
+        """Oldest offset that can still be read (from memory or the log)."""
+        return self.log.start if self.log else self.start
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def write(self, data: bytes) -> None:
+        n = len(data)
+        if not n:
+            return
+        if self.log:
+            try:
+                self.log.append(data)
+            except OSError:
+                # Disk full or similar: keep serving from memory only
+                self.log.close()
+                self.log = None
+        cap = self.capacity
+        mv = memoryview(data)
+        if n > cap:
+            mv = mv[n - cap:]
+        m = len(mv)
+        pos = (self.end + n - m) % cap
+        first = min(m, cap - pos)
+        self._buf[pos:pos + first] = mv[:first]
+        if first < m:
+            self._buf[:m - first] = mv[first:]
+        self.end += n
+        if self.end - self.start > cap:
+            self.start = self.end - cap
+
+    def view_from(self, offset: int) -> memoryview:
+        """Contiguous view from ``offset`` up to the wrap point or ``end``."""
+        if offset < self.start and self.log:
+            return self.log.view(offset, self.start)
+        offset = min(max(offset, self.start), self.end)
+        pos = offset % self.capacity
+        length = min(self.end - offset, self.capacity - pos)
+        return memoryview(self._buf)[pos:pos + length]
+
+    def iter_from(self, offset: Optional[int] = None) -> Iterator[memoryview]:
+        """Yield views from ``offset`` (default: oldest byte in memory) to the
+        current end.
+
+        Views are computed lazily, so a consumer that awaits between items
+        always gets data that is still readable; if it was lapped it resumes
+        from the new ``oldest``. Stops early at a gap (a spilled ring, a
+        short log) rather than spinning on empty views."""
+        pos = self.start if offset is None else offset
+        while True:
+            if pos < self.oldest:
+                pos = self.oldest
+            if pos >= self.end:
+                return
+            view = self.view_from(pos)
+            if not view:
+                return
+            pos += len(view)
+            yield view
+
+    def read(self, offset: Optional[int] = None) -> bytes:
+        """Copy everything from ``offset`` to the end into a new bytes object."""
+        return b"".join(self.iter_from(offset))
+
+    def spill(self, path: Path) -> None:
+        """Move the held bytes to ``path`` and release the ring's memory
+        (idle hibernation). Nothing may be written until restore()."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            for view in self.iter_from(self.start):
+                f.write(view)
+        self._buf = bytearray()
+
+    def restore(self, path: Path) -> None:
+        """Reallocate the ring and reload what spill() wrote. If the file is
+        gone the ring comes back empty at the same offsets."""
+        try:
+            data = path.read_bytes()
+        except OSError:
+            data = b""
+        self._buf = bytearray(self.capacity)
+        # Put the bytes back at their offsets without appending them to the log again
+        log, self.log = self.log, None
+        self.end = self.start = self.end - len(data)
+        self.write(data)
+        self.log = log
+
+    def clear(self) -> None:
+        """Drop buffered data, and the log's history up to here. Offsets keep
+        counting so resumes stay valid."""
+        self.start = self.end
+        if self.log:
+            self.log.start = self.end
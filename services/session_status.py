@@ -0,0 +1,40 @@
+"""Persists terminal session status changes from the in-memory manager to the DB.
+
+The child reaper records every status change as it happens; this task writes
+them out in batches — one UPDATE per distinct status — so a burst of exits
+(e.g. cleanup of a project) costs a single transaction.
+"""
+import asyncio
+from collections import defaultdict
+
+from sqlalchemy import update
+
+from config import TERMINAL_STATUS_BATCH_DELAY
+from database import async_session
+from models import TerminalSession as TerminalSessionModel
+
+
+async def sync_session_status(manager) -> None:
+    """Run forever, flushing ``manager``'s status changes to terminal_sessions."""
+    while True:
+        await manager.wait_status_changes()
+        # Let exits that arrive together share one transaction
+        await asyncio.sleep(TERMINAL_STATUS_BATCH_DELAY)
+        changes = manager.take_status_changes()
+        by_status: dict[str, list[str]] = defaultdict(list)
+        for session_id, status in changes.items():
+            by_status[status].append(session_id)
+        try:
+            async with async_session() as db:
+                for status, ids in by_status.items():
+                    await db.execute(
+                        update(TerminalSessionModel)
+                        .where(TerminalSessionModel.id.in_(ids))
+                        .values(status=status)
+                    )
+                await db.commit()
+        except Exception:
+            # DB busy or gone: keep the changes for the next batch
+            for session_id, status in changes.items():
+                manager._status_changes.setdefault(session_id, status)
+            await asyncio.sleep(1)
@@ -0,0 +1,367 @@
+"""Web-worker side of the PTY supervisor (see services/pty_supervisor.py).
+
+SupervisorClient mirrors the TerminalSessionManager methods used by
+routes/terminal.py and the terminal mux. Nothing here blocks the worker's
+event loop:
+
+- management calls are coroutines, request/response round trips on one
+  asyncio control connection; callers pass every manager call through
+  maybe_await(), so the in-process manager's plain return values work too
+- keystrokes for a session go one-way on a connection of its own; the
+  supervisor stops reading it while that PTY's input backlog is full, so
+  drain_input() waits exactly when the in-process one would
+- each attached client gets its own stream connection
+"""
+import asyncio
+import inspect
+import json
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Union
+
+from config import BASE_DIR, TERMINAL_READY_TIMEOUT, TERMINAL_SUPERVISOR_SOCKET
+from services.pty_supervisor import _HEADER, _OFFSET, encode_frame
+
+_CONNECT_TIMEOUT = 5.0
+_REQUEST_TIMEOUT = 10.0
+
+
+class SupervisorError(Exception):
+    pass
+
+
+async def maybe_await(result):
+    """The result of a manager call: awaited for the supervisor client, as is
+    for the in-process manager."""
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+@dataclass
+class RemoteSession:
+    session_id: str
+    project_id: str
+    name: str
+    pid: int
+    status: str = "running"
+    paused: bool = False
+    flow_pauses: int = 0
+    exit_code: Optional[int] = None
+    hibernated: bool = False
+    resources: dict = field(default_factory=dict)
+    throttled: Optional[str] = None
+
+
+@dataclass(eq=False)
+class RemoteSubscriber:
+    session_id: str
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    offset: int = 0
+    mark: bool = False
+    connected_at: float = field(default_factory=time.time)
+
+
+def ensure_supervisor(socket_path: str = TERMINAL_SUPERVISOR_SOCKET) -> None:
+    """Connect to the supervisor, starting it as a detached daemon if needed."""
+    if _can_connect(socket_path):
+        return
+    subprocess.Popen(
+        [sys.executable, "-m", "services.pty_supervisor", "--socket", socket_path],
+        cwd=str(BASE_DIR),
+        start_new_session=True,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + _CONNECT_TIMEOUT
+    while time.monotonic() < deadline:
+        if _can_connect(socket_path):
+            return
+        time.sleep(0.05)
+    raise SupervisorError(f"PTY supervisor did not start on {socket_path}")
+
+
+def _can_connect(socket_path: str) -> bool:
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        s.close()
+
+
+class _InputConnection:
+    """One session's keystrokes. Frames written before the connection is up
+    are held and sent once it is; the supervisor answers only with F, when
+    it refused input because the session is gone."""
+
+    def __init__(self, client: "SupervisorClient", session_id: str):
+        self.client = client
+        self.session_id = session_id
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.pending: list[bytes] = []
+        self.connected = asyncio.Event()
+        self.closed = False
+        self.refused = False
+        self.task = asyncio.ensure_future(self._run())
+
+    def write(self, frame: bytes) -> bool:
+        if self.closed:
+            return False
+        if self.writer is None:
+            self.pending.append(frame)
+        else:
+            self.writer.write(frame)
+        return True
+
+    async def drain(self) -> None:
+        await self.connected.wait()
+        if self.writer is not None and not self.closed:
+            try:
+                await self.writer.drain()
+            except ConnectionError:
+                pass
+
+    async def _run(self) -> None:
+        try:
+            reader, self.writer = await asyncio.wait_for(
+                asyncio.open_unix_connection(self.client.socket_path), _CONNECT_TIMEOUT
+            )
+            for frame in self.pending:
+                self.writer.write(frame)
+            self.pending.clear()
+            self.connected.set()
+            length, kind = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+            await reader.readexactly(length - 1)
+            self.refused = kind == ord("F")
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self.closed = True
+        self.connected.set()
+        if self.writer is not None:
+            self.writer.close()
+
+
+class SupervisorClient:
+    _instance: Optional["SupervisorClient"] = None
+
+    def __init__(self, socket_path: str = TERMINAL_SUPERVISOR_SOCKET):
+        self.socket_path = socket_path
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        # One request in flight on the control connection at a time
+        self._lock = asyncio.Lock()
+        self._inputs: dict[str, _InputConnection] = {}
+
+    @classmethod
+    def get_instance(cls) -> "SupervisorClient":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    # ------------------------------------------------------------------ #
+    # Control connection
+    # ------------------------------------------------------------------ #
+
+    async def _connect(self) -> None:
+        if self._writer is None or self._writer.is_closing():
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_unix_connection(self.socket_path), _CONNECT_TIMEOUT
+            )
+
+    def _drop(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _round_trip(self, frame: bytes, reader=None, writer=None):
+        reader, writer = reader or self._reader, writer or self._writer
+        writer.write(frame)
+        await writer.drain()
+        length, _kind = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+        return json.loads(await reader.readexactly(length - 1))
+
+    async def _request(self, op: str, **args):
+        frame = encode_frame(b"J", json.dumps({"op": op, **args}).encode())
+        async with self._lock:
+            # One reconnect attempt covers a restarted supervisor. A request
+            # that timed out is not repeated: it may have been carried out.
+            for attempt in (0, 1):
+                try:
+                    await self._connect()
+                    resp = await asyncio.wait_for(self._round_trip(frame), _REQUEST_TIMEOUT)
+                    break
+                except asyncio.TimeoutError as e:
+                    self._drop()
+                    raise SupervisorError(f"PTY supervisor did not answer {op!r}") from e
+                except (OSError, asyncio.IncompleteReadError) as e:
+                    self._drop()
+                    if attempt:
+                        raise SupervisorError(f"PTY supervisor unavailable: {e}") from e
+        if not resp.get("ok"):
+            raise SupervisorError(resp.get("error", "request failed"))
+        return resp.get("result")
+
+    # ------------------------------------------------------------------ #
+    # TerminalSessionManager surface
+    # ------------------------------------------------------------------ #
+
+    async def create_session(
+        self, session_id: str, project_id: str, name: str = "bash",
+        record: Optional[bool] = None, command: Optional[str] = None,
+    ) -> RemoteSession:
+        return RemoteSession(**await self._request(
+            "create", session_id=session_id, project_id=project_id, name=name, record=record, command=command
+        ))
+
+    async def wait_ready(self, session_id: str, timeout: float = TERMINAL_READY_TIMEOUT) -> bool:
+        # The supervisor sends the initial command itself. The wait gets a
+        # connection of its own so it does not hold up the control connection.
+        frame = encode_frame(b"J", json.dumps({"op": "wait_ready", "session_id": session_id,
+                                               "timeout": timeout}).encode())
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(self.socket_path), _CONNECT_TIMEOUT)
+        except OSError as e:
+            raise SupervisorError(f"PTY supervisor unavailable: {e}") from e
+        try:
+            resp = await asyncio.wait_for(self._round_trip(frame, reader, writer), timeout + _REQUEST_TIMEOUT)
+        except (OSError, asyncio.IncompleteReadError):
+            return False
+        finally:
+            writer.close()
+        return bool(resp.get("ok") and resp.get("result"))
+
+    async def get_session(self, session_id: str) -> Optional[RemoteSession]:
+        data = await self._request("get", session_id=session_id)
+        return RemoteSession(**data) if data else None
+
+    async def list_sessions(self, project_id: str = None) -> list[RemoteSession]:
+        return [RemoteSession(**d) for d in await self._request("list", project_id=project_id)]
+
+    async def stop_session(self, session_id: str) -> bool:
+        return await self._request("stop", session_id=session_id)
+
+    async def kill_session(self, session_id: str) -> bool:
+        self._close_input(session_id)
+        return await self._request("kill", session_id=session_id)
+
+    async def remove_session(self, session_id: str) -> bool:
+        self._close_input(session_id)
+        return await self._request("remove", session_id=session_id)
+
+    async def clear_buffer(self, session_id: str) -> bool:
+        return await self._request("clear", session_id=session_id)
+
+    async def resize_session(self, session_id: str, rows: int, cols: int) -> bool:
+        try:
+            return await self._request("resize", session_id=session_id, rows=rows, cols=cols)
+        except SupervisorError:
+            return False
+
+    async def subscriber_stats(self, session_id: str) -> list[dict]:
+        return await self._request("subscribers", session_id=session_id)
+
+    async def output_offsets(self, session_ids: list[str]) -> dict[str, tuple[int, str]]:
+        return {sid: tuple(v) for sid, v in (await self._request("offsets", session_ids=session_ids)).items()}
+
+    async def search(self, session_id: str, q: str, limit: int = 100,
+                     regex: bool = False, case: bool = False) -> Optional[list[dict]]:
+        return await self._request("search", session_id=session_id, q=q, limit=limit, regex=regex, case=case)
+
+    async def search_project(self, project_id: str, q: str, limit: int = 100,
+                             regex: bool = False, case: bool = False) -> list[dict]:
+        return await self._request("search_project", project_id=project_id, q=q, limit=limit,
+                                   regex=regex, case=case)
+
+    async def resource_stats(self, project_id: str = None) -> list[dict]:
+        return await self._request("resources", project_id=project_id)
+
+    async def resume_session(self, session_id: str) -> bool:
+        return await self._request("resume", session_id=session_id)
+
+    async def idle_stats(self) -> dict:
+        return await self._request("idle_stats")
+
+    async def warm_pool(self, project_id: str) -> None:
+        await self._request("warm_pool", project_id=project_id)
+
+    async def spawn_stats(self) -> dict:
+        return await self._request("spawn_stats")
+
+    def write_to_session(self, session_id: str, data: bytes) -> bool:
+        """Queue input on the session's input connection. False once the
+        supervisor refused input for the session (it is gone or stopped) or
+        when the connection was lost; the write after that reconnects."""
+        conn = self._inputs.get(session_id)
+        if conn is not None and conn.closed and not conn.refused:
+            # Report the lost connection once; the next write reconnects
+            del self._inputs[session_id]
+            return False
+        if conn is None:
+            conn = self._inputs[session_id] = _InputConnection(self, session_id)
+        sid = session_id.encode()
+        return conn.write(encode_frame(b"W", bytes([len(sid)]) + sid + data))
+
+    async def drain_input(self, session_id: str) -> None:
+        """Wait while the session's input is backed up: the supervisor stops
+        reading the input connection until the PTY has taken its backlog."""
+        conn = self._inputs.get(session_id)
+        if conn is not None:
+            await conn.drain()
+
+    def _close_input(self, session_id: str) -> None:
+        conn = self._inputs.pop(session_id, None)
+        if conn is not None:
+            conn.task.cancel()
+
+    async def subscribe(self, session_id: str, since: Optional[int] = None) -> RemoteSubscriber:
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        req = {"op": "attach", "session_id": session_id, "since": since}
+        writer.write(encode_frame(b"J", json.dumps(req).encode()))
+        sub = RemoteSubscriber(session_id, reader, writer)
+        length, kind = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+        payload = await reader.readexactly(length - 1)
+        if kind == ord("O"):
+            sub.offset = _OFFSET.unpack(payload)[0]
+        return sub
+
+    def unsubscribe(self, session_id: str, sub: RemoteSubscriber) -> None:
+        sub.writer.close()
+
+    def ack(self, sub: RemoteSubscriber, offset: int) -> None:
+        sub.writer.write(encode_frame(b"A", _OFFSET.pack(offset)))
+
+    def request_snapshot(self, sub: RemoteSubscriber) -> None:
+        sub.writer.write(encode_frame(b"N"))
+
+    async def next_chunk(self, sub: RemoteSubscriber) -> Optional[Union[bytes, memoryview]]:
+        try:
+            length, kind = _HEADER.unpack(await sub.reader.readexactly(_HEADER.size))
+            payload = await sub.reader.readexactly(length - 1)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+        if kind == ord("D"):
+            sub.offset += len(payload)
+            return payload
+        if kind == ord("S"):
+            sub.offset = _OFFSET.unpack_from(payload)[0]
+            sub.mark = True
+            return memoryview(payload)[_OFFSET.size:]
+        return None
+
+    def cleanup_all(self):
+        # Sessions belong to the supervisor and outlive this worker
+        for session_id in list(self._inputs):
+            self._close_input(session_id)
+        self._drop()
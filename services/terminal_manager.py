@@ -1,16 +1,59 @@
 import os
-import pty
+import pickle
 import signal
 import asyncio
 import fcntl
+import itertools
 import struct
 import termios
-from collections import deque
+import time
+from collections import OrderedDict, deque
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import Iterator, Optional, Union
 
-from config import TERMINAL_BUFFER_SIZE, TERMINAL_SHELL
-from services import workspace
+from config import (
+    TERMINAL_BUFFER_SIZE,
+    TERMINAL_COALESCE_BYTES,
+    TERMINAL_COALESCE_WINDOW,
+    TERMINAL_FLOW_HIGH,
+    TERMINAL_FLOW_LOW,
+    TERMINAL_HIBERNATE_DIR,
+    TERMINAL_IDLE_CHECK_INTERVAL,
+    TERMINAL_IDLE_STOP,
+    TERMINAL_IDLE_TIMEOUT,
+    TERMINAL_INPUT_BACKLOG,
+    TERMINAL_INPUT_BACKLOG_MAX,
+    TERMINAL_CPU_LIMIT,
+    TERMINAL_LIMIT_ACTION,
+    TERMINAL_LIMIT_GRACE,
+    TERMINAL_LOG_DIR,
+    TERMINAL_LOG_ENABLED,
+    TERMINAL_PAUSE_DETACHED,
+    TERMINAL_POOL_PROJECTS,
+    TERMINAL_POOL_SIZE,
+    TERMINAL_READ_CHUNK,
+    TERMINAL_READER_MODE,
+    TERMINAL_READY_TIMEOUT,
+    TERMINAL_RECORD,
+    TERMINAL_RECORD_FLUSH,
+    TERMINAL_RENICE,
+    TERMINAL_RESOURCE_INTERVAL,
+    TERMINAL_RSS_LIMIT_MB,
+    TERMINAL_SCREEN_FEED_DELAY,
+    TERMINAL_SCREEN_FEED_MAX,
+    TERMINAL_SCREEN_HISTORY,
+    TERMINAL_SCREEN_MODEL,
+    TERMINAL_SEARCH_ENABLED,
+    TERMINAL_SEARCH_INDEX_DELAY,
+    TERMINAL_SEARCH_INDEX_MAX,
+    TERMINAL_SPAWN_MODE,
+    TERMINAL_STOP_GRACE,
+    TERMINAL_SUBSCRIBER_QUEUE,
+)
+from services import proc_stats, pty_spawn, screen_model, workspace
+from services.recording import SessionRecorder
+from services.scrollback import ScrollbackBuffer, ScrollbackLog
+from services.terminal_search import SearchIndex, compile_query, search_many
 
 
 @dataclass
@@ -21,8 +64,61 @@ class SessionInfo:
     pid: int
     fd: int
     status: str = "running"
-    output_buffer: deque = field(default_factory=lambda: deque(maxlen=TERMINAL_BUFFER_SIZE))
-    _buffer_bytes: int = 0
+    scrollback: ScrollbackBuffer = field(default_factory=lambda: ScrollbackBuffer(TERMINAL_BUFFER_SIZE))
+    screen: Optional[screen_model.ScreenModel] = None
+    # Flow control: reading is paused while downstream has no room
+    paused: bool = False
+    flow_pauses: int = 0
+    # Time-to-first-prompt bookkeeping (monotonic clock)
+    pooled: bool = False
+    created_at: float = 0.0
+    first_output_at: Optional[float] = None
+    # Readiness: first prompt marker seen; command queued until then
+    ready_at: Optional[float] = None
+    initial_command: Optional[str] = None
+    exit_code: Optional[int] = None
+    recorder: Optional[SessionRecorder] = None
+    search: Optional[SearchIndex] = None
+    rows: int = 24
+    cols: int = 80
+    # Idle hibernation: buffers spilled to TERMINAL_HIBERNATE_DIR (see _hibernate)
+    last_activity: float = 0.0
+    hibernated: bool = False
+    # Resource accounting (see _sample_resources); input_bytes counts input
+    # accepted for the PTY, output is scrollback.end
+    input_bytes: int = 0
+    resources: dict = field(default_factory=dict)
+    over_limit: int = 0  # consecutive samples over a limit
+    throttled: Optional[str] = None  # "reniced" | "paused"
+
+
+# Queue item that wakes a consumer whose queue was dropped so it starts its resync
+_RESYNC = object()
+
+
+@dataclass(eq=False)
+class Subscriber:
+    """One attached client. ``offset`` is the absolute offset of the next byte it
+    will be handed; ``tail`` is how far output has been queued or replayed for
+    it. A stale subscriber gets nothing from the live fan-out and instead
+    replays from the scrollback until it has caught up."""
+    session_id: str
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=TERMINAL_SUBSCRIBER_QUEUE))
+    offset: int = 0
+    tail: int = 0
+    stale: bool = False
+    # Set after a chunk that isn't stream data (snapshot, reset); the route then
+    # tells the client its current offset so it can resume with ?since=
+    mark: bool = False
+    replay: Optional[Iterator[Union[bytes, memoryview]]] = None
+    # The replay starts with a screen snapshot: next_chunk() parses what the
+    # screen model is behind on in a worker thread first
+    snapshot: bool = False
+    resyncs: int = 0
+    # Offset the client reports as rendered (binary protocol ACK); flow control
+    # counts from here instead of ``offset`` once the client sends acks
+    acked: Optional[int] = None
+    connected_at: float = field(default_factory=time.time)
 
 
 class TerminalSessionManager:
@@ -30,12 +126,79 @@ class TerminalSessionManager:
 
     def __init__(self):
         self.sessions: dict[str, SessionInfo] = {}
-        # Per-session: set of asyncio.Queue, one per connected WebSocket client
-        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        # Per-session: set of Subscriber, one per connected WebSocket client
+        self._subscribers: dict[str, set[Subscriber]] = {}
         # Per-session: single background PTY reader task
         self._reader_tasks: dict[str, asyncio.Task] = {}
-        # Per-session: write lock to serialize input from multiple clients
-        self._write_locks: dict[str, asyncio.Lock] = {}
+        # Per-session: master fd registered with loop.add_reader ("event" reader mode)
+        self._readers: dict[str, int] = {}
+        # Sessions whose event-mode reader has been started (it may be paused)
+        self._readers_started: set[str] = set()
+        self.reader_mode = TERMINAL_READER_MODE
+        self.screen_model = TERMINAL_SCREEN_MODEL and screen_model.AVAILABLE
+        self.log_enabled = TERMINAL_LOG_ENABLED
+        # Read-side flow control
+        self.flow_high = TERMINAL_FLOW_HIGH
+        self.flow_low = TERMINAL_FLOW_LOW
+        self.pause_detached = TERMINAL_PAUSE_DETACHED
+        # Per-session: set when an executor-mode reader is released from a pause
+        self._resume_events: dict[str, asyncio.Event] = {}
+        # Output coalescing between the PTY reader and the subscriber queues
+        self.coalesce_bytes = TERMINAL_COALESCE_BYTES
+        self.coalesce_window = TERMINAL_COALESCE_WINDOW
+        self._pending_output: dict[str, bytearray] = {}
+        self._flush_handles: dict[str, asyncio.TimerHandle] = {}
+        self._last_flush: dict[str, float] = {}
+        # Per-session: pending call_later handle that feeds the screen model, or
+        # the future of the batch it handed to a worker thread
+        self._screen_feeds: dict[str, Union[asyncio.TimerHandle, asyncio.Future]] = {}
+        # Per-session: the same for the search index
+        self.search_enabled = TERMINAL_SEARCH_ENABLED
+        self._search_feeds: dict[str, Union[asyncio.TimerHandle, asyncio.Future]] = {}
+        # Recording (asciicast): default for new sessions, pending batch flushes
+        self.record = TERMINAL_RECORD
+        self._record_flushes: dict[str, asyncio.TimerHandle] = {}
+        # Per-session: input the PTY has not accepted yet (fd registered with
+        # add_writer while non-empty) and waiters for room in it
+        self._input_backlog: dict[str, bytearray] = {}
+        self._writers: dict[str, int] = {}
+        self._input_space: dict[str, asyncio.Event] = {}
+        self.spawn_mode = TERMINAL_SPAWN_MODE
+        # Per-project idle (pid, master fd) shells, least recently used first
+        self.pool_size = TERMINAL_POOL_SIZE
+        self._pool: OrderedDict[str, deque[tuple[int, int]]] = OrderedDict()
+        self._pool_hits = 0
+        self._pool_misses = 0
+        # Recent (pooled, seconds) time-to-first-prompt samples
+        self._ttfp: deque[tuple[bool, float]] = deque(maxlen=256)
+        # Sessions waiting for their first prompt marker, and waiters on it;
+        # recent (seconds to ready, marker seen) launch samples
+        self._ready_events: dict[str, asyncio.Event] = {}
+        self._ready_timers: dict[str, asyncio.TimerHandle] = {}
+        self._ready_tail: dict[str, bytes] = {}
+        self._launches: deque[tuple[float, bool]] = deque(maxlen=256)
+        # Child exit watching: pid -> pidfd registered with the loop (or -1 when
+        # the SIGCHLD fallback is used). Outlives the session until reaped.
+        self._children: dict[int, int] = {}
+        self._sigchld_installed = False
+        # Sessions whose subscribers have been told the session ended
+        self._ended: set[str] = set()
+        # Idle hibernation
+        self.idle_timeout = TERMINAL_IDLE_TIMEOUT
+        self.idle_stop = TERMINAL_IDLE_STOP
+        self._idle_handle: Optional[asyncio.TimerHandle] = None
+        self._hibernations = 0
+        self._wakes = 0
+        # Resource sampling and limits
+        self.cpu_limit = TERMINAL_CPU_LIMIT
+        self.rss_limit = TERMINAL_RSS_LIMIT_MB * 1024 * 1024
+        self.limit_action = TERMINAL_LIMIT_ACTION
+        self._resource_handle: Optional[asyncio.TimerHandle] = None
+        self._resource_sampled_at = 0.0
+        self._sampling = False
+        # Status changes not yet written to the DB (see services/session_status.py)
+        self._status_changes: dict[str, str] = {}
+        self._status_event: Optional[asyncio.Event] = None
 
     @classmethod
     def get_instance(cls) -> "TerminalSessionManager":
@@ -43,109 +206,589 @@ class TerminalSessionManager:
             cls._instance = cls()
         return cls._instance
 
-    def create_session(self, session_id: str, project_id: str, name: str = "bash") -> SessionInfo:
+    def create_session(self, session_id: str, project_id: str, name: str = "bash",
+                       record: Optional[bool] = None, command: Optional[str] = None) -> SessionInfo:
+        """Start (or take from the pool) a shell for ``project_id``. ``command``
+        is typed into it once the shell shows its first prompt."""
         ws_path = workspace.resolve(project_id)
         ws_path.mkdir(parents=True, exist_ok=True)
 
-        pid, fd = pty.openpty()
-        child_pid = os.fork()
-
-        if child_pid == 0:
-            # Child process
-            os.close(pid)
-            os.setsid()
-            # Set the slave as controlling terminal
-            fcntl.ioctl(fd, termios.TIOCSCTTY, 0)
-            os.dup2(fd, 0)
-            os.dup2(fd, 1)
-            os.dup2(fd, 2)
-            if fd > 2:
-                os.close(fd)
-            os.chdir(str(ws_path))
-            env = os.environ.copy()
-            env["TERM"] = "xterm-256color"
-            env["COLORTERM"] = "truecolor"
-            env["HOME"] = os.path.expanduser("~")
-            env["CLICOLOR"] = "1"
-            env["CLICOLOR_FORCE"] = "1"
-            env["LSCOLORS"] = "GxFxCxDxBxegedabagaced"
-            env["FORCE_COLOR"] = "1"
-
-            # Create a custom zshrc that sources user's config then sets colored prompt
-            import tempfile
-            zdotdir = tempfile.mkdtemp(prefix="thinkdev-zsh-")
-            home = os.path.expanduser("~")
-            with open(os.path.join(zdotdir, ".zshrc"), "w") as f:
-                f.write(f'[ -f "{home}/.zshrc" ] && source "{home}/.zshrc"\n')
-                f.write('export PROMPT="%F{green}%n@%m%f %F{blue}%1~%f %# "\n')
-                f.write('export CLICOLOR=1\n')
-            with open(os.path.join(zdotdir, ".zshenv"), "w") as f:
-                f.write(f'[ -f "{home}/.zshenv" ] && source "{home}/.zshenv"\n')
-
-            shell_name = os.path.basename(TERMINAL_SHELL)
-            if shell_name == "zsh":
-                env["ZDOTDIR"] = zdotdir
-                os.execvpe(TERMINAL_SHELL, [TERMINAL_SHELL], env)
-            else:
-                # Bash: use --rcfile with colored PS1
-                import getpass, socket
-                user = getpass.getuser()
-                host = socket.gethostname().split(".")[0]
-                bashrc = os.path.join(zdotdir, ".bashrc")
-                with open(bashrc, "w") as f:
-                    f.write(f'[ -f "{home}/.bashrc" ] && source "{home}/.bashrc"\n')
-                    f.write(f'export PS1="\\[\\033[01;32m\\]{user}@{host}\\[\\033[00m\\] \\[\\033[01;34m\\]\\W\\[\\033[00m\\] \\$ "\n')
-                os.execvpe(TERMINAL_SHELL, [TERMINAL_SHELL, "--rcfile", bashrc], env)
+        started = time.monotonic()
+        shell = self._take_pooled(project_id)
+        if shell:
+            self._pool_hits += 1
+            child_pid, fd = shell
         else:
-            # Parent process
-            os.close(fd)
-            # Set non-blocking
-            flags = fcntl.fcntl(pid, fcntl.F_GETFL)
-            fcntl.fcntl(pid, fcntl.F_SETFL, flags | os.O_NONBLOCK)
-
-            # Set terminal size (80x24)
-            winsize = struct.pack("HHHH", 24, 80, 0, 0)
-            fcntl.ioctl(pid, termios.TIOCSWINSZ, winsize)
-
-            session = SessionInfo(
-                session_id=session_id,
-                project_id=project_id,
-                name=name,
-                pid=child_pid,
-                fd=pid,
+            self._pool_misses += 1
+            child_pid, fd = pty_spawn.spawn_shell(ws_path, mode=self.spawn_mode)
+
+        session = SessionInfo(
+            session_id=session_id,
+            project_id=project_id,
+            name=name,
+            pid=child_pid,
+            fd=fd,
+            pooled=shell is not None,
+            created_at=started,
+            last_activity=started,
+            initial_command=command or None,
+        )
+        if self.log_enabled:
+            session.scrollback.log = ScrollbackLog(TERMINAL_LOG_DIR / f"{session_id}.log")
+        if self.screen_model:
+            session.screen = screen_model.ScreenModel(24, 80, TERMINAL_SCREEN_HISTORY)
+        if self.search_enabled:
+            session.search = SearchIndex()
+        if self.record if record is None else record:
+            session.recorder = SessionRecorder(session_id, project_id, name, keyframes=session.screen is None)
+        self.sessions[session_id] = session
+        # Init per-session multi-client state
+        self._subscribers[session_id] = set()
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop:
+            # Read from the start so time-to-first-prompt is measured (and the
+            # prompt is buffered) before the first client attaches
+            self._ensure_reader(session_id)
+            self._watch_child(child_pid)
+            if self.pool_size:
+                loop.call_soon(self._fill_pool, project_id)
+            self._ready_events[session_id] = asyncio.Event()
+            self._ready_timers[session_id] = loop.call_later(
+                TERMINAL_READY_TIMEOUT, self._mark_ready, session, False
             )
-            self.sessions[session_id] = session
-            # Init per-session multi-client state
-            self._subscribers[session_id] = set()
-            return session
+            if self.idle_timeout > 0 and self._idle_handle is None:
+                self._idle_handle = loop.call_later(TERMINAL_IDLE_CHECK_INTERVAL, self._idle_sweep)
+            if proc_stats.AVAILABLE and self._resource_handle is None:
+                self._resource_handle = loop.call_later(TERMINAL_RESOURCE_INTERVAL, self._sample_resources)
+        return session
+
+    # ------------------------------------------------------------------ #
+    # Child exit watching
+    # ------------------------------------------------------------------ #
+
+    def _watch_child(self, pid: int) -> None:
+        """React to the shell exiting as soon as it happens: a pidfd becomes
+        readable on exit (Linux 5.3+); elsewhere a SIGCHLD handler reaps."""
+        loop = asyncio.get_running_loop()
+        if hasattr(os, "pidfd_open"):
+            try:
+                pidfd = os.pidfd_open(pid)
+            except OSError:
+                pidfd = -1
+            if pidfd >= 0:
+                self._children[pid] = pidfd
+                loop.add_reader(pidfd, self._reap, pid)
+                return
+        self._children[pid] = -1
+        if not self._sigchld_installed:
+            try:
+                loop.add_signal_handler(signal.SIGCHLD, self._reap_all)
+                self._sigchld_installed = True
+            except (RuntimeError, ValueError):
+                # Not the main thread: exits are still noticed via PTY EOF
+                pass
+        self._reap(pid)
+
+    def _reap_all(self) -> None:
+        for pid in list(self._children):
+            self._reap(pid)
+
+    def _reap(self, pid: int) -> None:
+        try:
+            done, wait_status = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            done, wait_status = pid, None
+        if done == 0:
+            return
+        pidfd = self._children.pop(pid, -1)
+        if pidfd >= 0:
+            asyncio.get_running_loop().remove_reader(pidfd)
+            os.close(pidfd)
+        session = next((s for s in self.sessions.values() if s.pid == pid), None)
+        if session:
+            if wait_status is not None:
+                session.exit_code = os.waitstatus_to_exitcode(wait_status)
+            self._session_exited(session)
+
+    def _session_exited(self, session: SessionInfo) -> None:
+        """The shell is gone: deliver whatever output is left, then end the stream."""
+        session_id = session.session_id
+        self._set_status(session, "stopped")
+        if session_id in self._ended:
+            return
+        # Even a flow-paused session is drained: the PTY holds at most a few KB
+        session.paused = False
+        self._on_pty_readable(session_id)
+        self._remove_reader(session_id)
+        self._notify_ended(session_id)
+
+    def _set_status(self, session: SessionInfo, status: str) -> None:
+        if session.status == status:
+            return
+        session.status = status
+        self._status_changes[session.session_id] = status
+        if self._status_event:
+            self._status_event.set()
+
+    async def wait_status_changes(self) -> None:
+        """Return once there are status changes for take_status_changes()."""
+        if self._status_event is None:
+            self._status_event = asyncio.Event()
+        while not self._status_changes:
+            self._status_event.clear()
+            await self._status_event.wait()
+
+    def take_status_changes(self) -> dict[str, str]:
+        """Session id -> new status for every change since the last call."""
+        changes, self._status_changes = self._status_changes, {}
+        return changes
+
+    # ------------------------------------------------------------------ #
+    # Pre-started shell pool
+    # ------------------------------------------------------------------ #
+
+    def _take_pooled(self, project_id: str) -> Optional[tuple[int, int]]:
+        """Hand out an idle shell for ``project_id`` that is still alive."""
+        pool = self._pool.get(project_id)
+        if pool is None:
+            return None
+        self._pool.move_to_end(project_id)
+        while pool:
+            pid, fd = pool.popleft()
+            try:
+                alive = os.waitpid(pid, os.WNOHANG)[0] == 0
+            except ChildProcessError:
+                alive = False
+            if alive:
+                return pid, fd
+            os.close(fd)
+        return None
+
+    def _fill_pool(self, project_id: str) -> None:
+        """Top the project's pool up to pool_size idle shells. The shells start
+        (and print their prompt) in the background; nothing reads them until
+        they are handed out."""
+        if not self.pool_size:
+            return
+        pool = self._pool.setdefault(project_id, deque())
+        self._pool.move_to_end(project_id)
+        while len(self._pool) > TERMINAL_POOL_PROJECTS:
+            _, stale = self._pool.popitem(last=False)
+            self._drain_pool(stale)
+        ws_path = workspace.resolve(project_id)
+        ws_path.mkdir(parents=True, exist_ok=True)
+        while len(pool) < self.pool_size:
+            try:
+                pool.append(pty_spawn.spawn_shell(ws_path, mode=self.spawn_mode))
+            except OSError:
+                break
+
+    def warm_pool(self, project_id: str) -> None:
+        """Start idle shells for a project ahead of its first terminal."""
+        self._fill_pool(project_id)
+
+    def _drain_pool(self, pool: deque) -> None:
+        while pool:
+            pid, fd = pool.popleft()
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def spawn_stats(self) -> dict:
+        """Spawn mode, pool usage and time-to-first-prompt (create -> first
+        output byte) percentiles over recent sessions."""
+        def summary(samples: list[float]) -> dict:
+            if not samples:
+                return {"samples": 0}
+            ordered = sorted(samples)
+            pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+            return {"samples": len(ordered), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "max_ms": pick(1.0)}
+
+        return {
+            "spawn_mode": self.spawn_mode,
+            "pool_size": self.pool_size,
+            "pool_hits": self._pool_hits,
+            "pool_misses": self._pool_misses,
+            "pooled_idle": {project: len(pool) for project, pool in self._pool.items()},
+            "ttfp": summary([t for _, t in self._ttfp]),
+            "ttfp_pooled": summary([t for pooled, t in self._ttfp if pooled]),
+            "ttfp_spawned": summary([t for pooled, t in self._ttfp if not pooled]),
+            # Sessions created with an initial command: create -> command sent,
+            # and how many saw the prompt marker rather than timing out
+            "launch_ready": summary([t for t, _ in self._launches]),
+            "launches": len(self._launches),
+            "launches_by_marker": sum(1 for _, seen in self._launches if seen),
+        }
+
+    # ------------------------------------------------------------------ #
+    # Readiness: the first prompt, and the initial command typed into it
+    # ------------------------------------------------------------------ #
+
+    def _scan_ready(self, session: SessionInfo, data: bytes) -> None:
+        """Look for the rc files' prompt marker in output (only until found;
+        the last few bytes are kept in case it is split across reads)."""
+        session_id = session.session_id
+        window = self._ready_tail.get(session_id, b"") + data
+        if pty_spawn.PROMPT_MARKER in window:
+            self._mark_ready(session, True)
+        else:
+            self._ready_tail[session_id] = window[-(len(pty_spawn.PROMPT_MARKER) - 1):]
+
+    def _mark_ready(self, session: SessionInfo, seen: bool) -> None:
+        """The shell is ready (or TERMINAL_READY_TIMEOUT passed without a
+        marker, e.g. a custom prompt): send the initial command and wake
+        wait_ready() callers."""
+        session_id = session.session_id
+        handle = self._ready_timers.pop(session_id, None)
+        if handle:
+            handle.cancel()
+        self._ready_tail.pop(session_id, None)
+        event = self._ready_events.pop(session_id, None)
+        if session.ready_at is not None:
+            return
+        session.ready_at = time.monotonic()
+        if session.initial_command:
+            self._launches.append((session.ready_at - session.created_at, seen))
+            if session.status == "running":
+                self.write_to_session(session_id, session.initial_command.encode() + b"\r")
+        if event:
+            event.set()
+
+    async def wait_ready(self, session_id: str, timeout: float = TERMINAL_READY_TIMEOUT) -> bool:
+        """Wait until the session's shell is ready and its initial command has
+        been sent. False if the session is gone or did not become ready."""
+        event = self._ready_events.get(session_id)
+        if event:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        session = self.sessions.get(session_id)
+        return bool(session and session.ready_at is not None)
+
+    # ------------------------------------------------------------------ #
+    # Idle hibernation: resident memory scales with active sessions
+    # ------------------------------------------------------------------ #
+
+    def _idle_sweep(self) -> None:
+        """Hibernate sessions that have had no clients, input or output for
+        idle_timeout seconds. Runs every TERMINAL_IDLE_CHECK_INTERVAL."""
+        self._idle_handle = None
+        if self.idle_timeout <= 0 or not self.sessions:
+            return
+        cutoff = time.monotonic() - self.idle_timeout
+        for session_id, session in list(self.sessions.items()):
+            if (session.status == "running" and not session.hibernated
+                    and session.last_activity < cutoff
+                    and not self._subscribers.get(session_id)
+                    and session_id not in self._input_backlog):
+                self._hibernate(session)
+        self._idle_handle = asyncio.get_running_loop().call_later(
+            TERMINAL_IDLE_CHECK_INTERVAL, self._idle_sweep
+        )
+
+    def _hibernate(self, session: SessionInfo) -> None:
+        """Spill the scrollback ring, screen model and search index to disk
+        and drop them from memory; with idle_stop, also SIGSTOP the shell
+        when it sits at a prompt. _wake() reverses it on the next attach,
+        input, resize or output."""
+        session_id = session.session_id
+        self._flush_output(session_id)
+        self._flush_recording(session_id)
+        # Both models read the ring, so catch them up before it is spilled
+        self._feed_screen(session_id)
+        self._feed_search(session_id)
+        base = TERMINAL_HIBERNATE_DIR / session_id
+        try:
+            session.scrollback.spill(base.with_suffix(".ring"))
+            if session.screen:
+                base.with_suffix(".screen").write_bytes(session.screen.snapshot())
+                session.screen = None
+            if session.search:
+                with open(base.with_suffix(".search"), "wb") as f:
+                    pickle.dump(session.search, f, pickle.HIGHEST_PROTOCOL)
+                session.search = None
+        except OSError:
+            # Disk trouble: whatever was spilled is restored and the session stays resident
+            session.hibernated = True
+            self._wake(session)
+            return
+        session.hibernated = True
+        self._hibernations += 1
+        if self.idle_stop and self._at_prompt(session):
+            # Only the shell's own group: a quiet foreground job (a long build)
+            # or a background job keeps running
+            try:
+                os.killpg(session.pid, signal.SIGSTOP)
+            except OSError:
+                pass
+
+    def _wake(self, session: SessionInfo) -> None:
+        """Bring a hibernated session back into memory (no-op otherwise)."""
+        if not session.hibernated:
+            return
+        session.hibernated = False
+        session.last_activity = time.monotonic()
+        self._wakes += 1
+        try:
+            os.killpg(session.pid, signal.SIGCONT)
+        except OSError:
+            pass
+        base = TERMINAL_HIBERNATE_DIR / session.session_id
+        session.scrollback.restore(base.with_suffix(".ring"))
+        if self.screen_model:
+            session.screen = screen_model.ScreenModel(session.rows, session.cols, TERMINAL_SCREEN_HISTORY)
+            try:
+                session.screen.feed([base.with_suffix(".screen").read_bytes()], session.scrollback.end)
+            except OSError:
+                session.screen.offset = session.scrollback.start
+        if self.search_enabled:
+            session.search = self._load_search(session) or SearchIndex()
+            session.search.skip_to(session.scrollback.start)
+        self._discard_hibernation(session)
+
+    def _load_search(self, session: SessionInfo) -> Optional[SearchIndex]:
+        try:
+            with open((TERMINAL_HIBERNATE_DIR / session.session_id).with_suffix(".search"), "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError):
+            return None
+
+    def _discard_hibernation(self, session: SessionInfo) -> None:
+        for suffix in (".ring", ".screen", ".search"):
+            try:
+                os.unlink((TERMINAL_HIBERNATE_DIR / session.session_id).with_suffix(suffix))
+            except OSError:
+                pass
+
+    def _at_prompt(self, session: SessionInfo) -> bool:
+        """True when the shell itself is the terminal's foreground process group."""
+        try:
+            return os.tcgetpgrp(session.fd) == session.pid
+        except OSError:
+            return False
+
+    def idle_stats(self) -> dict:
+        return {
+            "idle_timeout": self.idle_timeout,
+            "idle_stop": self.idle_stop,
+            "sessions": len(self.sessions),
+            "hibernated": sum(1 for s in self.sessions.values() if s.hibernated),
+            "hibernations": self._hibernations,
+            "wakes": self._wakes,
+        }
+
+    # ------------------------------------------------------------------ #
+    # Resource accounting and limits
+    # ------------------------------------------------------------------ #
+
+    def _sample_resources(self) -> None:
+        """Timer: scan /proc for all running sessions at once, off the loop."""
+        self._resource_handle = None
+        running = {s.pid: s.session_id for s in self.sessions.values() if s.status == "running"}
+        if not running:
+            return
+        loop = asyncio.get_running_loop()
+        if not self._sampling:
+            self._sampling = True
+            future = loop.run_in_executor(None, proc_stats.scan_sessions, list(running))
+            future.add_done_callback(lambda f: self._apply_resources(running, f))
+        self._resource_handle = loop.call_later(TERMINAL_RESOURCE_INTERVAL, self._sample_resources)
+
+    def _apply_resources(self, running: dict[int, str], future: asyncio.Future) -> None:
+        self._sampling = False
+        if future.cancelled() or future.exception():
+            return
+        now = time.monotonic()
+        elapsed = now - self._resource_sampled_at if self._resource_sampled_at else 0.0
+        self._resource_sampled_at = now
+        for pid, totals in future.result().items():
+            session = self.sessions.get(running[pid])
+            if not session or session.pid != pid:
+                continue
+            cpu_seconds = totals["ticks"] / proc_stats.CLK_TCK
+            previous = session.resources.get("cpu_seconds")
+            cpu_percent = None
+            if previous is not None and elapsed > 0:
+                # Children that exited take their ticks with them: clamp at 0
+                cpu_percent = round(max(cpu_seconds - previous, 0.0) / elapsed * 100, 1)
+            session.resources = {
+                "cpu_seconds": cpu_seconds,
+                "cpu_percent": cpu_percent,
+                "rss_bytes": totals["rss_pages"] * proc_stats.PAGE_SIZE,
+                "processes": len(totals["pids"]),
+                "bytes_in": session.input_bytes,
+                "bytes_out": session.scrollback.end,
+            }
+            self._enforce_limits(session, totals["pids"])
+
+    def _enforce_limits(self, session: SessionInfo, pids: list[int]) -> None:
+        usage = session.resources
+        over = (
+            (self.cpu_limit > 0 and (usage["cpu_percent"] or 0) > self.cpu_limit)
+            or (self.rss_limit > 0 and usage["rss_bytes"] > self.rss_limit)
+        )
+        session.over_limit = session.over_limit + 1 if over else 0
+        if session.over_limit < TERMINAL_LIMIT_GRACE or session.throttled:
+            return
+        if self.limit_action == "pause":
+            # The foreground job, not the shell: the user can still resume it
+            try:
+                pgid = os.tcgetpgrp(session.fd)
+            except OSError:
+                return
+            if pgid == session.pid:
+                return
+            try:
+                os.killpg(pgid, signal.SIGSTOP)
+            except OSError:
+                return
+            session.throttled = "paused"
+        elif self.limit_action == "renice":
+            for pid in pids:
+                try:
+                    os.setpriority(os.PRIO_PROCESS, pid, max(os.getpriority(os.PRIO_PROCESS, pid), TERMINAL_RENICE))
+                except OSError:
+                    pass
+            session.throttled = "reniced"
+
+    def resume_session(self, session_id: str) -> bool:
+        """Undo a "pause" throttle (SIGCONT the stopped job). Reniced
+        processes keep their priority: raising it again needs privileges."""
+        session = self.sessions.get(session_id)
+        if not session or not session.throttled:
+            return False
+        if session.throttled == "paused":
+            try:
+                os.killpg(os.tcgetpgrp(session.fd), signal.SIGCONT)
+            except OSError:
+                pass
+        session.throttled = None
+        session.over_limit = 0
+        return True
+
+    def resource_stats(self, project_id: str = None) -> list[dict]:
+        """Latest sample per session (empty until the first two samples)."""
+        return [
+            {"session_id": s.session_id, "name": s.name, "status": s.status,
+             "throttled": s.throttled, **s.resources}
+            for s in self.list_sessions(project_id)
+        ]
 
     def get_session(self, session_id: str) -> Optional[SessionInfo]:
         return self.sessions.get(session_id)
 
+    # ------------------------------------------------------------------ #
+    # Input: one ordered outbound buffer per session, drained by loop.add_writer
+    # ------------------------------------------------------------------ #
+
     def write_to_session(self, session_id: str, data: bytes) -> bool:
+        """Queue input for the PTY. Input from every client goes through one
+        buffer in arrival order; whatever the PTY does not take right away is
+        written when the master fd becomes writable. Returns False when the
+        session is gone or the backlog is over its hard cap."""
         session = self.sessions.get(session_id)
         if not session or session.status != "running":
             return False
-        try:
-            os.write(session.fd, data)
+        session.last_activity = time.monotonic()
+        self._wake(session)
+        backlog = self._input_backlog.get(session_id)
+        if backlog:
+            if len(backlog) + len(data) > TERMINAL_INPUT_BACKLOG_MAX:
+                return False
+            backlog += data
+            session.input_bytes += len(data)
             return True
+        view = memoryview(data)
+        try:
+            while view:
+                n = os.write(session.fd, view)
+                view = view[n:]
+        except BlockingIOError:
+            pass
         except OSError:
             return False
+        session.input_bytes += len(data)
+        if view:
+            self._input_backlog[session_id] = bytearray(view)
+            asyncio.get_running_loop().add_writer(session.fd, self._on_pty_writable, session_id)
+            self._writers[session_id] = session.fd
+        return True
 
-    def get_write_lock(self, session_id: str) -> asyncio.Lock:
-        """Return (lazily created) write lock for a session."""
-        if session_id not in self._write_locks:
-            self._write_locks[session_id] = asyncio.Lock()
-        return self._write_locks[session_id]
+    def _on_pty_writable(self, session_id: str) -> None:
+        session = self.sessions.get(session_id)
+        backlog = self._input_backlog.get(session_id)
+        if not session or not backlog:
+            self._drop_input(session_id)
+            return
+        written = 0
+        try:
+            while written < len(backlog):
+                written += os.write(session.fd, memoryview(backlog)[written:])
+        except BlockingIOError:
+            pass
+        except OSError:
+            self._drop_input(session_id)
+            return
+        del backlog[:written]
+        if len(backlog) < TERMINAL_INPUT_BACKLOG:
+            event = self._input_space.pop(session_id, None)
+            if event:
+                event.set()
+        if not backlog:
+            self._drop_input(session_id)
+
+    def _drop_input(self, session_id: str) -> None:
+        """Stop the writer and release anyone waiting in drain_input()."""
+        self._input_backlog.pop(session_id, None)
+        fd = self._writers.pop(session_id, None)
+        if fd is not None:
+            try:
+                asyncio.get_running_loop().remove_writer(fd)
+            except (RuntimeError, ValueError, OSError):
+                pass
+        event = self._input_space.pop(session_id, None)
+        if event:
+            event.set()
+
+    async def drain_input(self, session_id: str) -> None:
+        """Backpressure for input sources: wait while the session's backlog is
+        over TERMINAL_INPUT_BACKLOG. A WebSocket handler that awaits this
+        between frames stops reading, so the browser's sends back up instead."""
+        while len(self._input_backlog.get(session_id, b"")) >= TERMINAL_INPUT_BACKLOG:
+            event = self._input_space.setdefault(session_id, asyncio.Event())
+            await event.wait()
+
+    def input_backlog(self, session_id: str) -> int:
+        """Bytes of input queued but not yet accepted by the PTY."""
+        return len(self._input_backlog.get(session_id, b""))
 
     def resize_session(self, session_id: str, rows: int, cols: int) -> bool:
         session = self.sessions.get(session_id)
         if not session or session.status != "running":
             return False
+        self._wake(session)
+        session.rows, session.cols = rows, cols
         try:
             winsize = struct.pack("HHHH", rows, cols, 0, 0)
             fcntl.ioctl(session.fd, termios.TIOCSWINSZ, winsize)
             os.kill(session.pid, signal.SIGWINCH)
+            if session.recorder:
+                session.recorder.resize(rows, cols)
+            if session.screen:
+                # Not caught up first: output still unparsed is laid out at the
+                # new size, and full-screen programs redraw on SIGWINCH anyway
+                session.screen.resize(rows, cols)
             return True
         except OSError:
             return False
@@ -154,24 +797,196 @@ class TerminalSessionManager:
     # Multi-client broadcast: one PTY reader, fan-out to subscriber queues
     # ------------------------------------------------------------------ #
 
-    async def subscribe(self, session_id: str) -> asyncio.Queue:
-        """Register a WebSocket client. Returns a queue that receives PTY bytes.
-        Call unsubscribe() when the client disconnects."""
-        q: asyncio.Queue[Optional[bytes]] = asyncio.Queue(maxsize=512)
-        subs = self._subscribers.setdefault(session_id, set())
-        subs.add(q)
+    async def subscribe(self, session_id: str, since: Optional[int] = None) -> Subscriber:
+        """Register a WebSocket client and queue up its catch-up replay: the exact
+        bytes after ``since`` when given, otherwise a screen snapshot (or the whole
+        scrollback without a screen model). Read with next_chunk(); call
+        unsubscribe() when the client disconnects."""
+        sub = Subscriber(session_id)
+        session = self.sessions.get(session_id)
+        if session:
+            self._wake(session)
+            ring = session.scrollback
+            sub.offset = sub.tail = ring.start if since is None else min(max(since, 0), ring.end)
+            sub.stale = True
+            sub.snapshot = since is None and session.screen is not None
+            sub.replay = self._replay(session, sub, snapshot=since is None)
+        self._subscribers.setdefault(session_id, set()).add(sub)
+        self._update_flow(session_id)
         # Start/restart the single background reader if needed
         self._ensure_reader(session_id)
-        return q
+        return sub
 
-    def unsubscribe(self, session_id: str, q: asyncio.Queue) -> None:
-        """Unregister a WebSocket client queue."""
+    def unsubscribe(self, session_id: str, sub: Subscriber) -> None:
+        """Unregister a WebSocket client."""
         subs = self._subscribers.get(session_id)
-        if subs:
-            subs.discard(q)
+        if subs and sub in subs:
+            subs.discard(sub)
+            self._update_flow(session_id)
+            session = self.sessions.get(session_id)
+            if session:
+                # The idle period starts when the last client leaves
+                session.last_activity = time.monotonic()
+
+    async def next_chunk(self, sub: Subscriber) -> Optional[Union[bytes, memoryview]]:
+        """Next piece of output for a subscriber, or None once the session ended.
+        Memoryviews point into the scrollback and must be sent before awaiting
+        anything else."""
+        while True:
+            if sub.replay is not None:
+                session = self.sessions.get(sub.session_id)
+                if session and session.screen and (sub.snapshot or sub.tail < session.scrollback.oldest):
+                    await self._catch_up_screen(session)
+                sub.snapshot = False
+                chunk = next(sub.replay, None)
+                if chunk is not None:
+                    self._check_resume(sub.session_id)
+                    return chunk
+                # Caught up with the scrollback — back on the live fan-out
+                sub.replay = None
+                sub.stale = False
+            item = await sub.queue.get()
+            if item is _RESYNC:
+                continue
+            if item is None:
+                return None
+            sub.offset += len(item)
+            self._check_resume(sub.session_id)
+            return item
+
+    def _replay(self, session: SessionInfo, sub: Subscriber, snapshot: bool = False):
+        """Generator feeding a stale subscriber from the scrollback. Data is read
+        lazily, so output produced while earlier chunks were being sent is picked
+        up too; the generator ends once ``sub`` reaches the end of the ring."""
+        ring = session.scrollback
+        if snapshot and session.screen:
+            self._feed_screen(session.session_id)
+            sub.offset = sub.tail = ring.end
+            sub.mark = True
+            yield session.screen.snapshot()
+        elif sub.tail < ring.oldest:
+            # The bytes this client needs are gone: start it over
+            sub.resyncs += 1
+            sub.mark = True
+            if session.screen:
+                self._feed_screen(session.session_id)
+                sub.offset = sub.tail = ring.end
+                yield session.screen.snapshot()
+            else:
+                sub.offset = sub.tail = ring.start
+                yield b"\x1bc"
+        while sub.tail < ring.end:
+            if sub.tail < ring.oldest:
+                sub.resyncs += 1  # lapped mid-replay; skip what was overwritten
+                sub.offset = sub.tail = ring.start
+                sub.mark = True
+            view = ring.view_from(sub.tail)
+            if not view:
+                return  # a gap (spilled ring, short log): nothing more to read
+            sub.offset = sub.tail = sub.tail + len(view)
+            yield view
+
+    # ------------------------------------------------------------------ #
+    # Read-side flow control: when nobody downstream has room, stop reading
+    # the master fd and let the kernel PTY buffer throttle the child.
+    # ------------------------------------------------------------------ #
+
+    def _flow_blocked(self, session: SessionInfo) -> bool:
+        subs = self._subscribers.get(session.session_id)
+        if not subs:
+            return self.pause_detached
+        # Hysteresis: pause above flow_high, resume only once below flow_low
+        limit = self.flow_low if session.paused else self.flow_high
+        end = session.scrollback.end
+        return all(end - (sub.offset if sub.acked is None else sub.acked) > limit for sub in subs)
+
+    def _update_flow(self, session_id: str) -> None:
+        session = self.sessions.get(session_id)
+        if not session or session.status != "running":
+            return
+        blocked = self._flow_blocked(session)
+        if blocked and not session.paused:
+            session.paused = True
+            session.flow_pauses += 1
+            self._remove_reader(session_id)
+        elif not blocked and session.paused:
+            session.paused = False
+            event = self._resume_events.pop(session_id, None)
+            if event:
+                event.set()
+            elif session_id in self._readers_started:
+                self._add_reader(session_id)
+
+    def _check_resume(self, session_id: str) -> None:
+        """Consumer-side hook: a client just took data, maybe there is room now."""
+        session = self.sessions.get(session_id)
+        if session and session.paused:
+            self._update_flow(session_id)
+
+    def _mark_stale(self, sub: Subscriber) -> None:
+        """Drop a lagging subscriber's queue; it resyncs from where it is."""
+        sub.stale = True
+        sub.acked = None  # the offsets are about to move; wait for fresh acks
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.tail = sub.offset
+        session = self.sessions.get(sub.session_id)
+        if session:
+            sub.replay = self._replay(session, sub)
+        sub.queue.put_nowait(_RESYNC)
+
+    def ack(self, sub: Subscriber, offset: int) -> None:
+        """The client has rendered output up to ``offset``."""
+        sub.acked = min(max(offset, sub.acked or 0), sub.offset)
+        self._check_resume(sub.session_id)
+
+    def request_snapshot(self, sub: Subscriber) -> None:
+        """Restart a subscriber's stream from a fresh snapshot, e.g. after the
+        client reset its terminal. Without a screen model the client is reset
+        and gets the in-memory scrollback instead."""
+        session = self.sessions.get(sub.session_id)
+        if not session:
+            return
+        self._mark_stale(sub)
+        if session.screen:
+            sub.snapshot = True
+            sub.replay = self._replay(session, sub, snapshot=True)
+        else:
+            sub.offset = sub.tail = session.scrollback.start
+            sub.mark = True
+            sub.replay = itertools.chain((b"\x1bc",), self._replay(session, sub))
+
+    def subscriber_stats(self, session_id: str) -> list[dict]:
+        """Per-subscriber lag: bytes produced but not yet handed to the client."""
+        session = self.sessions.get(session_id)
+        end = session.scrollback.end if session else 0
+        return [
+            {
+                "offset": sub.offset,
+                "acked": sub.acked,
+                "lag_bytes": max(end - sub.offset, 0),
+                "queued_chunks": sub.queue.qsize(),
+                "stale": sub.stale,
+                "resyncs": sub.resyncs,
+                "connected_at": sub.connected_at,
+            }
+            for sub in self._subscribers.get(session_id, set())
+        ]
+
+    def output_offsets(self, session_ids: list[str]) -> dict[str, tuple[int, str]]:
+        """Session id -> (end offset, status), for cheap activity polling of
+        sessions nobody is subscribed to. Unknown sessions are left out."""
+        return {
+            sid: (self.sessions[sid].scrollback.end, self.sessions[sid].status)
+            for sid in session_ids
+            if sid in self.sessions
+        }
 
     def _ensure_reader(self, session_id: str) -> None:
-        """Start the background PTY reader task if it isn't already running."""
+        """Start the PTY reader for a session if it isn't already running."""
+        if self.reader_mode == "event":
+            self._add_reader(session_id)
+            return
         task = self._reader_tasks.get(session_id)
         if task is None or task.done():
             self._reader_tasks[session_id] = asyncio.create_task(
@@ -179,9 +994,322 @@ class TerminalSessionManager:
                 name=f"pty-reader-{session_id[:8]}",
             )
 
+    def _add_reader(self, session_id: str) -> None:
+        """Register the non-blocking master fd with the event loop."""
+        if session_id in self._readers:
+            return
+        session = self.sessions.get(session_id)
+        if not session or session.status != "running":
+            return
+        self._readers_started.add(session_id)
+        if session.paused:
+            return
+        asyncio.get_running_loop().add_reader(session.fd, self._on_pty_readable, session_id)
+        self._readers[session_id] = session.fd
+
+    def _remove_reader(self, session_id: str) -> None:
+        fd = self._readers.pop(session_id, None)
+        if fd is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(fd)
+            except (RuntimeError, ValueError, OSError):
+                pass
+
+    def _on_pty_readable(self, session_id: str) -> None:
+        """Event-loop callback: drain whatever the PTY has ready, then broadcast once.
+        Reads are capped at TERMINAL_READ_CHUNK per wakeup so one chatty session
+        cannot starve the loop."""
+        session = self.sessions.get(session_id)
+        if not session:
+            self._remove_reader(session_id)
+            return
+
+        chunks = []
+        total = 0
+        eof = False
+        while total < TERMINAL_READ_CHUNK:
+            try:
+                data = os.read(session.fd, TERMINAL_READ_CHUNK - total)
+            except BlockingIOError:
+                break
+            except OSError:
+                # EIO: the slave side closed (shell exited)
+                eof = True
+                break
+            if not data:
+                eof = True
+                break
+            chunks.append(data)
+            total += len(data)
+
+        if chunks:
+            self._broadcast(session, chunks[0] if len(chunks) == 1 else b"".join(chunks))
+        if eof:
+            self._set_status(session, "stopped")
+            self._remove_reader(session_id)
+            self._notify_ended(session_id)
+
+    def _broadcast(self, session: SessionInfo, data: bytes) -> None:
+        """Append PTY output to the replay buffer and fan it out to every subscriber."""
+        if session.first_output_at is None:
+            session.first_output_at = time.monotonic()
+            self._ttfp.append((session.pooled, session.first_output_at - session.created_at))
+        if session.hibernated:
+            self._wake(session)
+        if session.ready_at is None:
+            self._scan_ready(session, data)
+        session.last_activity = time.monotonic()
+        session.scrollback.write(data)
+        if session.recorder:
+            session.recorder.output(data)
+            if session.session_id not in self._record_flushes:
+                self._record_flushes[session.session_id] = asyncio.get_running_loop().call_later(
+                    TERMINAL_RECORD_FLUSH, self._flush_recording, session.session_id
+                )
+        if session.screen:
+            self._schedule_screen_feed(session.session_id)
+        if session.search:
+            self._schedule_search_feed(session.session_id)
+
+        self._coalesce(session.session_id, data)
+
+    def _coalesce(self, session_id: str, data: bytes) -> None:
+        """Merge output into fewer, larger frames. A chunk that arrives after the
+        session has been quiet for a full window goes out immediately (echo,
+        prompts); anything following it is held until coalesce_bytes or
+        coalesce_window is reached."""
+        if self.coalesce_bytes <= 0:
+            self._fan_out(session_id, data)
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        pending = self._pending_output.get(session_id)
+        if pending is None and now - self._last_flush.get(session_id, 0.0) >= self.coalesce_window:
+            self._last_flush[session_id] = now
+            self._fan_out(session_id, data)
+            return
+        if pending is None:
+            pending = self._pending_output[session_id] = bytearray()
+        pending += data
+        if len(pending) >= self.coalesce_bytes:
+            self._flush_output(session_id)
+        elif session_id not in self._flush_handles:
+            self._flush_handles[session_id] = loop.call_later(
+                self.coalesce_window, self._flush_output, session_id
+            )
+
+    def _flush_output(self, session_id: str) -> None:
+        handle = self._flush_handles.pop(session_id, None)
+        if handle:
+            handle.cancel()
+        pending = self._pending_output.pop(session_id, None)
+        if pending:
+            self._last_flush[session_id] = asyncio.get_running_loop().time()
+            self._fan_out(session_id, bytes(pending))
+
+    def _fan_out(self, session_id: str, data: bytes) -> None:
+        session = self.sessions.get(session_id)
+        if not session:
+            return
+        end = session.scrollback.end
+        start = end - len(data)
+        for sub in list(self._subscribers.get(session_id, set())):
+            if sub.stale or sub.tail >= end:
+                continue
+            chunk = data if sub.tail <= start else data[sub.tail - start:]
+            try:
+                sub.queue.put_nowait(chunk)
+                sub.tail = end
+            except asyncio.QueueFull:
+                self._mark_stale(sub)
+        self._update_flow(session_id)
+
+    def _schedule_screen_feed(self, session_id: str) -> None:
+        if session_id not in self._screen_feeds:
+            self._screen_feeds[session_id] = asyncio.get_running_loop().call_later(
+                TERMINAL_SCREEN_FEED_DELAY, self._feed_screen_batch, session_id
+            )
+
+    def _feed_screen_batch(self, session_id: str) -> None:
+        """Hand the screen model its next TERMINAL_SCREEN_FEED_MAX bytes in a
+        worker thread. pyte parses about 1MB/s, so under a flood the model
+        falls behind instead of stalling the loop; whatever is still unparsed
+        when a snapshot is wanted is fed by _feed_screen()."""
+        self._screen_feeds.pop(session_id, None)
+        session = self.sessions.get(session_id)
+        if session and session.screen:
+            self._run_batch(self._screen_feeds, session, session.screen,
+                            TERMINAL_SCREEN_FEED_MAX, self._schedule_screen_feed)
+
+    def _run_batch(self, feeds: dict, session: SessionInfo, model, limit: int, reschedule) -> None:
+        """Copy up to ``limit`` bytes after ``model.offset`` out of the ring
+        and have a worker thread pass them to ``model.feed_from()``; once it
+        is done and there is more, ``reschedule(session_id)``. Output that
+        already left the ring is skipped, not read back from the log."""
+        ring = session.scrollback
+        start = max(model.offset, ring.start)
+        if start >= ring.end:
+            return
+        data = bytearray()
+        for view in ring.iter_from(start):
+            data += view[:limit - len(data)]
+            if len(data) >= limit:
+                break
+        session_id = session.session_id
+        future = asyncio.get_running_loop().run_in_executor(None, model.feed_from, start, bytes(data))
+        feeds[session_id] = future
+
+        def done(_):
+            if feeds.get(session_id) is future:
+                del feeds[session_id]
+            if (not future.cancelled() and future.exception() is None
+                    and session_id in self.sessions and model.offset < ring.end):
+                reschedule(session_id)
+
+        future.add_done_callback(done)
+
+    async def _catch_up_screen(self, session: SessionInfo) -> None:
+        """Parse everything the screen model is behind on in a worker thread,
+        so the _feed_screen() that precedes a snapshot has little left to do."""
+        screen, ring = session.screen, session.scrollback
+        start = max(screen.offset, ring.start)
+        if start < ring.end:
+            await asyncio.get_running_loop().run_in_executor(None, screen.feed_from, start, ring.read(start))
+
+    def _feed_screen(self, session_id: str) -> None:
+        """Catch the screen model up with the scrollback before it is read.
+        At most one ring of output, since older bytes are skipped; waits for
+        a batch still running in a worker."""
+        self._cancel_timer(self._screen_feeds, session_id)
+        session = self.sessions.get(session_id)
+        if session and session.screen:
+            ring = session.scrollback
+            session.screen.catch_up(ring.start, ring.iter_from, ring.end)
+
+    def _cancel_timer(self, feeds: dict, session_id: str) -> None:
+        """Drop a batch that is scheduled but not started (one running in a
+        worker is left to finish)."""
+        handle = feeds.get(session_id)
+        if isinstance(handle, asyncio.TimerHandle):
+            handle.cancel()
+            del feeds[session_id]
+
+    def _schedule_search_feed(self, session_id: str) -> None:
+        if session_id not in self._search_feeds:
+            self._search_feeds[session_id] = asyncio.get_running_loop().call_later(
+                TERMINAL_SEARCH_INDEX_DELAY, self._feed_search_batch, session_id
+            )
+
+    def _feed_search_batch(self, session_id: str) -> None:
+        """At most TERMINAL_SEARCH_INDEX_MAX bytes per TERMINAL_SEARCH_INDEX_DELAY
+        are indexed, in a worker thread. Output beyond that rate leaves the
+        ring unindexed (counted in skipped_bytes); search() first indexes
+        whatever the ring still holds."""
+        self._search_feeds.pop(session_id, None)
+        session = self.sessions.get(session_id)
+        if session and session.search:
+            self._run_batch(self._search_feeds, session, session.search,
+                            TERMINAL_SEARCH_INDEX_MAX, self._schedule_search_feed)
+
+    def _feed_search(self, session_id: str) -> None:
+        """Catch the search index up with the in-memory scrollback (before a
+        search, hibernation or clear)."""
+        self._cancel_timer(self._search_feeds, session_id)
+        session = self.sessions.get(session_id)
+        if session and session.search:
+            ring = session.scrollback
+            session.search.catch_up(ring.start, ring.iter_from, ring.end)
+
+    def search(self, session_id: str, q: str, limit: int = 100,
+               regex: bool = False, case: bool = False) -> Optional[list[dict]]:
+        """Matching output lines of one session, newest first; None if the
+        session does not exist or is not indexed."""
+        session = self.sessions.get(session_id)
+        if not session:
+            return None
+        # A hibernated session is searched from its spilled index, without waking it
+        index = self._load_search(session) if session.hibernated else session.search
+        if not index:
+            return None
+        self._feed_search(session_id)
+        return index.search(compile_query(q, regex, case), limit)
+
+    async def search_project(self, project_id: str, q: str, limit: int = 100,
+                             regex: bool = False, case: bool = False) -> list[dict]:
+        """Matching lines across a project's sessions, newest first, each with
+        its session_id. The unindexed tail of each ring is copied here; it is
+        indexed, hibernated indexes are loaded and all are scanned in a worker
+        thread."""
+        pattern = compile_query(q, regex, case)
+        resident, hibernated = [], []
+        for session in self.list_sessions(project_id):
+            if session.hibernated:
+                hibernated.append(session)
+            elif session.search:
+                self._cancel_timer(self._search_feeds, session.session_id)
+                ring = session.scrollback
+                start = max(session.search.offset, ring.start)
+                resident.append((session.session_id, session.search, start, ring.read(start)))
+
+        def scan() -> list[dict]:
+            indexes = []
+            for session_id, index, start, data in resident:
+                index.feed_from(start, data)
+                indexes.append((session_id, index))
+            for session in hibernated:
+                index = self._load_search(session)
+                if index:
+                    indexes.append((session.session_id, index))
+            return search_many(indexes, pattern, limit)
+
+        return await asyncio.to_thread(scan)
+
+    def _flush_recording(self, session_id: str) -> None:
+        """Hand buffered output to the recorder's writer thread, with a screen
+        snapshot as a seek keyframe every TERMINAL_RECORD_KEYFRAME seconds
+        (the recorder makes its own when the screen model is off)."""
+        handle = self._record_flushes.pop(session_id, None)
+        if handle:
+            handle.cancel()
+        session = self.sessions.get(session_id)
+        if not session or not session.recorder:
+            return
+        snapshot = None
+        # A keyframe only when the screen model is (nearly) current: during a
+        # flood it is skipped rather than parsing a ring's worth on the loop
+        if (session.screen and session.recorder.pending and session.recorder.keyframe_due()
+                and session.scrollback.end - session.screen.offset <= TERMINAL_SCREEN_FEED_MAX):
+            self._feed_screen(session_id)
+            snapshot = session.screen.snapshot()
+        session.recorder.flush(session.scrollback.end, snapshot)
+
+    def _close_recording(self, session: SessionInfo) -> None:
+        """Write out what is left and close the recording files (once)."""
+        handle = self._record_flushes.pop(session.session_id, None)
+        if handle:
+            handle.cancel()
+        if session.recorder:
+            session.recorder.flush(session.scrollback.end)
+            session.recorder.close()
+            session.recorder = None
+
+    def _notify_ended(self, session_id: str) -> None:
+        """Signal all subscribers that the session ended (once)."""
+        if session_id in self._ended:
+            return
+        self._ended.add(session_id)
+        self._flush_output(session_id)
+        session = self.sessions.get(session_id)
+        if session:
+            self._close_recording(session)
+        for sub in list(self._subscribers.get(session_id, set())):
+            if sub.queue.full():
+                self._mark_stale(sub)
+            sub.queue.put_nowait(None)
+
     async def _pty_reader_task(self, session_id: str) -> None:
-        """Reads from the PTY once and broadcasts to ALL subscriber queues.
-        This is the ONLY coroutine that calls os.read() on the fd."""
+        """Executor-mode reader: polls the PTY from the default thread pool and
+        broadcasts to ALL subscriber queues."""
         session = self.sessions.get(session_id)
         if not session:
             return
@@ -189,81 +1317,111 @@ class TerminalSessionManager:
         loop = asyncio.get_event_loop()
         while session.status == "running":
             try:
+                if session.paused:
+                    event = self._resume_events.setdefault(session_id, asyncio.Event())
+                    await event.wait()
+                    continue
                 data = await loop.run_in_executor(None, self._blocking_read, session.fd)
                 if data:
-                    # Append to replay buffer
-                    session.output_buffer.append(data)
-                    session._buffer_bytes += len(data)
-                    while session._buffer_bytes > TERMINAL_BUFFER_SIZE and session.output_buffer:
-                        removed = session.output_buffer.popleft()
-                        session._buffer_bytes -= len(removed)
-
-                    # Broadcast to every connected client
-                    for q in list(self._subscribers.get(session_id, set())):
-                        try:
-                            q.put_nowait(data)
-                        except asyncio.QueueFull:
-                            pass  # Slow consumer — drop rather than block
+                    self._broadcast(session, data)
                 else:
                     await asyncio.sleep(0.01)
             except OSError:
-                session.status = "stopped"
+                self._set_status(session, "stopped")
                 break
             except asyncio.CancelledError:
                 break
             except Exception:
                 await asyncio.sleep(0.05)
 
-        # Signal all subscribers that the session ended
-        sentinel = None
-        for q in list(self._subscribers.get(session_id, set())):
-            try:
-                q.put_nowait(sentinel)
-            except asyncio.QueueFull:
-                pass
+        self._notify_ended(session_id)
 
     def _cleanup_session_state(self, session_id: str) -> None:
-        """Cancel reader task and notify remaining subscribers."""
+        """Stop the reader and notify remaining subscribers."""
+        self._remove_reader(session_id)
+        self._readers_started.discard(session_id)
+        event = self._resume_events.pop(session_id, None)
+        if event:
+            event.set()
+        for handles in (self._screen_feeds, self._search_feeds, self._flush_handles):
+            handle = handles.pop(session_id, None)
+            if handle:
+                handle.cancel()
+        self._pending_output.pop(session_id, None)
+        self._last_flush.pop(session_id, None)
+        self._ready_tail.pop(session_id, None)
+        handle = self._ready_timers.pop(session_id, None)
+        if handle:
+            handle.cancel()
+        event = self._ready_events.pop(session_id, None)
+        if event:
+            event.set()
         task = self._reader_tasks.pop(session_id, None)
         if task and not task.done():
             task.cancel()
 
         subs = self._subscribers.pop(session_id, set())
-        for q in subs:
-            try:
-                q.put_nowait(None)
-            except asyncio.QueueFull:
-                pass
+        for sub in subs:
+            # The session is going away: nothing left to replay
+            sub.replay = None
+            while not sub.queue.empty():
+                sub.queue.get_nowait()
+            sub.queue.put_nowait(None)
 
-        self._write_locks.pop(session_id, None)
+        self._drop_input(session_id)
 
     # ------------------------------------------------------------------ #
 
-    def get_buffer(self, session_id: str) -> bytes:
-        session = self.sessions.get(session_id)
-        if not session:
-            return b""
-        return b"".join(session.output_buffer)
-
     def clear_buffer(self, session_id: str) -> bool:
         session = self.sessions.get(session_id)
         if not session:
             return False
-        session.output_buffer.clear()
-        session._buffer_bytes = 0
+        self._wake(session)
+        session.scrollback.clear()
+        if session.search:
+            self._feed_search(session_id)
+            session.search.clear()
+        if session.screen:
+            self._feed_screen(session_id)
+            session.screen.clear_history()
         return True
 
     def stop_session(self, session_id: str) -> bool:
+        """Hang up like a closed terminal window: SIGHUP (an interactive shell
+        ignores SIGTERM), then SIGKILL if the shell is still there after
+        TERMINAL_STOP_GRACE. The status changes when the reaper sees the
+        shell exit; its output stays viewable."""
         session = self.sessions.get(session_id)
         if not session or session.status != "running":
             return False
+        self._wake(session)
+        self._signal_session(session, signal.SIGHUP)
+        # Stopped jobs only act on the hangup once continued
+        self._signal_session(session, signal.SIGCONT)
         try:
-            os.kill(session.pid, signal.SIGTERM)
-            session.status = "stopped"
-            return True
+            asyncio.get_running_loop().call_later(TERMINAL_STOP_GRACE, self._force_stop, session_id, session.pid)
+        except RuntimeError:
+            pass
+        return True
+
+    def _force_stop(self, session_id: str, pid: int) -> None:
+        session = self.sessions.get(session_id)
+        if session and session.pid == pid and session.status == "running":
+            self._signal_session(session, signal.SIGKILL)
+
+    def _signal_session(self, session: SessionInfo, sig: int) -> None:
+        """Signal the shell's process group and the foreground job's, if that
+        is a different one."""
+        groups = {session.pid}
+        try:
+            groups.add(os.tcgetpgrp(session.fd))
         except OSError:
-            session.status = "stopped"
-            return True
+            pass
+        for pgid in groups:
+            try:
+                os.killpg(pgid, sig)
+            except OSError:
+                pass
 
     def kill_session(self, session_id: str) -> bool:
         session = self.sessions.get(session_id)
@@ -273,27 +1431,37 @@ class TerminalSessionManager:
             os.kill(session.pid, signal.SIGKILL)
         except OSError:
             pass
-        session.status = "stopped"
-        self._close_fd(session)
+        self._wake(session)
+        self._set_status(session, "stopped")
+        self._close_recording(session)
         self._cleanup_session_state(session_id)
+        self._close_fd(session)
         return True
 
     def remove_session(self, session_id: str) -> bool:
         session = self.sessions.pop(session_id, None)
         if not session:
             return False
-        if session.status == "running":
+        if session.status == "running" or session.pid in self._children:
             try:
                 os.kill(session.pid, signal.SIGKILL)
             except OSError:
                 pass
-        self._close_fd(session)
+        if session.hibernated:
+            self._discard_hibernation(session)
+        self._close_recording(session)
         self._cleanup_session_state(session_id)
-        # Reap child
-        try:
-            os.waitpid(session.pid, os.WNOHANG)
-        except ChildProcessError:
-            pass
+        self._ended.discard(session_id)
+        self._status_changes.pop(session_id, None)
+        self._close_fd(session)
+        if session.scrollback.log:
+            session.scrollback.log.close(remove=True)
+        if session.pid not in self._children:
+            # Not watched (no loop at creation): reap now if already gone
+            try:
+                os.waitpid(session.pid, os.WNOHANG)
+            except ChildProcessError:
+                pass
         return True
 
     def _close_fd(self, session: SessionInfo):
@@ -303,30 +1471,37 @@ class TerminalSessionManager:
             pass
 
     def list_sessions(self, project_id: str = None) -> list[SessionInfo]:
+        """In-memory only: status is kept current by the child reaper."""
         if project_id:
             return [s for s in self.sessions.values() if s.project_id == project_id]
         return list(self.sessions.values())
 
     def cleanup_all(self):
+        for handle in (self._idle_handle, self._resource_handle):
+            if handle:
+                handle.cancel()
+        self._idle_handle = self._resource_handle = None
         for sid in list(self.sessions.keys()):
             self.remove_session(sid)
-
-    def _check_alive(self, session: SessionInfo) -> bool:
-        try:
-            pid, status = os.waitpid(session.pid, os.WNOHANG)
-            if pid != 0:
-                session.status = "stopped"
-                return False
-            return True
-        except ChildProcessError:
-            session.status = "stopped"
-            return False
+        while self._pool:
+            self._drain_pool(self._pool.popitem()[1])
+        for pid in list(self._children):
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+            pidfd = self._children.pop(pid)
+            if pidfd >= 0:
+                try:
+                    asyncio.get_running_loop().remove_reader(pidfd)
+                except RuntimeError:
+                    pass
+                os.close(pidfd)
 
     def _blocking_read(self, fd: int) -> bytes:
         try:
             return os.read(fd, 4096)
         except BlockingIOError:
-            import time
             time.sleep(0.02)
             return b""
         except OSError:
@@ -0,0 +1,249 @@
+"""Multiplexed terminal WebSocket: many sessions over one connection.
+
+Frames are those of services/terminal_protocol.py with a 2-byte big-endian
+channel after the opcode:
+
+    <1-byte opcode><2-byte channel><payload>
+
+Channels are picked by the client with ATTACH; channel 0 is the connection
+itself (WATCH, PING). ATTACH's ``since`` is NO_OFFSET for a snapshot and
+flags bit 0 marks the channel visible.
+
+A visible channel streams like /ws/terminal/{id}. A hidden one holds no
+subscription at all: it is polled every TERMINAL_MUX_POLL_INTERVAL and only
+gets ACTIVITY frames, then resumes from its last offset when shown again.
+"""
+import asyncio
+import json
+import logging
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from config import TERMINAL_MUX_POLL_INTERVAL
+from services.supervisor_client import maybe_await
+from services.terminal_protocol import (
+    NO_OFFSET,
+    OFFSET,
+    OP_ACK,
+    OP_ACTIVITY,
+    OP_ATTACH,
+    OP_DETACH,
+    OP_ENDED,
+    OP_INPUT,
+    OP_OFFSET,
+    OP_OUTPUT,
+    OP_PING,
+    OP_PONG,
+    OP_RESIZE,
+    OP_SESSIONS,
+    OP_SNAPSHOT,
+    OP_VISIBILITY,
+    OP_WATCH,
+    RESIZE,
+    InputBatcher,
+)
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct(">BH")
+_ATTACH = struct.Struct(">QB")
+
+
+@dataclass(eq=False)
+class Channel:
+    session_id: str
+    visible: bool
+    # Next byte the client expects; None until the first OFFSET is sent
+    offset: Optional[int] = None
+    # Hidden channels: output end last announced with ACTIVITY
+    reported: Optional[int] = None
+    sub: object = None
+    pump: Optional[asyncio.Task] = None
+    ended: bool = False
+    batcher: Optional[InputBatcher] = None
+
+
+class TerminalMux:
+    """Serves one multiplexed WebSocket connection."""
+
+    def __init__(self, websocket: WebSocket, manager):
+        self.websocket = websocket
+        self.manager = manager
+        self.channels: dict[int, Channel] = {}
+        self.watch_project: Optional[str] = None
+        self._last_sessions: Optional[list] = None
+        self._send_lock = asyncio.Lock()
+
+    async def run(self) -> None:
+        poller = asyncio.create_task(self._poll())
+        try:
+            while True:
+                msg = await self.websocket.receive()
+                if msg.get("type") == "websocket.disconnect":
+                    break
+                frame = msg.get("bytes")
+                if frame and len(frame) >= _HEADER.size:
+                    op, chan = _HEADER.unpack_from(frame)
+                    await self._handle(op, chan, memoryview(frame)[_HEADER.size:])
+        except (WebSocketDisconnect, OSError):
+            pass  # the client went away
+        except Exception:
+            logger.exception("Terminal mux connection failed")
+        finally:
+            poller.cancel()
+            for chan in list(self.channels):
+                await self._detach(chan)
+
+    async def _send(self, op: int, chan: int, payload: bytes = b"") -> None:
+        # The frame is assembled (copying any memoryview) before the first await
+        frame = _HEADER.pack(op, chan) + payload
+        async with self._send_lock:
+            await self.websocket.send_bytes(frame)
+
+    async def _handle(self, op: int, chan: int, payload: memoryview) -> None:
+        if op == OP_ATTACH:
+            since, flags = _ATTACH.unpack_from(payload)
+            session_id = bytes(payload[_ATTACH.size:]).decode()
+            await self._attach(chan, session_id, None if since == NO_OFFSET else since, bool(flags & 1))
+        elif op == OP_DETACH:
+            await self._detach(chan)
+        elif op == OP_INPUT:
+            channel = self.channels.get(chan)
+            if channel:
+                channel.batcher.feed(payload)
+                # Stops reading the whole connection while this PTY is behind
+                await self.manager.drain_input(channel.session_id)
+        elif op == OP_RESIZE:
+            channel = self.channels.get(chan)
+            if channel:
+                rows, cols = RESIZE.unpack_from(payload)
+                await maybe_await(self.manager.resize_session(channel.session_id, rows, cols))
+        elif op == OP_VISIBILITY:
+            channel = self.channels.get(chan)
+            if channel and bool(payload[0]) != channel.visible:
+                channel.visible = bool(payload[0])
+                if channel.visible:
+                    await self._start_stream(chan, channel, channel.offset)
+                else:
+                    self._stop_stream(channel)
+                    channel.reported = channel.offset
+        elif op == OP_ACK:
+            channel = self.channels.get(chan)
+            if channel and channel.sub is not None:
+                self.manager.ack(channel.sub, OFFSET.unpack_from(payload)[0])
+        elif op == OP_SNAPSHOT:
+            channel = self.channels.get(chan)
+            if channel and channel.sub is not None:
+                self.manager.request_snapshot(channel.sub)
+        elif op == OP_PING:
+            await self._send(OP_PONG, chan, bytes(payload))
+        elif op == OP_WATCH:
+            self.watch_project = bytes(payload).decode() or None
+            self._last_sessions = None
+            await self._send_sessions()
+
+    # ------------------------------------------------------------------ #
+
+    async def _attach(self, chan: int, session_id: str, since: Optional[int], visible: bool) -> None:
+        await self._detach(chan)
+        if not await maybe_await(self.manager.get_session(session_id)):
+            await self._send(OP_ENDED, chan)
+            return
+        channel = self.channels[chan] = Channel(session_id, visible, since, reported=since)
+        channel.batcher = InputBatcher(self.manager, session_id)
+        if visible:
+            await self._start_stream(chan, channel, since)
+        elif since is None:
+            # Only output from now on counts as activity
+            offsets = await maybe_await(self.manager.output_offsets([session_id]))
+            channel.reported = offsets.get(session_id, (None,))[0]
+
+    async def _detach(self, chan: int) -> None:
+        channel = self.channels.pop(chan, None)
+        if channel:
+            channel.batcher.flush()
+            self._stop_stream(channel)
+
+    async def _start_stream(self, chan: int, channel: Channel, since: Optional[int]) -> None:
+        channel.sub = await self.manager.subscribe(channel.session_id, since)
+        channel.pump = asyncio.create_task(self._pump(chan, channel, channel.sub))
+
+    def _stop_stream(self, channel: Channel) -> None:
+        if channel.pump:
+            channel.pump.cancel()
+            channel.pump = None
+        if channel.sub is not None:
+            self.manager.unsubscribe(channel.session_id, channel.sub)
+            channel.sub = None
+
+    async def _pump(self, chan: int, channel: Channel, sub) -> None:
+        """Forward one visible channel's replay and live output. The client
+        counts OUTPUT bytes from the last OFFSET, so OFFSET goes out after a
+        snapshot or reset (sub.mark) and otherwise before the first bytes;
+        until the first chunk is known it is not clear which one it will be."""
+        try:
+            announced = False
+            while True:
+                data = await self.manager.next_chunk(sub)
+                if data is None:
+                    channel.ended = True
+                    await self._send(OP_ENDED, chan)
+                    break
+                mark, sub.mark = sub.mark, False
+                if not announced and not mark:
+                    data = bytes(data)  # a view into the ring must not outlive an await
+                    await self._send(OP_OFFSET, chan, OFFSET.pack(sub.offset - len(data)))
+                announced = True
+                await self._send(OP_OUTPUT, chan, data)
+                channel.offset = sub.offset
+                if mark:
+                    await self._send(OP_OFFSET, chan, OFFSET.pack(sub.offset))
+        except (WebSocketDisconnect, OSError):
+            pass
+        except Exception:
+            logger.exception("Terminal mux output for channel %d failed", chan)
+
+    # ------------------------------------------------------------------ #
+
+    async def _poll(self) -> None:
+        """Low-rate updates: activity on hidden channels and the watched
+        project's session list. Both are in-memory reads on the manager
+        (one round trip each to the PTY supervisor)."""
+        try:
+            while True:
+                await asyncio.sleep(TERMINAL_MUX_POLL_INTERVAL)
+                hidden = {c: ch for c, ch in self.channels.items() if not ch.visible and not ch.ended}
+                if hidden:
+                    offsets = await maybe_await(
+                        self.manager.output_offsets(list({ch.session_id for ch in hidden.values()}))
+                    )
+                    for chan, channel in hidden.items():
+                        end, status = offsets.get(channel.session_id, (None, "stopped"))
+                        if end is not None and end > (channel.reported or 0):
+                            channel.reported = end
+                            await self._send(OP_ACTIVITY, chan, OFFSET.pack(end))
+                        if status != "running":
+                            channel.ended = True
+                            await self._send(OP_ENDED, chan)
+                if self.watch_project:
+                    await self._send_sessions()
+        except (WebSocketDisconnect, OSError):
+            pass
+        except Exception:
+            logger.exception("Terminal mux activity poll failed")
+
+    async def _send_sessions(self) -> None:
+        if not self.watch_project:
+            return
+        sessions = [
+            {"session_id": s.session_id, "name": s.name, "status": s.status,
+             "cpu_percent": s.resources.get("cpu_percent"), "rss_bytes": s.resources.get("rss_bytes"),
+             "throttled": s.throttled}
+            for s in await maybe_await(self.manager.list_sessions(self.watch_project))
+        ]
+        if sessions != self._last_sessions:
+            self._last_sessions = sessions
+            await self._send(OP_SESSIONS, 0, json.dumps(sessions).encode())
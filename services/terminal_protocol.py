@@ -0,0 +1,80 @@
+"""Binary terminal WebSocket protocol, version 1.
+
+Each WebSocket message is one frame: an opcode byte followed by the payload.
+The multiplexed endpoint (/ws/terminals, services/terminal_mux.py) puts a
+2-byte channel between the two; /ws/terminal/{id}?proto=1 has none.
+
+Client -> server:
+    ATTACH      <8-byte since><1-byte flags><session id>   (mux only)
+    DETACH      -                                        (mux only)
+    INPUT       <bytes>
+    RESIZE      <2-byte rows><2-byte cols>
+    VISIBILITY  <1-byte visible>                         (mux only)
+    WATCH       <project id>                             (mux only, channel 0)
+    ACK         <8-byte offset>   output the client has rendered, for flow control
+    PING        <opaque>          answered with PONG and the same payload
+    SNAPSHOT    -                 restart the stream from a fresh screen snapshot
+
+Server -> client:
+    OUTPUT      <bytes>
+    OFFSET      <8-byte offset>   absolute offset of the next OUTPUT byte
+    ACTIVITY    <8-byte offset>   (mux only) a hidden channel produced output
+    ENDED       -                 session ended or not found
+    SESSIONS    <JSON list>       (mux only) the watched project's sessions
+    PONG        <opaque>
+
+Integers are big-endian. Input never goes through JSON, and back-to-back
+INPUT frames are merged into one PTY write (InputBatcher).
+"""
+import asyncio
+import struct
+
+PROTOCOL_VERSION = 1
+
+OFFSET = struct.Struct(">Q")
+RESIZE = struct.Struct(">HH")
+NO_OFFSET = 2 ** 64 - 1
+
+OP_ATTACH = 0x01
+OP_DETACH = 0x02
+OP_INPUT = 0x03
+OP_RESIZE = 0x04
+OP_VISIBILITY = 0x05
+OP_WATCH = 0x06
+OP_ACK = 0x07
+OP_PING = 0x08
+OP_SNAPSHOT = 0x09
+
+OP_OUTPUT = 0x81
+OP_OFFSET = 0x82
+OP_ACTIVITY = 0x83
+OP_ENDED = 0x84
+OP_SESSIONS = 0x85
+OP_PONG = 0x86
+
+
+class InputBatcher:
+    """Merges INPUT frames that arrive back to back into one write.
+
+    Frames already buffered by the server are received without yielding to
+    the event loop, so a paste split over many frames is flushed once, after
+    the receive loop catches up."""
+
+    def __init__(self, manager, session_id: str):
+        self.manager = manager
+        self.session_id = session_id
+        self._pending = bytearray()
+        self._scheduled = False
+
+    def feed(self, data: bytes) -> None:
+        self._pending += data
+        if not self._scheduled:
+            self._scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+
+    def flush(self) -> None:
+        self._scheduled = False
+        if self._pending:
+            data = bytes(self._pending)
+            self._pending.clear()
+            self.manager.write_to_session(self.session_id, data)
@@ -0,0 +1,198 @@
+"""Incremental, bounded full-text index over terminal output.
+
+The manager feeds each session's index from the scrollback ring on a timer,
+in bounded batches parsed in a worker thread (like the screen model), so
+neither the broadcast path nor the event loop does indexing work. Output
+is split into lines, escape sequences and control characters are stripped
+and carriage-return overwrites (progress bars, spinners) keep only their
+final text. Every line remembers the absolute stream offset where it starts,
+which clients can pass back as ``?since=`` to jump there, and when it was
+indexed, which orders hits across sessions.
+
+Memory is capped per session at TERMINAL_SEARCH_MAX_CHARS of indexed text;
+the oldest lines are evicted first.
+"""
+import heapq
+import itertools
+import re
+import threading
+import time
+from collections import deque
+from typing import Callable, Iterable
+
+from config import TERMINAL_SEARCH_MAX_CHARS, TERMINAL_SEARCH_MAX_LINE
+
+# CSI, OSC/DCS/APC strings (BEL or ST terminated), two-byte escapes, and
+# C0 controls other than \n and \r
+_ANSI = re.compile(
+    rb"\x1b\[[0-?]*[ -/]*[@-~]"
+    rb"|\x1b[\]PX^_][^\x07\x1b]*(?:\x07|\x1b\\)?"
+    rb"|\x1b[ -/]*[0-~]"
+    rb"|[\x00-\x09\x0b\x0c\x0e-\x1f\x7f]"
+)
+
+
+def strip_line(raw: bytes) -> str:
+    """Printable text of one output line as it ends up on screen."""
+    text = _ANSI.sub(b"", raw)
+    if b"\r" in text:
+        # "\r" returns the cursor: later segments overwrite earlier ones
+        segments = [s for s in text.split(b"\r") if s]
+        text = segments[-1] if segments else b""
+    return text.decode("utf-8", "replace").rstrip()
+
+
+class SearchIndex:
+    """Stripped lines of one session, as (start offset, line number, text,
+    time indexed).
+    ``lock`` serializes a batch being indexed in a worker thread with
+    searches and catch-ups on the loop."""
+
+    def __init__(self, max_chars: int = TERMINAL_SEARCH_MAX_CHARS):
+        self.max_chars = max_chars
+        # Absolute offset of the next byte to index
+        self.offset = 0
+        self.lines: deque[tuple[int, int, str, float]] = deque()
+        self.chars = 0
+        # Lines seen so far (including blank and evicted ones)
+        self.line_count = 0
+        # Bytes that went past the ring before they could be indexed
+        self.skipped = 0
+        self._partial = bytearray()
+        self._partial_start = 0
+        # When the last batch was indexed (the time of a partial line)
+        self.updated = 0.0
+        self.lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        # Pickled when the session hibernates
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def feed_from(self, start: int, data: bytes) -> None:
+        """Index bytes copied from offset ``start``, minus any part a
+        catch-up has indexed in the meantime (worker thread)."""
+        with self.lock:
+            self._skip_to(start)
+            skip = self.offset - start
+            if skip < len(data):
+                self._feed([memoryview(data)[skip:]], start + len(data))
+
+    def catch_up(self, oldest: int, read: Callable[[int], Iterable[bytes]], end: int) -> None:
+        """Index ``read(offset)`` up to ``end``, skipping what is older than
+        ``oldest``; the offset is taken under the lock."""
+        with self.lock:
+            self._skip_to(oldest)
+            self._feed(read(self.offset), end)
+
+    def _feed(self, chunks: Iterable[bytes], end: int) -> None:
+        """Index ``chunks``, which continue the stream from ``self.offset``
+        up to ``end``."""
+        pos = self.offset
+        self.updated = time.time()
+        for chunk in chunks:
+            chunk = bytes(chunk)
+            start = 0
+            while True:
+                nl = chunk.find(b"\n", start)
+                if nl < 0:
+                    break
+                if not self._partial:
+                    self._partial_start = pos + start
+                self._partial += chunk[start:nl]
+                self._add_line()
+                start = nl + 1
+            if start < len(chunk):
+                if not self._partial:
+                    self._partial_start = pos + start
+                self._partial += chunk[start:]
+                if len(self._partial) > TERMINAL_SEARCH_MAX_LINE * 4:
+                    # Output without newlines (e.g. a full-screen app): index it in pieces
+                    self._add_line()
+            pos += len(chunk)
+        self.offset = end
+
+    def skip_to(self, offset: int) -> None:
+        with self.lock:
+            self._skip_to(offset)
+
+    def _skip_to(self, offset: int) -> None:
+        """Output before ``offset`` is no longer readable: drop the partial
+        line and continue from there."""
+        if offset > self.offset:
+            self.skipped += offset - self.offset
+            self._partial.clear()
+            self.offset = offset
+
+    def clear(self) -> None:
+        with self.lock:
+            self.lines.clear()
+            self.chars = 0
+            self._partial.clear()
+
+    def _add_line(self) -> None:
+        text = strip_line(bytes(self._partial))[:TERMINAL_SEARCH_MAX_LINE]
+        self._partial.clear()
+        self.line_count += 1
+        if not text:
+            return
+        self.lines.append((self._partial_start, self.line_count, text, self.updated))
+        self.chars += len(text)
+        while self.chars > self.max_chars and self.lines:
+            self.chars -= len(self.lines.popleft()[2])
+
+    def search(self, pattern: "re.Pattern", limit: int) -> list[dict]:
+        """Most recent matching lines first, up to ``limit``."""
+        with self.lock:
+            return self._search(pattern, limit)
+
+    def _search(self, pattern: "re.Pattern", limit: int) -> list[dict]:
+        results = []
+        if self._partial:
+            text = strip_line(bytes(self._partial))[:TERMINAL_SEARCH_MAX_LINE]
+            if text and pattern.search(text):
+                results.append({"offset": self._partial_start, "line": self.line_count + 1,
+                                "text": text, "time": self.updated})
+        for offset, line, text, indexed in reversed(self.lines):
+            if len(results) >= limit:
+                break
+            if pattern.search(text):
+                results.append({"offset": offset, "line": line, "text": text, "time": indexed})
+        return results[:limit]
+
+    def stats(self) -> dict:
+        return {
+            "lines": len(self.lines),
+            "chars": self.chars,
+            "oldest_offset": self.lines[0][0] if self.lines else self.offset,
+            "indexed_offset": self.offset,
+            "skipped_bytes": self.skipped,
+        }
+
+
+def compile_query(q: str, regex: bool = False, case: bool = False) -> "re.Pattern":
+    """Plain substring by default; ``regex`` for a regular expression.
+    Raises ValueError on an invalid pattern."""
+    try:
+        return re.compile(q if regex else re.escape(q), 0 if case else re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f"Invalid pattern: {e}") from e
+
+
+def search_many(indexes: Iterable[tuple[str, SearchIndex]], pattern: "re.Pattern",
+                limit: int) -> list[dict]:
+    """Search several sessions' indexes, newest first across all of them;
+    results carry their ``session_id``."""
+    per_session = []
+    for session_id, index in indexes:
+        hits = index.search(pattern, limit)
+        for hit in hits:
+            hit["session_id"] = session_id
+        per_session.append(hits)
+    merged = heapq.merge(*per_session, key=lambda hit: -hit["time"])
+    return list(itertools.islice(merged, limit))
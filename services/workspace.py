@@ -1,35 +1,53 @@
 """Workspace directory resolver — maps project_id to workspace_dir name."""
 import json
 from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, Optional
 
 from config import WORKSPACE_DIR
 
 _MAPPING_FILE = WORKSPACE_DIR / ".workspace_map.json"
 
-
-def _load_map() -> dict[str, str]:
-    if _MAPPING_FILE.exists():
+# Parsed mapping and the (mtime, size) it was read at. Every file request
+# resolves its project, so the file is only re-read when it changes (other
+# workers register projects too).
+_cached_map: dict[str, str] = {}
+_cached_stamp: Optional[tuple[int, int]] = None
+
+
+def _load_map() -> Mapping[str, str]:
+    """The cached mapping, read-only (register()/unregister() copy it)."""
+    global _cached_map, _cached_stamp
+    try:
+        st = _MAPPING_FILE.stat()
+    except OSError:
+        return MappingProxyType({})
+    stamp = (st.st_mtime_ns, st.st_size)
+    if stamp != _cached_stamp:
         try:
-            return json.loads(_MAPPING_FILE.read_text())
+            _cached_map = json.loads(_MAPPING_FILE.read_text())
         except (json.JSONDecodeError, OSError):
-            pass
-    return {}
+            _cached_map = {}
+        _cached_stamp = stamp
+    return MappingProxyType(_cached_map)
 
 
 def _save_map(mapping: dict[str, str]):
+    global _cached_stamp
     _MAPPING_FILE.write_text(json.dumps(mapping, indent=2))
+    _cached_stamp = None
 
 
 def register(project_id: str, workspace_dir: str):
     """Register a project_id → workspace_dir mapping."""
-    mapping = _load_map()
+    mapping = dict(_load_map())
     mapping[project_id] = workspace_dir
     _save_map(mapping)
 
 
 def unregister(project_id: str):
     """Remove a project_id mapping."""
-    mapping = _load_map()
+    mapping = dict(_load_map())
     mapping.pop(project_id, None)
     _save_map(mapping)
 
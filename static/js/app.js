@@ -143,6 +143,157 @@ function closeAppPrompt() {
     window._appPromptCallback = null;
 }
 
+// File tree: folders load their children on first expand (file_tree_nodes.html)
+function toggleTreeDir(folderEl) {
+    var dir = folderEl.parentElement;
+    dir.classList.toggle('collapsed');
+    if (!dir.classList.contains('collapsed')) {
+        htmx.trigger(dir.querySelector(':scope > .tree-children'), 'expand');
+    }
+}
+
+function treeParentDir(path) {
+    path = path.replace(/\/+$/, '');
+    var i = path.lastIndexOf('/');
+    return i < 0 ? '' : path.slice(0, i);
+}
+
+function treeDirContainer(dir) {
+    if (!dir) return document.getElementById('file-tree');
+    return document.querySelector('#file-tree .tree-children[data-dir="' + CSS.escape(dir) + '"]');
+}
+
+// Folders that were open when their parent's listing was replaced
+var treeReopen = {};
+
+function reopenTreeDirs(el) {
+    el.querySelectorAll(':scope > .tree-dir > .tree-children').forEach(function(c) {
+        if (treeReopen[c.dataset.dir]) {
+            delete treeReopen[c.dataset.dir];
+            toggleTreeDir(c.previousElementSibling);
+        }
+    });
+}
+
+document.addEventListener('htmx:afterSwap', function(evt) {
+    var target = evt.detail.target;
+    if (target && target.classList && target.classList.contains('tree-children')) {
+        target.dataset.loaded = '1';
+        watchTreeDir(target.dataset.dir);
+        reopenTreeDirs(target);
+    }
+});
+
+// Replace one folder's listing after a change, keeping its open subfolders
+// open. If the folder is not in the tree (a new intermediate folder, a
+// collapsed ancestor), refresh the nearest ancestor that is.
+function swapTreeDir(projectId, dir, html) {
+    var el = treeDirContainer(dir);
+    if (!el) {
+        refreshTreeDir(projectId, treeParentDir(dir));
+        return;
+    }
+    el.querySelectorAll('.tree-dir:not(.collapsed) > .tree-children').forEach(function(c) {
+        treeReopen[c.dataset.dir] = true;
+    });
+    el.innerHTML = html;
+    htmx.process(el);
+    if (dir) {
+        el.dataset.loaded = '1';
+        watchTreeDir(dir);
+    }
+    reopenTreeDirs(el);
+}
+
+function refreshTreeDir(projectId, dir) {
+    while (dir && !treeDirContainer(dir)) dir = treeParentDir(dir);
+    fetch('/files/' + projectId + '/tree?path=' + encodeURIComponent(dir))
+        .then(function(r) { return r.text(); })
+        .then(function(html) { swapTreeDir(projectId, dir, html); });
+}
+
+// Live file tree: one socket per project pushes changes made outside the
+// explorer (terminals, agents, git) as hx-swap-oob fragments, for every
+// folder whose listing is on screen
+var fileWatchWS = null;
+var fileWatchProject = null;
+var fileWatchRetries = 0;
+
+function connectFileWatch(projectId) {
+    var old = fileWatchWS;
+    fileWatchWS = null;
+    if (old) old.close();
+    fileWatchProject = projectId;
+    fileWatchRetries = 0;
+    openFileWatch();
+}
+
+function openFileWatch() {
+    var projectId = fileWatchProject;
+    var proto = location.protocol === 'https:' ? 'wss:' : 'ws:';
+    var ws = new WebSocket(proto + '//' + location.host + '/ws/files/' + projectId);
+    var reconnect = fileWatchRetries > 0;
+    fileWatchWS = ws;
+
+    ws.onopen = function() {
+        fileWatchRetries = 0;
+        watchTreeDir('');
+        document.querySelectorAll('#file-tree .tree-children[data-loaded]').forEach(function(c) {
+            watchTreeDir(c.dataset.dir);
+        });
+        // Changes while disconnected were not pushed
+        if (reconnect) refreshTreeDir(projectId, '');
+    };
+    ws.onmessage = function(evt) { applyTreeDelta(evt.data); };
+    ws.onclose = function(evt) {
+        if (fileWatchWS !== ws) return;  // replaced by another project
+        fileWatchWS = null;
+        if (evt.code === 1008 || fileWatchRetries >= 5) return;  // 1008: watching disabled on the server
+        fileWatchRetries++;
+        setTimeout(function() {
+            if (!fileWatchWS && fileWatchProject === projectId) openFileWatch();
+        }, 1000 * fileWatchRetries);
+    };
+}
+
+function watchTreeDir(dir) {
+    if (fileWatchWS && fileWatchWS.readyState === WebSocket.OPEN) {
+        fileWatchWS.send(JSON.stringify({ watch: dir || '' }));
+    }
+}
+
+// The explorer's own create/rename/delete may have updated a listing
+// before its change is pushed: drop what is already applied, and append
+// at the end of the folder if the node to insert before is not shown.
+function applyTreeDelta(html) {
+    var tpl = document.createElement('template');
+    tpl.innerHTML = html;
+    var deleted = {};
+    tpl.content.querySelectorAll('[hx-swap-oob="delete"]').forEach(function(el) {
+        if (document.getElementById(el.id)) deleted[el.id] = true;
+        else el.remove();
+    });
+    var pending = {};
+    tpl.content.querySelectorAll('[data-tree-add]').forEach(function(el) {
+        var node = el.firstElementChild;
+        // A node re-rendered in place (type or ignore status changed) is deleted first
+        var present = node && document.getElementById(node.id) && !deleted[node.id];
+        if (!node || !document.querySelector(el.dataset.container) || present) {
+            el.remove();
+            return;
+        }
+        var spec = el.getAttribute('hx-swap-oob');
+        if (spec.indexOf('beforebegin:#') === 0) {
+            var before = spec.slice('beforebegin:#'.length);
+            if (!document.getElementById(before) && !pending[before]) {
+                el.setAttribute('hx-swap-oob', 'beforeend:' + el.dataset.container);
+            }
+        }
+        pending[node.id] = true;
+    });
+    htmx.swap(document.getElementById('file-tree'), tpl.innerHTML, { swapStyle: 'none' });
+}
+
 // File tree: create file
 function promptCreateFile(projectId, parentPath) {
     showAppPrompt('New File', 'filename.ext', '', function(name) {
@@ -152,7 +303,7 @@ function promptCreateFile(projectId, parentPath) {
         formData.append('is_directory', 'false');
         fetch('/files/' + projectId + '/create', { method: 'POST', body: formData })
             .then(function(r) { return r.text(); })
-            .then(function(html) { var el = document.getElementById('file-tree'); el.innerHTML = html; htmx.process(el); });
+            .then(function(html) { swapTreeDir(projectId, treeParentDir(fullPath), html); });
     });
 }
 
@@ -165,7 +316,7 @@ function promptCreateFolder(projectId, parentPath) {
         formData.append('is_directory', 'true');
         fetch('/files/' + projectId + '/create', { method: 'POST', body: formData })
             .then(function(r) { return r.text(); })
-            .then(function(html) { var el = document.getElementById('file-tree'); el.innerHTML = html; htmx.process(el); });
+            .then(function(html) { swapTreeDir(projectId, treeParentDir(fullPath), html); });
     });
 }
 
@@ -178,7 +329,10 @@ function promptRename(projectId, oldPath) {
         formData.append('new_path', newName);
         fetch('/files/' + projectId + '/rename', { method: 'POST', body: formData })
             .then(function(r) { return r.text(); })
-            .then(function(html) { var el = document.getElementById('file-tree'); el.innerHTML = html; htmx.process(el); });
+            .then(function(html) {
+                swapTreeDir(projectId, treeParentDir(newName), html);
+                if (treeParentDir(oldPath) !== treeParentDir(newName)) refreshTreeDir(projectId, treeParentDir(oldPath));
+            });
     });
 }
 
@@ -187,7 +341,7 @@ function confirmDelete(projectId, path) {
     showAppConfirm('Delete', 'Delete "' + path + '"?', function() {
         fetch('/files/' + projectId + '/delete?path=' + encodeURIComponent(path), { method: 'DELETE' })
             .then(function(r) { return r.text(); })
-            .then(function(html) { var el = document.getElementById('file-tree'); el.innerHTML = html; htmx.process(el); });
+            .then(function(html) { swapTreeDir(projectId, treeParentDir(path), html); });
     });
 }
 
@@ -213,14 +367,199 @@ document.addEventListener('htmx:afterSwap', function(evt) {
 // Terminal — xterm.js + WebSocket
 // ═══════════════════════════════════════
 
+// Every terminal tab shares one multiplexed socket (/ws/terminals, framing in
+// services/terminal_mux.py): the active tab streams output, background tabs
+// only get activity notices, and the session list is pushed on change.
 var terminalWS = null;
 var activeTerminalId = null;
 var xterm = null;
 var xtermFitAddon = null;
-
-function getWSUrl(sessionId) {
+// Absolute stream offset of the last byte written to xterm; lets a dropped
+// connection resume with `since` instead of replaying the whole screen.
+var terminalOffset = null;
+var terminalRetries = 0;
+var terminalReconnectTimer = null;
+var terminalChannels = {};   // sessionId -> channel number
+var terminalNextChannel = 1;
+var terminalDecoder = new TextDecoder();
+var terminalEncoder = new TextEncoder();
+var terminalSessions = null; // last session list pushed by the server
+var terminalWatchedProject = null;
+
+var MUX = {
+    ATTACH: 0x01, DETACH: 0x02, INPUT: 0x03, RESIZE: 0x04, VISIBILITY: 0x05, WATCH: 0x06,
+    ACK: 0x07, PING: 0x08, SNAPSHOT: 0x09,
+    OUTPUT: 0x81, OFFSET: 0x82, ACTIVITY: 0x83, ENDED: 0x84, SESSIONS: 0x85, PONG: 0x86
+};
+// Rendered output is acked so the server's flow control follows what xterm
+// has actually drawn: every ACK_BYTES, and whenever xterm has caught up.
+var TERMINAL_ACK_BYTES = 8192;
+var terminalPendingWrites = 0;
+var terminalAcked = 0;
+var MUX_NO_OFFSET = 0xFFFFFFFF;
+
+function getWSUrl() {
     var proto = location.protocol === 'https:' ? 'wss:' : 'ws:';
-    return proto + '//' + location.host + '/ws/terminal/' + sessionId;
+    return proto + '//' + location.host + '/ws/terminals';
+}
+
+function muxSend(op, chan, payload) {
+    if (!terminalWS || terminalWS.readyState !== WebSocket.OPEN) return;
+    var body = payload || new Uint8Array(0);
+    var frame = new Uint8Array(3 + body.length);
+    frame[0] = op;
+    frame[1] = chan >> 8;
+    frame[2] = chan & 0xff;
+    frame.set(body, 3);
+    terminalWS.send(frame);
+}
+
+function muxAttach(sessionId, visible, since) {
+    var chan = terminalChannels[sessionId];
+    if (!chan) chan = terminalChannels[sessionId] = terminalNextChannel++;
+    var id = terminalEncoder.encode(sessionId);
+    var payload = new Uint8Array(9 + id.length);
+    var view = new DataView(payload.buffer);
+    if (since === null) {
+        view.setUint32(0, MUX_NO_OFFSET);
+        view.setUint32(4, MUX_NO_OFFSET);
+    } else {
+        view.setUint32(0, Math.floor(since / 0x100000000));
+        view.setUint32(4, since % 0x100000000);
+    }
+    payload[8] = visible ? 1 : 0;
+    payload.set(id, 9);
+    muxSend(MUX.ATTACH, chan, payload);
+}
+
+function muxAck(offset) {
+    if (!activeTerminalId || !terminalChannels[activeTerminalId]) return;
+    var payload = new Uint8Array(8);
+    var view = new DataView(payload.buffer);
+    view.setUint32(0, Math.floor(offset / 0x100000000));
+    view.setUint32(4, offset % 0x100000000);
+    muxSend(MUX.ACK, terminalChannels[activeTerminalId], payload);
+    terminalAcked = offset;
+}
+
+function muxDetach(sessionId) {
+    var chan = terminalChannels[sessionId];
+    if (!chan) return;
+    muxSend(MUX.DETACH, chan);
+    delete terminalChannels[sessionId];
+}
+
+function sessionForChannel(chan) {
+    for (var sid in terminalChannels) {
+        if (terminalChannels[sid] === chan) return sid;
+    }
+    return null;
+}
+
+function ensureTerminalMux() {
+    if (terminalWS) return;
+    var ws = new WebSocket(getWSUrl());
+    ws.binaryType = 'arraybuffer';
+    terminalWS = ws;
+
+    ws.onopen = function() {
+        terminalRetries = 0;
+        terminalWatchedProject = null;
+        watchTerminalProject();
+        // (Re)attach every tab: the active one resumes from its offset
+        var sids = Object.keys(terminalChannels);
+        terminalChannels = {};
+        sids.forEach(function(sid) {
+            if (sid === activeTerminalId) muxAttach(sid, true, xterm ? terminalOffset : null);
+            else muxAttach(sid, false, null);
+        });
+        if (activeTerminalId && xterm) {
+            xterm.focus();
+            sendTerminalResize();
+        }
+    };
+
+    ws.onmessage = function(evt) {
+        var frame = new DataView(evt.data);
+        var op = frame.getUint8(0);
+        var chan = frame.getUint16(1);
+        var payload = new Uint8Array(evt.data, 3);
+        if (op === MUX.SESSIONS) {
+            terminalSessions = JSON.parse(terminalDecoder.decode(payload));
+            renderSessionManager(terminalSessions);
+            return;
+        }
+        var sid = sessionForChannel(chan);
+        if (!sid) return;
+        if (op === MUX.OUTPUT) {
+            if (sid !== activeTerminalId || !xterm) return;
+            if (terminalOffset !== null) terminalOffset += payload.length;
+            var rendered = terminalOffset;
+            var term = xterm;
+            terminalPendingWrites++;
+            term.write(terminalDecoder.decode(payload, { stream: true }), function() {
+                term.scrollToBottom();
+                terminalPendingWrites--;
+                if (term !== xterm || rendered === null) return;
+                if (terminalPendingWrites === 0 || rendered - terminalAcked >= TERMINAL_ACK_BYTES) muxAck(rendered);
+            });
+        } else if (op === MUX.OFFSET) {
+            if (sid === activeTerminalId) {
+                terminalOffset = frame.getUint32(3) * 0x100000000 + frame.getUint32(7);
+                terminalAcked = terminalOffset;
+            }
+        } else if (op === MUX.ACTIVITY) {
+            var tab = document.querySelector('.terminal-tab[data-session-id="' + sid + '"]');
+            if (tab && sid !== activeTerminalId) tab.classList.add('has-activity');
+        } else if (op === MUX.ENDED) {
+            var indicator = document.querySelector('.terminal-tab[data-session-id="' + sid + '"] .terminal-tab-indicator');
+            if (indicator) { indicator.classList.remove('running'); indicator.classList.add('stopped'); }
+        }
+    };
+
+    ws.onclose = function() {
+        if (terminalWS !== ws) return;  // replaced or closed on purpose
+        terminalWS = null;
+        if (terminalRetries >= 5) {
+            if (xterm) xterm.write('\r\n\x1b[90m[Disconnected]\x1b[0m\r\n');
+            return;
+        }
+        terminalRetries++;
+        if (xterm) xterm.write('\r\n\x1b[90m[Reconnecting...]\x1b[0m\r\n');
+        terminalReconnectTimer = setTimeout(function() {
+            terminalReconnectTimer = null;
+            ensureTerminalMux();
+        }, 1000 * terminalRetries);
+    };
+
+    ws.onerror = function() {
+        if (xterm && terminalWS === ws) xterm.write('\r\n\x1b[31m[Connection error]\x1b[0m\r\n');
+    };
+}
+
+function watchTerminalProject() {
+    var projectId = window.activeProjectId;
+    if (!projectId || projectId === terminalWatchedProject) return;
+    if (!terminalWS || terminalWS.readyState !== WebSocket.OPEN) return;
+    terminalWatchedProject = projectId;
+    terminalSessions = null;
+    muxSend(MUX.WATCH, 0, terminalEncoder.encode(projectId));
+}
+
+// Attach every tab in the panel (background tabs hidden), drop channels for
+// tabs that are gone.
+function syncTerminalChannels() {
+    watchTerminalProject();
+    var present = {};
+    document.querySelectorAll('.terminal-tab').forEach(function(tab) {
+        var sid = tab.dataset.sessionId;
+        if (!sid) return;
+        present[sid] = true;
+        if (!terminalChannels[sid] && sid !== activeTerminalId) muxAttach(sid, false, null);
+    });
+    Object.keys(terminalChannels).forEach(function(sid) {
+        if (!present[sid] && sid !== activeTerminalId) muxDetach(sid);
+    });
 }
 
 function connectTerminal(sessionId) {
@@ -230,6 +569,8 @@ function connectTerminal(sessionId) {
     var container = document.getElementById('terminal-xterm');
     if (!container) return;
     container.innerHTML = '';
+    var tab = document.querySelector('.terminal-tab[data-session-id="' + sessionId + '"]');
+    if (tab) tab.classList.remove('has-activity');
 
     // Create xterm.js instance
     xterm = new Terminal({
@@ -273,46 +614,19 @@ function connectTerminal(sessionId) {
     // Fit to container size
     try { xtermFitAddon.fit(); } catch(e) {}
 
-    // Connect WebSocket
-    var url = getWSUrl(sessionId);
-    terminalWS = new WebSocket(url);
-    terminalWS.binaryType = 'arraybuffer';
-
-    terminalWS.onopen = function() {
+    terminalDecoder = new TextDecoder();
+    ensureTerminalMux();
+    // Fresh xterm: start from a snapshot (re-attaching a background channel)
+    muxAttach(sessionId, true, null);
+    syncTerminalChannels();
+    if (terminalWS && terminalWS.readyState === WebSocket.OPEN) {
         xterm.focus();
-        // Send terminal size to server
         sendTerminalResize();
-    };
-
-    terminalWS.onmessage = function(evt) {
-        if (!xterm) return;
-        var data;
-        if (evt.data instanceof ArrayBuffer) {
-            data = new TextDecoder().decode(evt.data);
-        } else {
-            data = evt.data;
-        }
-        xterm.write(data, function() { xterm.scrollToBottom(); });
-    };
-
-    terminalWS.onclose = function() {
-        if (xterm && activeTerminalId === sessionId) {
-            xterm.write('\r\n\x1b[90m[Disconnected]\x1b[0m\r\n');
-        }
-        if (activeTerminalId === sessionId) {
-            terminalWS = null;
-        }
-    };
-
-    terminalWS.onerror = function() {
-        if (xterm) xterm.write('\r\n\x1b[31m[Connection error]\x1b[0m\r\n');
-    };
+    }
 
-    // Send keystrokes from xterm to WS
+    // Send keystrokes from xterm to the active channel
     xterm.onData(function(data) {
-        if (terminalWS && terminalWS.readyState === WebSocket.OPEN) {
-            terminalWS.send(data);
-        }
+        sendToTerminal(data);
     });
 
     // Handle resize
@@ -329,18 +643,23 @@ function connectTerminal(sessionId) {
 }
 
 function sendTerminalResize() {
-    if (!xterm || !terminalWS || terminalWS.readyState !== WebSocket.OPEN) return;
-    // Send resize as a special message (JSON)
-    try {
-        terminalWS.send(JSON.stringify({
-            type: 'resize',
-            cols: xterm.cols,
-            rows: xterm.rows
-        }));
-    } catch(e) {}
+    if (!xterm || !activeTerminalId || !terminalChannels[activeTerminalId]) return;
+    var payload = new Uint8Array(4);
+    var view = new DataView(payload.buffer);
+    view.setUint16(0, xterm.rows);
+    view.setUint16(2, xterm.cols);
+    muxSend(MUX.RESIZE, terminalChannels[activeTerminalId], payload);
 }
 
 function disconnectTerminal() {
+    if (activeTerminalId && terminalChannels[activeTerminalId]) {
+        // Keep watching it in the background
+        muxAttach(activeTerminalId, false, null);
+    }
+    activeTerminalId = null;
+    terminalOffset = null;
+    terminalPendingWrites = 0;
+    terminalAcked = 0;
     if (window._xtermResizeObserver) {
         window._xtermResizeObserver.disconnect();
         window._xtermResizeObserver = null;
@@ -350,24 +669,29 @@ function disconnectTerminal() {
         xterm = null;
         xtermFitAddon = null;
     }
-    if (terminalWS) {
-        try { terminalWS.close(); } catch(e) {}
-        terminalWS = null;
-    }
 }
 
+// Background browser tab: stop streaming, resume from the same offset on return
+document.addEventListener('visibilitychange', function() {
+    if (!activeTerminalId || !terminalChannels[activeTerminalId]) return;
+    muxSend(MUX.VISIBILITY, terminalChannels[activeTerminalId], new Uint8Array([document.hidden ? 0 : 1]));
+});
+
 function autoConnectActiveTerminal() {
     setTimeout(function() {
         var activeTab = document.querySelector('.terminal-tab.active');
         if (activeTab && activeTab.dataset.sessionId) {
             connectTerminal(activeTab.dataset.sessionId);
+        } else {
+            ensureTerminalMux();
+            syncTerminalChannels();
         }
     }, 150);
 }
 
 function sendToTerminal(data) {
-    if (!terminalWS || terminalWS.readyState !== WebSocket.OPEN) return;
-    terminalWS.send(data);
+    if (!activeTerminalId || !terminalChannels[activeTerminalId]) return;
+    muxSend(MUX.INPUT, terminalChannels[activeTerminalId], terminalEncoder.encode(data));
 }
 
 function createTerminal() {
@@ -689,32 +1013,62 @@ function closeContextMenu() {
 function refreshSessionManager() {
     var projectId = window.activeProjectId;
     if (!projectId) return;
+    // With the terminal socket open the list is pushed on change
+    if (terminalSessions && terminalWatchedProject === projectId) {
+        renderSessionManager(terminalSessions);
+        return;
+    }
     fetch('/terminal/sessions/' + projectId)
         .then(function(r) { return r.text(); })
-        .then(function(html) {
-            // Extract session info for the session panel
-            var container = document.getElementById('session-content');
-            if (!container) return;
-            // Parse sessions from terminal panel response — build simple list
-            var tabs = document.querySelectorAll('.terminal-tab');
-            var sessionsHtml = '';
-            tabs.forEach(function(tab) {
-                var sid = tab.dataset.sessionId;
+        .then(function() {
+            // Build the list from the terminal tabs
+            var sessions = [];
+            document.querySelectorAll('.terminal-tab').forEach(function(tab) {
                 var name = tab.querySelector('.terminal-tab-name');
                 var indicator = tab.querySelector('.terminal-tab-indicator');
-                var status = indicator && indicator.classList.contains('running') ? 'running' : 'stopped';
-                sessionsHtml += '<div class="session-item">' +
-                    '<div class="session-info">' +
-                    '<span class="session-dot ' + status + '"></span>' +
-                    '<span class="session-name">' + (name ? name.textContent : 'terminal') + '</span>' +
-                    '</div>' +
-                    '<button class="btn-icon btn-xs" onclick="switchTerminalTab(\'' + sid + '\')" title="Focus">&#9654;</button>' +
-                    '</div>';
+                sessions.push({
+                    session_id: tab.dataset.sessionId,
+                    name: name ? name.textContent : 'terminal',
+                    status: indicator && indicator.classList.contains('running') ? 'running' : 'stopped'
+                });
             });
-            container.innerHTML = sessionsHtml || '<div class="empty-state">No active sessions</div>';
+            renderSessionManager(sessions);
         });
 }
 
+function resumeTerminalSession(sessionId) {
+    fetch('/terminal/' + sessionId + '/resume', { method: 'POST' }).then(refreshSessionManager);
+}
+
+function escapeHtml(text) {
+    var div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+function renderSessionManager(sessions) {
+    var container = document.getElementById('session-content');
+    if (!container) return;
+    var sessionsHtml = '';
+    sessions.forEach(function(s) {
+        var status = s.status === 'running' ? 'running' : 'stopped';
+        var usage = '';
+        if (s.cpu_percent != null) usage += s.cpu_percent + '% CPU';
+        if (s.rss_bytes != null) usage += (usage ? ' · ' : '') + Math.round(s.rss_bytes / 1048576) + ' MB';
+        if (s.throttled) usage += (usage ? ' · ' : '') + s.throttled;
+        sessionsHtml += '<div class="session-item">' +
+            '<div class="session-info">' +
+            '<span class="session-dot ' + status + '"></span>' +
+            '<span class="session-name">' + escapeHtml(s.name || 'terminal') + '</span>' +
+            (usage ? '<span class="session-usage">' + escapeHtml(usage) + '</span>' : '') +
+            '</div>' +
+            (s.throttled === 'paused' ? '<button class="btn-icon btn-xs" onclick="resumeTerminalSession(\'' + s.session_id + '\')" title="Resume">&#8634;</button>' : '') +
+            '<button class="btn-icon btn-xs" onclick="switchTerminalTab(\'' + s.session_id + '\')" title="Focus">&#9654;</button>' +
+            '</div>';
+    });
+    container.innerHTML = sessionsHtml || '<div class="empty-state">No active sessions</div>';
+}
+
 // Refresh session manager when terminal panel changes
 var _origCreateTerminal = createTerminal;
 createTerminal = function() {
@@ -738,17 +1092,18 @@ function launchAICLI(tool) {
     var formData = new FormData();
     formData.append('project_id', projectId);
     formData.append('name', tool);
+    // AI sessions are recorded so they can be replayed and reviewed later
+    formData.append('record', '1');
+    // The server types the command once the shell prompt is up and answers
+    // after that, so there is nothing to wait for here
+    formData.append('command', tool);
     fetch('/terminal/create', { method: 'POST', body: formData })
         .then(function(r) { return r.text(); })
         .then(function(html) {
             var container = document.getElementById('terminal-container');
             if (container) { container.innerHTML = html; htmx.process(container); }
             autoConnectActiveTerminal();
-            // Send the tool command after WS connects
-            setTimeout(function() {
-                sendToTerminal(tool + '\n');
-            }, 500);
-            setTimeout(refreshSessionManager, 600);
+            refreshSessionManager();
         });
 }
 